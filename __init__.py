@@ -1,45 +1,48 @@
-from .lora_loader import XBHHMultiLoraLoader
-from .lora_loader_plus import XBHHMultiLoraLoaderPlus, NODE_CLASS_MAPPINGS as LP_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LP_NODE_DISPLAY_NAME_MAPPINGS
-from .preset_selector import PresetSelector, NODE_CLASS_MAPPINGS as PS_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as PS_NODE_DISPLAY_NAME_MAPPINGS
-from .txt_randomizer import PromptRandomizer, NODE_CLASS_MAPPINGS as PR_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as PR_NODE_DISPLAY_NAME_MAPPINGS
-from .xlsx_viewer import XBHHXlsxViewer, NODE_CLASS_MAPPINGS as XV_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as XV_NODE_DISPLAY_NAME_MAPPINGS
-from .xbhh_txt_selector import XBHHTxtSelector, NODE_CLASS_MAPPINGS as TS_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as TS_NODE_DISPLAY_NAME_MAPPINGS
-from .note_node import XBHHNoteNode, NODE_CLASS_MAPPINGS as NN_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as NN_NODE_DISPLAY_NAME_MAPPINGS
-from .empty_latent import XBHHEmptyLatent, NODE_CLASS_MAPPINGS as EL_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as EL_NODE_DISPLAY_NAME_MAPPINGS
-from .dynamic_text import XBHHDynamicText, NODE_CLASS_MAPPINGS as DT_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as DT_NODE_DISPLAY_NAME_MAPPINGS
-from .layered_note import XBHHLayeredNote, NODE_CLASS_MAPPINGS as LN_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LN_NODE_DISPLAY_NAME_MAPPINGS
-from .pet import NODE_CLASS_MAPPINGS as PET_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as PET_NODE_DISPLAY_NAME_MAPPINGS
+from .lazy_nodes import lazy_node
+from . import metrics
+
+# 注册 API 路由的模块必须在启动时导入（服务启动后路由表即被冻结），
+# 它们只依赖 ComfyUI 已加载的模块，不做任何文件扫描
+from . import lora_loader
+from . import pet
+from . import warmup
+
+metrics.setup_routes()
+# 服务启动完成后在后台预热各类缓存，见 warmup.py
+warmup.schedule_on_startup()
+
+
+# ============================================================================
+# 轻量节点清单: 节点名 -> (模块, 类名, 显示名)
+# 节点模块在第一次被使用时才导入，见 lazy_nodes.py
+# ============================================================================
+NODE_MANIFEST = {
+    "XBHHMultiLoraLoader": (".lora_loader", "XBHHMultiLoraLoader", "XBHH Multi Lora Loader 🎨"),
+    "XBHHMultiLoraLoaderPlus": (".lora_loader_plus", "XBHHMultiLoraLoaderPlus", "XBHH Multi Lora Loader Plus 🎨⭐"),
+    "XBHHLoraStrengthSweep": (".lora_sweep", "XBHHLoraStrengthSweep", "XBHH Lora Strength Sweep 🎚️"),
+    "PresetSelector": (".preset_selector", "PresetSelector", "xbhh JSON预设选择器"),
+    "PromptRandomizer": (".txt_randomizer", "PromptRandomizer", "xbhh txt随机抽取"),
+    "XBHHXlsxViewer": (".xlsx_viewer", "XBHHXlsxViewer", "xbhh XLSX查看器"),
+    "XBHHTxtSelector": (".xbhh_txt_selector", "XBHHTxtSelector", "xbhh txt选择器"),
+    "XBHHNoteNode": (".note_node", "XBHHNoteNode", "xbhh 注释节点 📝"),
+    "XBHHEmptyLatent": (".empty_latent", "XBHHEmptyLatent", "xbhh 空Latent 📐"),
+    "XBHHResolutionSolver": (".empty_latent", "XBHHResolutionSolver", "xbhh 分辨率求解器 📏"),
+    "XBHHDynamicText": (".dynamic_text", "XBHHDynamicText", "xbhh 动态文本 ⚡"),
+    "XBHHLayeredNote": (".layered_note", "XBHHLayeredNote", "xbhh 分层注释 📑"),
+    **pet.NODE_MANIFEST,
+}
 
 
 NODE_CLASS_MAPPINGS = {
-    "XBHHMultiLoraLoader": XBHHMultiLoraLoader,
-    **LP_NODE_CLASS_MAPPINGS,
-    **PS_NODE_CLASS_MAPPINGS,
-    **PR_NODE_CLASS_MAPPINGS,
-    **XV_NODE_CLASS_MAPPINGS,
-    **TS_NODE_CLASS_MAPPINGS,
-    **NN_NODE_CLASS_MAPPINGS,
-    **EL_NODE_CLASS_MAPPINGS,
-    **DT_NODE_CLASS_MAPPINGS,
-    **LN_NODE_CLASS_MAPPINGS,
-    **PET_NODE_CLASS_MAPPINGS,
+    name: lazy_node(module, class_name, package=__name__)
+    for name, (module, class_name, _) in NODE_MANIFEST.items()
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "XBHHMultiLoraLoader": "XBHH Multi Lora Loader 🎨",
-    **LP_NODE_DISPLAY_NAME_MAPPINGS,
-    **PS_NODE_DISPLAY_NAME_MAPPINGS,
-    **PR_NODE_DISPLAY_NAME_MAPPINGS,
-    **XV_NODE_DISPLAY_NAME_MAPPINGS,
-    **TS_NODE_DISPLAY_NAME_MAPPINGS,
-    **NN_NODE_DISPLAY_NAME_MAPPINGS,
-    **EL_NODE_DISPLAY_NAME_MAPPINGS,
-    **DT_NODE_DISPLAY_NAME_MAPPINGS,
-    **LN_NODE_DISPLAY_NAME_MAPPINGS,
-    **PET_NODE_DISPLAY_NAME_MAPPINGS,
+    name: display_name
+    for name, (_, _, display_name) in NODE_MANIFEST.items()
 }
 
 WEB_DIRECTORY = "./web"
 
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
-
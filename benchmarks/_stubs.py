@@ -0,0 +1,148 @@
+"""
+基准测试用的 ComfyUI 桩模块
+
+在没有 ComfyUI / GPU 的环境下运行基准：把 folder_paths、server、nodes、
+comfy.* 替换为最小实现，所有目录都指向一个临时工作区。
+真实的第三方依赖（aiohttp、torch、numpy、PIL）仍需已安装。
+"""
+
+import os
+import sys
+import types
+import tempfile
+import importlib.util
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "xbhh_bench_pkg"
+
+
+def install_stubs(workdir=None, lora_names=None):
+    """
+    安装桩模块
+
+    Args:
+        workdir: 临时工作区，包含 output/user/loras 子目录
+        lora_names: get_filename_list("loras") 返回的名称列表
+
+    Returns:
+        工作区路径
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="xbhh_bench_")
+    for sub in ("output", "user", "loras"):
+        os.makedirs(os.path.join(workdir, sub), exist_ok=True)
+
+    state = {"loras": list(lora_names or [])}
+
+    # ---- folder_paths ----
+    fp = types.ModuleType("folder_paths")
+    fp.bench_state = state
+    fp.get_output_directory = lambda: os.path.join(workdir, "output")
+    fp.get_user_directory = lambda: os.path.join(workdir, "user")
+    fp.get_folder_paths = lambda name: [os.path.join(workdir, name)]
+    fp.get_filename_list = lambda name: list(state.get(name, []))
+
+    def get_full_path(folder_name, filename):
+        path = os.path.join(workdir, folder_name, filename)
+        return path if os.path.isfile(path) else None
+    fp.get_full_path = get_full_path
+
+    def get_save_image_path(filename_prefix, output_dir, image_width=0, image_height=0):
+        subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+        filename = os.path.basename(os.path.normpath(filename_prefix))
+        full_output_folder = os.path.join(output_dir, subfolder)
+        os.makedirs(full_output_folder, exist_ok=True)
+        counter = 1
+        for name in os.listdir(full_output_folder):
+            if name.startswith(filename + "_"):
+                try:
+                    counter = max(counter, int(name[len(filename) + 1:].split("_")[0]) + 1)
+                except ValueError:
+                    pass
+        return full_output_folder, filename, counter, subfolder, filename_prefix
+    fp.get_save_image_path = get_save_image_path
+    sys.modules["folder_paths"] = fp
+
+    # ---- server.PromptServer ----
+    from aiohttp import web
+    server = types.ModuleType("server")
+
+    class PromptServer:
+        instance = None
+
+        def __init__(self):
+            self.routes = web.RouteTableDef()
+
+    PromptServer.instance = PromptServer()
+    server.PromptServer = PromptServer
+    sys.modules["server"] = server
+
+    # ---- nodes.LoraLoader ----
+    nodes = types.ModuleType("nodes")
+
+    class LoraLoader:
+        def load_lora(self, model, clip, lora_name, strength_model, strength_clip):
+            return (model, clip)
+    nodes.LoraLoader = LoraLoader
+    sys.modules["nodes"] = nodes
+
+    # ---- comfy.* ----
+    comfy = types.ModuleType("comfy")
+    cli_args = types.ModuleType("comfy.cli_args")
+    cli_args.args = types.SimpleNamespace(disable_metadata=False)
+    mm = types.ModuleType("comfy.model_management")
+    mm.intermediate_device = lambda: "cpu"
+    utils = types.ModuleType("comfy.utils")
+
+    def load_torch_file(path, safe_load=False):
+        from safetensors.torch import load_file
+        return load_file(path)
+    utils.load_torch_file = load_torch_file
+    sd = types.ModuleType("comfy.sd")
+    sd.load_lora_for_models = lambda model, clip, lora, strength_model, strength_clip: (model, clip)
+    lora = types.ModuleType("comfy.lora")
+
+    def lora_keys(prefix, strip):
+        # 简化的 kohya 命名映射: lora_unet_a_b_c -> diffusion_model.a.b.c.weight
+        def build(model, key_map):
+            for k in model.state_dict():
+                if k.endswith(".weight") and k.startswith(strip):
+                    key_map[prefix + k[len(strip):-len(".weight")].replace(".", "_")] = k
+            return key_map
+        return build
+    lora.model_lora_keys_unet = lora_keys("lora_unet_", "diffusion_model.")
+    lora.model_lora_keys_clip = lora_keys("lora_te_", "")
+    lora.load_lora = lambda lora, key_map: {
+        key_map[k[:-len(".lora_up.weight")]]: ("lora", (v,)) for k, v in lora.items()
+        if k.endswith(".lora_up.weight") and k[:-len(".lora_up.weight")] in key_map
+    }
+    comfy.cli_args = cli_args
+    comfy.model_management = mm
+    comfy.utils = utils
+    comfy.sd = sd
+    comfy.lora = lora
+    for name, module in (("comfy", comfy), ("comfy.cli_args", cli_args), ("comfy.model_management", mm),
+                         ("comfy.utils", utils), ("comfy.sd", sd), ("comfy.lora", lora)):
+        sys.modules[name] = module
+
+    return workdir
+
+
+def import_package():
+    """以包的形式导入插件根目录（模块间使用相对导入）"""
+    if PACKAGE_NAME in sys.modules:
+        return sys.modules[PACKAGE_NAME]
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME,
+        os.path.join(PACKAGE_ROOT, "__init__.py"),
+        submodule_search_locations=[PACKAGE_ROOT],
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_submodule(name):
+    """导入插件的子模块，如 lora_loader 或 pet.wallet"""
+    import_package()
+    return importlib.import_module(f"{PACKAGE_NAME}.{name}")
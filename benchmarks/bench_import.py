@@ -0,0 +1,52 @@
+"""
+插件导入耗时基准
+
+每轮在新的子进程中测量：
+- import_ms: 导入插件包（ComfyUI 启动时的开销）
+- resolve_ms: 随后首次访问全部节点的 INPUT_TYPES（首次打开界面时的开销）
+两者之和近似于改为延迟加载之前的启动开销。
+
+用法: python benchmarks/bench_import.py [--rounds 5]
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+CHILD = r"""
+import sys, time, json
+sys.path.insert(0, {bench_dir!r})
+import _stubs
+_stubs.install_stubs()
+import torch, numpy, PIL.Image  # ComfyUI 启动时已加载，不计入
+t0 = time.perf_counter()
+pkg = _stubs.import_package()
+t1 = time.perf_counter()
+for cls in pkg.NODE_CLASS_MAPPINGS.values():
+    cls.INPUT_TYPES()
+t2 = time.perf_counter()
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "resolve_ms": (t2 - t1) * 1000}}))
+"""
+
+
+def run(rounds):
+    bench_dir = os.path.dirname(os.path.abspath(__file__))
+    code = CHILD.format(bench_dir=bench_dir)
+    samples = []
+    for _ in range(rounds):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        key: round(statistics.median(s[key] for s in samples), 3)
+        for key in ("import_ms", "resolve_ms")
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rounds), indent=2))
@@ -0,0 +1,308 @@
+"""
+XBHH 热点路径微基准
+
+无需 GPU 和 ComfyUI：使用 _stubs 中的桩模块和临时目录中的合成数据。
+结果以 JSON 输出，可与保存的基线比较，超过阈值即视为性能回退（退出码 1）。
+每个用例带有版本号，基线中版本或数据规模不同的用例拒绝比较（退出码 2，需重新保存基线）。
+
+用法:
+    python benchmarks/run.py                       # 运行全部用例
+    python benchmarks/run.py --quick               # 缩小数据规模
+    python benchmarks/run.py -k lora               # 只运行名称包含 lora 的用例
+    python benchmarks/run.py --save-baseline b.json
+    python benchmarks/run.py --baseline b.json --threshold 1.25
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _stubs  # noqa: E402
+
+
+# ============================================================================
+# 计时工具
+# ============================================================================
+def measure(func, repeat, number=1):
+    """运行 repeat 轮，每轮调用 number 次，返回每次调用的耗时（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) * 1000 / number)
+    return {
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+# ============================================================================
+# 用例：每个用例接收 (工作区, 规模系数)，返回无参可调用对象及 number
+# ============================================================================
+def case_lora_resolve(workdir, scale):
+    """get_lora_by_filename 在 10k 个名称中解析（精确/无扩展名/模糊/未命中混合）"""
+    n = int(10000 * scale)
+    names = [f"style_{i // 100}/lora_{i:05d}.safetensors" for i in range(n)]
+    _stubs.sys.modules["folder_paths"].bench_state["loras"] = names
+    lora_core = _stubs.import_submodule("lora_core")
+
+    rng = random.Random(0)
+    queries = []
+    for _ in range(200):
+        i = rng.randrange(n)
+        queries.append(rng.choice([
+            names[i],
+            os.path.splitext(names[i])[0],
+            f"lora_{i:05d}",
+            "does_not_exist",
+        ]))
+
+    def run():
+        for q in queries:
+            lora_core.get_lora_by_filename(q)
+    return run, 1
+
+
+def case_lora_images(workdir, scale):
+    """/xbhh/images/loras 的冷扫描：在合成目录树中查找预览图（路由本身读取共享目录）"""
+    n = int(2000 * scale)
+    lora_dir = os.path.join(workdir, "loras")
+    names = []
+    for i in range(n):
+        name = f"tree_{i % 20}/sub_{i % 7}/lora_{i:05d}.safetensors"
+        path = os.path.join(lora_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+        if i % 2 == 0:
+            open(os.path.splitext(path)[0] + ".png", "wb").close()
+        names.append(name)
+    _stubs.sys.modules["folder_paths"].bench_state["loras"] = names
+    lora_loader = _stubs.import_submodule("lora_loader")
+
+    def run():
+        lora_loader.scan_lora_images()
+    return run, 1
+
+
+def case_dynamic_text(workdir, scale):
+    """VariableProcessor.process_text 处理多种模板"""
+    dynamic_text = _stubs.import_submodule("dynamic_text")
+    templates = [
+        "plain text without variables " * 4,
+        "file_%date%_%counter:3%",
+        "%datetime% %random:1-100% %uuid:12% %weekday:en%",
+        "%choice:red|green|blue% cat, %choice:day|night%, %unknown% %env:HOME%",
+        "%year%/%month%/%day% %hour%:%minute%:%second% " * 8,
+    ]
+    processor = dynamic_text.VariableProcessor(node_id="bench")
+
+    def run():
+        for t in templates:
+            processor.process_text(t)
+    return run, 50
+
+
+def _write_prompt_file(workdir, scale):
+    n = int(1_000_000 * scale)
+    path = os.path.join(workdir, "prompts.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(f"prompt line {i}, masterpiece, best quality\n")
+    return path
+
+
+def case_prompt_randomizer(workdir, scale):
+    """PromptRandomizer 从 1M 行文件中抽取（词库已缓存）"""
+    path = _write_prompt_file(workdir, scale)
+    txt_randomizer = _stubs.import_submodule("txt_randomizer")
+    node = txt_randomizer.PromptRandomizer()
+
+    seeds = iter(range(10 ** 9))
+    def run():
+        node.extract_prompt(path, next(seeds))
+    return run, 1
+
+
+def case_txt_bank_cold(workdir, scale):
+    """txt 词库冷读取 1M 行文件（未预热时第一次执行的开销）"""
+    path = _write_prompt_file(workdir, scale)
+    bank = _stubs.import_submodule("txt_bank").get_txt_bank()
+
+    def run():
+        bank._entries.clear()
+        bank._cached_bytes = 0
+        bank.get_lines(path)
+    return run, 1
+
+
+def case_xlsx_viewer(workdir, scale):
+    """XBHHXlsxViewer 读取 50k 行工作簿"""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return None
+    n = int(50000 * scale)
+    path = os.path.join(workdir, "sheet.xlsx")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("data")
+    ws.append(["id", "name", "value", "note"])
+    for i in range(n):
+        ws.append([i, f"name_{i}", i * 0.5, "x" * (i % 30)])
+    wb.save(path)
+    xlsx_viewer = _stubs.import_submodule("xlsx_viewer")
+    node = xlsx_viewer.XBHHXlsxViewer()
+
+    def run():
+        node.view_xlsx(path, "", 10000)
+    return run, 1
+
+
+def case_wallet_add_balance(workdir, scale):
+    """CUIWallet.add_balance（历史记录已满 1000 条）"""
+    wallet_mod = _stubs.import_submodule("pet.wallet")
+    wallet = wallet_mod.CUIWallet()
+    for _ in range(1000):
+        wallet.add_balance(2, details={"width": 1024, "height": 1024})
+
+    def run():
+        wallet.add_balance(2, details={"width": 1024, "height": 1024})
+    return run, 20
+
+
+def case_save_png_batch(workdir, scale):
+    """XBHHSaveImageWithCUI 保存一批 PNG（含工作流元数据）"""
+    import torch
+    save_mod = _stubs.import_submodule("pet.save_image_cui")
+    node = save_mod.XBHHSaveImageWithCUI()
+    batch = max(1, int(8 * scale))
+    images = torch.rand(batch, 512, 512, 3, generator=torch.Generator().manual_seed(0))
+    workflow = {"nodes": [{"id": i, "type": "KSampler", "widgets_values": [i] * 20} for i in range(300)]}
+
+    def run():
+        node.save_and_earn(images, "bench/XBHH", prompt={"1": {"inputs": {}}},
+                           extra_pnginfo={"workflow": workflow})
+    return run, 1
+
+
+# 名称 -> (用例, 版本)；用例测量的内容改变时必须增加版本，不同版本的结果不能互相比较
+CASES = {
+    "lora_resolve_10k": (case_lora_resolve, 1),
+    # v2: 只测冷扫描，路由本身改为读取共享目录
+    "lora_images_tree": (case_lora_images, 2),
+    "dynamic_text_templates": (case_dynamic_text, 1),
+    # v2: 词库已缓存，冷读取见 txt_bank_cold_1m
+    "prompt_randomizer_1m": (case_prompt_randomizer, 2),
+    "txt_bank_cold_1m": (case_txt_bank_cold, 1),
+    "xlsx_viewer_50k": (case_xlsx_viewer, 1),
+    "wallet_add_balance": (case_wallet_add_balance, 1),
+    "save_png_batch": (case_save_png_batch, 1),
+}
+
+
+# ============================================================================
+# 基线比较
+# ============================================================================
+def compare(results, baseline, threshold, scale):
+    """
+    与基线比较
+
+    Returns:
+        (超过阈值的用例 [(名称, 基线ms, 当前ms, 比例)], 无法比较的用例 [(名称, 原因)])
+        版本或数据规模不同的用例测量的是不同的工作，不参与比较。
+    """
+    regressions = []
+    incomparable = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "median_ms" not in result or base.get("median_ms", 0) <= 0:
+            continue
+        # 引入版本之前保存的基线视为版本 1
+        base_version = base.get("version", 1)
+        if base_version != result["version"]:
+            incomparable.append((name, f"case version {base_version} -> {result['version']}"))
+            continue
+        if baseline.get("scale") != scale:
+            incomparable.append((name, f"scale {baseline.get('scale')} -> {scale}"))
+            continue
+        ratio = result["median_ms"] / base["median_ms"]
+        result["baseline_ratio"] = round(ratio, 3)
+        if ratio > threshold:
+            regressions.append((name, base["median_ms"], result["median_ms"], ratio))
+    return regressions, incomparable
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XBHH 热点路径微基准")
+    parser.add_argument("-k", "--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="数据规模缩小到 1/10")
+    parser.add_argument("--output", help="结果写入该 JSON 文件")
+    parser.add_argument("--baseline", help="与该基线 JSON 比较")
+    parser.add_argument("--save-baseline", help="把结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=1.25, help="中位数超过基线的倍数即视为回退")
+    args = parser.parse_args()
+
+    scale = 0.1 if args.quick else 1.0
+    workdir = _stubs.install_stubs()
+
+    results = {}
+    for name, (case, version) in CASES.items():
+        if args.filter and args.filter not in name:
+            continue
+        try:
+            prepared = case(workdir, scale)
+        except Exception as e:
+            results[name] = {"error": f"setup failed: {e}"}
+            continue
+        if prepared is None:
+            results[name] = {"skipped": "missing optional dependency"}
+            continue
+        func, number = prepared
+        func()  # 预热
+        results[name] = {"version": version, **measure(func, args.repeat, number)}
+        print(f"{name}: {results[name]['median_ms']:.3f} ms", file=sys.stderr)
+
+    report = {
+        "python": sys.version.split()[0],
+        "scale": scale,
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions, incomparable = compare(results, json.load(f), args.threshold, scale)
+        report["regressions"] = [
+            {"case": n, "baseline_ms": b, "current_ms": c, "ratio": round(r, 3)}
+            for n, b, c, r in regressions
+        ]
+        report["incomparable"] = [{"case": n, "reason": r} for n, r in incomparable]
+        if regressions:
+            exit_code = 1
+        elif incomparable:
+            # 基线已过期，需要重新保存
+            for n, r in incomparable:
+                print(f"{n}: cannot compare with baseline ({r}), re-run with --save-baseline", file=sys.stderr)
+            exit_code = 2
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,8 @@ from datetime import datetime
 import os
 import json
 
+from .metrics import timed
+
 # 全局计数器字典，按节点 ID 存储
 _counters = {}
 
@@ -293,6 +295,7 @@ class XBHHDynamicText:
 • %choice:A|B|C% - 随机选择
 """
 
+    @timed("dynamic_text")
     def process(self, text, seed=0, reset_counter=False, unique_id=None):
         node_id = str(unique_id) if unique_id else "default"
         
@@ -1,4 +1,7 @@
+import math
+
 import torch
+import comfy.model_management
 
 # 预设分辨率列表
 RESOLUTION_PRESETS = {
@@ -20,6 +23,20 @@ RESOLUTION_PRESETS = {
     "自定义": (0, 0),  # 特殊标记，使用自定义宽高
 }
 
+# Latent 通道数预设
+LATENT_CHANNELS = {
+    "4 (SD1.5/SDXL)": 4,
+    "16 (SD3/Flux)": 16,
+}
+
+# 可选的数据类型
+LATENT_DTYPES = {
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+}
+
+
 class XBHHEmptyLatent:
     """
     XBHH 空 Latent 节点
@@ -39,6 +56,9 @@ class XBHHEmptyLatent:
             "optional": {
                 "custom_width": ("INT", {"default": 1024, "min": 64, "max": 8192, "step": 8}),
                 "custom_height": ("INT", {"default": 1024, "min": 64, "max": 8192, "step": 8}),
+                "channels": (list(LATENT_CHANNELS.keys()), {"default": "4 (SD1.5/SDXL)", "tooltip": "Latent 通道数，SD3/Flux 使用 16 通道"}),
+                "dtype": (list(LATENT_DTYPES.keys()), {"default": "float32"}),
+                "on_device": ("BOOLEAN", {"default": False, "tooltip": "直接在中间设备上分配，省去每次拷贝"}),
             },
             "hidden": {
                 "unique_id": "UNIQUE_ID"
@@ -50,7 +70,9 @@ class XBHHEmptyLatent:
     FUNCTION = "generate"
     CATEGORY = "XBHH"
     
-    def generate(self, resolution, batch_size, custom_width=1024, custom_height=1024, unique_id=None):
+    def generate(self, resolution, batch_size, custom_width=1024, custom_height=1024,
+                 channels="4 (SD1.5/SDXL)", dtype="float32", on_device=False,
+                 unique_id=None):
         # 获取分辨率
         if resolution == "自定义":
             width = custom_width
@@ -63,14 +85,132 @@ class XBHHEmptyLatent:
         height = (height // 8) * 8
         
         # 生成空 latent
-        latent = torch.zeros([batch_size, 4, height // 8, width // 8])
+        device = comfy.model_management.intermediate_device() if on_device else "cpu"
+        # 每次新分配：输出缓存和下游节点可能持有或原地修改它，不能复用
+        latent = torch.zeros(
+            [batch_size, LATENT_CHANNELS.get(channels, 4), height // 8, width // 8],
+            dtype=LATENT_DTYPES.get(dtype, torch.float32),
+            device=device
+        )
         
         return ({"samples": latent}, width, height)
 
+# ============================================================================
+# 分辨率求解器
+# ============================================================================
+# 模型系列：训练基准边长，以及每百万像素每张图的显存估算 (MB)
+# 显存系数为粗略经验值，可通过节点的 mb_per_megapixel 输入校准
+MODEL_FAMILIES = {
+    "SD1.5": {"base": 512, "mb_per_megapixel": 1200},
+    "SDXL": {"base": 1024, "mb_per_megapixel": 1600},
+    "SD3": {"base": 1024, "mb_per_megapixel": 2000},
+    "Flux": {"base": 1024, "mb_per_megapixel": 2400},
+}
+
+# 分桶参数，与 kohya 训练脚本的分桶方式一致
+BUCKET_STEP = 64
+BUCKET_MIN_SIDE = 256
+BUCKET_MAX_SIDE = 4096
+MAX_BATCH_SIZE = 64
+
+
+def parse_aspect_ratio(aspect):
+    """解析 "16:9" / "16x9" / "1.777" 形式的宽高比，失败时返回 1.0"""
+    text = str(aspect).strip().replace("x", ":").replace("X", ":").replace("/", ":")
+    try:
+        if ":" in text:
+            w, h = text.split(":", 1)
+            ratio = float(w) / float(h)
+        else:
+            ratio = float(text)
+    except (ValueError, ZeroDivisionError):
+        return 1.0
+    return ratio if ratio > 0 else 1.0
+
+
+def make_buckets(area, step=BUCKET_STEP, min_side=BUCKET_MIN_SIDE, max_side=BUCKET_MAX_SIDE):
+    """生成面积不超过 area 的全部分桶 (宽, 高)，宽高均为 step 的倍数"""
+    buckets = []
+    for width in range(min_side, max_side + 1, step):
+        height = min(max_side, int(area // width) // step * step)
+        if height < min_side:
+            break
+        buckets.append((width, height))
+    return buckets
+
+
+def solve_resolution(aspect, family="SDXL", megapixels=0.0, vram_budget_gb=0.0,
+                     mb_per_megapixel=0):
+    """
+    按宽高比和像素预算求解分辨率，并按显存预算计算最大批次
+
+    Args:
+        aspect: 目标宽高比，如 "16:9"
+        family: 模型系列，决定默认像素预算和显存系数
+        megapixels: 像素预算（百万像素），0 表示使用模型基准分辨率
+        vram_budget_gb: 可用于推理激活的显存 (GB)，0 表示不计算，批次为 1
+        mb_per_megapixel: 每百万像素每张图的显存估算，0 表示使用模型系列默认值
+
+    Returns:
+        (width, height, batch_size)
+    """
+    info = MODEL_FAMILIES.get(family, MODEL_FAMILIES["SDXL"])
+    area = megapixels * 1_000_000 if megapixels > 0 else info["base"] ** 2
+    target = math.log(parse_aspect_ratio(aspect))
+
+    buckets = make_buckets(area)
+    if not buckets:
+        width = height = BUCKET_MIN_SIDE
+    else:
+        # 宽高比误差最小优先，其次像素数最大
+        width, height = min(
+            buckets,
+            key=lambda b: (round(abs(math.log(b[0] / b[1]) - target), 6), -b[0] * b[1])
+        )
+
+    batch_size = 1
+    if vram_budget_gb > 0:
+        per_image_mb = (mb_per_megapixel or info["mb_per_megapixel"]) * width * height / 1_000_000
+        batch_size = int(vram_budget_gb * 1024 // per_image_mb)
+        batch_size = max(1, min(MAX_BATCH_SIZE, batch_size))
+
+    return width, height, batch_size
+
+
+class XBHHResolutionSolver:
+    """
+    XBHH 分辨率求解器
+    根据宽高比和像素/显存预算给出模型友好的宽、高和批次大小
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "aspect_ratio": ("STRING", {"default": "1:1", "tooltip": "目标宽高比，如 16:9、2:3 或 1.5"}),
+                "model_family": (list(MODEL_FAMILIES.keys()), {"default": "SDXL"}),
+                "megapixels": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 16.0, "step": 0.05, "tooltip": "像素预算（百万像素），0 表示使用模型基准分辨率"}),
+            },
+            "optional": {
+                "vram_budget_gb": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 256.0, "step": 0.5, "tooltip": "可用于推理的显存 (GB)，0 表示不计算批次"}),
+                "mb_per_megapixel": ("INT", {"default": 0, "min": 0, "max": 65536, "step": 50, "tooltip": "每百万像素每张图的显存估算 (MB)，0 表示使用默认值"}),
+            }
+        }
+    
+    RETURN_TYPES = ("INT", "INT", "INT")
+    RETURN_NAMES = ("width", "height", "batch_size")
+    FUNCTION = "solve"
+    CATEGORY = "XBHH"
+    
+    def solve(self, aspect_ratio, model_family, megapixels, vram_budget_gb=0.0, mb_per_megapixel=0):
+        return solve_resolution(aspect_ratio, model_family, megapixels, vram_budget_gb, mb_per_megapixel)
+
 # 注册节点
 NODE_CLASS_MAPPINGS = {
-    "XBHHEmptyLatent": XBHHEmptyLatent
+    "XBHHEmptyLatent": XBHHEmptyLatent,
+    "XBHHResolutionSolver": XBHHResolutionSolver
 }
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "XBHHEmptyLatent": "xbhh 空Latent 📐"
+    "XBHHEmptyLatent": "xbhh 空Latent 📐",
+    "XBHHResolutionSolver": "xbhh 分辨率求解器 📏"
 }
@@ -0,0 +1,52 @@
+"""
+XBHH 后台 I/O 限速
+
+启动预热等后台任务在自己的线程中安装限速器，扫描目录、读取文件头、计算哈希的代码
+在每个文件或数据块之后调用 pace() 报告读取量，读取超前时在这里等待。
+限速器按线程生效：同样的代码被路由或节点调用时，pace() 什么也不做。
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+
+# 每访问一个文件/目录按该字节数计入限速（stat、打开、列目录本身的开销）
+FILE_COST_BYTES = 16 * 1024
+
+
+class IOThrottle:
+    """按字节/秒限速"""
+
+    def __init__(self, bytes_per_sec: float):
+        self.bytes_per_sec = bytes_per_sec
+        self._started = time.monotonic()
+        self._bytes = 0
+
+    def __call__(self, nbytes: int = 0, files: int = 0):
+        self._bytes += nbytes + files * FILE_COST_BYTES
+        ahead = self._bytes / self.bytes_per_sec - (time.monotonic() - self._started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+_local = threading.local()
+
+
+@contextmanager
+def throttled(throttle: Optional[IOThrottle]):
+    """在当前线程中安装限速器"""
+    previous = getattr(_local, "throttle", None)
+    _local.throttle = throttle
+    try:
+        yield throttle
+    finally:
+        _local.throttle = previous
+
+
+def pace(nbytes: int = 0, files: int = 0):
+    """报告本线程刚读取的字节数和访问的文件数，未安装限速器时立即返回"""
+    throttle = getattr(_local, "throttle", None)
+    if throttle is not None:
+        throttle(nbytes, files)
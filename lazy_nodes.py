@@ -0,0 +1,49 @@
+"""
+XBHH 延迟加载节点
+
+ComfyUI 启动时只需要 NODE_CLASS_MAPPINGS 中的类对象。这里为每个节点生成一个
+轻量代理类，真正的节点模块（及其依赖、文件读取）在第一次访问类属性
+（如 INPUT_TYPES）或实例化时才导入。
+"""
+
+import importlib
+import threading
+
+
+class LazyNodeMeta(type):
+    """代理类的元类：访问不到的属性和实例化都转发给真实节点类"""
+
+    def __getattr__(cls, name):
+        # 只有常规查找失败时才会进入这里
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(cls._xbhh_resolve(), name)
+
+    def __call__(cls, *args, **kwargs):
+        return cls._xbhh_resolve()(*args, **kwargs)
+
+
+def lazy_node(module_name, class_name, package=None):
+    """
+    创建节点代理类
+
+    Args:
+        module_name: 节点所在模块，可为相对路径（需同时提供 package）
+        class_name: 节点类名
+        package: 相对导入的基准包名
+    """
+    lock = threading.Lock()
+    resolved = []
+
+    def resolve():
+        if not resolved:
+            with lock:
+                if not resolved:
+                    module = importlib.import_module(module_name, package)
+                    resolved.append(getattr(module, class_name))
+        return resolved[0]
+
+    return LazyNodeMeta(class_name, (), {
+        "_xbhh_resolve": staticmethod(resolve),
+        "__doc__": f"延迟加载的 {class_name} 节点",
+    })
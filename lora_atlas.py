@@ -0,0 +1,201 @@
+"""
+XBHH LoRA 预览图缩略图集
+
+LoRA 树形浏览器展开一个文件夹时，只需一次请求即可拿到该文件夹所有预览图的缩略图：
+- 按文件夹（只含直接子项）分页，每页最多 ATLAS_PAGE_SIZE 个，拼成一张 WebP
+- 附带 JSON 偏移表: LoRA 名称 -> [x, y, w, h]
+- 在专用工作线程中生成，缓存在用户目录下，按预览图的 size/mtime 签名失效
+"""
+
+import os
+import json
+import math
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+
+import folder_paths
+
+
+# 预览图扩展名（按优先级）
+PREVIEW_EXTENSIONS = ["png", "jpg", "jpeg", "preview.png", "preview.jpeg"]
+# 缩略图边长
+ATLAS_TILE = 64
+# 每行缩略图数量
+ATLAS_COLUMNS = 16
+# 每页最多缩略图数量
+ATLAS_PAGE_SIZE = 256
+# 最多保留的图集数量
+MAX_ATLAS_FILES = 256
+ATLAS_VERSION = 1
+
+
+def find_lora_preview(lora_path: str) -> Optional[str]:
+    """查找 LoRA 对应的预览图扩展名（如 "png"、"preview.png"），没有时返回 None"""
+    path_no_ext = os.path.splitext(lora_path)[0]
+    for ext in PREVIEW_EXTENSIONS:
+        if os.path.isfile(path_no_ext + "." + ext):
+            return ext
+    return None
+
+
+def _folder_of(name: str) -> str:
+    name = name.replace("\\", "/")
+    return name.rsplit("/", 1)[0] if "/" in name else ""
+
+
+class LoraAtlasCache:
+    """LoRA 缩略图集缓存"""
+
+    DATA_DIR_NAME = "xbhh"
+    ATLAS_DIR_NAME = "lora_atlas"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 签名 -> 生成锁，同一图集并发请求只生成一次
+        self._building: Dict[str, threading.Lock] = {}
+        # 图集生成使用单独的工作线程，不占用默认线程池
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="xbhh-lora-atlas")
+
+    def get_atlas_dir(self) -> str:
+        user_dir = folder_paths.get_user_directory()
+        return os.path.join(user_dir, self.DATA_DIR_NAME, self.ATLAS_DIR_NAME)
+
+    def submit(self, folder: str, page: int):
+        """在工作线程中获取图集，返回 concurrent.futures.Future"""
+        return self._executor.submit(self.get_atlas, folder, page)
+
+    @staticmethod
+    def _collect(folder: str) -> List[tuple]:
+        """文件夹下（不含子文件夹）有预览图的 LoRA: [(名称, 预览图路径)]"""
+        folder = folder.replace("\\", "/").strip("/")
+        items = []
+        for name in folder_paths.get_filename_list("loras"):
+            if _folder_of(name) != folder:
+                continue
+            lora_path = folder_paths.get_full_path("loras", name)
+            if lora_path is None:
+                continue
+            ext = find_lora_preview(lora_path)
+            if ext is not None:
+                items.append((name, os.path.splitext(lora_path)[0] + "." + ext))
+        return items
+
+    @staticmethod
+    def _signature(items) -> str:
+        h = hashlib.sha1(f"{ATLAS_VERSION}|{ATLAS_TILE}|{ATLAS_COLUMNS}\n".encode())
+        for name, preview in items:
+            st = os.stat(preview)
+            h.update(f"{name}|{preview}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def get_atlas(self, folder: str, page: int = 0) -> Dict[str, Any]:
+        """
+        获取（必要时生成）图集清单
+
+        Returns:
+            {"image", "tile", "width", "height", "items": {名称: [x, y, w, h]}, "page", "pages"}
+        """
+        items = self._collect(folder)
+        pages = max(1, math.ceil(len(items) / ATLAS_PAGE_SIZE))
+        if page < 0 or page >= pages:
+            raise IndexError(f"page {page} out of range")
+        items = items[page * ATLAS_PAGE_SIZE:(page + 1) * ATLAS_PAGE_SIZE]
+
+        signature = self._signature(items)
+        atlas_dir = self.get_atlas_dir()
+        manifest_path = os.path.join(atlas_dir, signature + ".json")
+
+        with self._lock:
+            build_lock = self._building.setdefault(signature, threading.Lock())
+        with build_lock:
+            manifest = None
+            if os.path.isfile(manifest_path):
+                try:
+                    with open(manifest_path, "r", encoding="utf-8") as f:
+                        manifest = json.load(f)
+                except (json.JSONDecodeError, IOError):
+                    manifest = None
+            if manifest is None:
+                manifest = self._build(items, signature, atlas_dir)
+        with self._lock:
+            self._building.pop(signature, None)
+
+        manifest["page"] = page
+        manifest["pages"] = pages
+        return manifest
+
+    def _build(self, items, signature, atlas_dir) -> Dict[str, Any]:
+        from PIL import Image
+
+        columns = min(ATLAS_COLUMNS, max(1, len(items)))
+        rows = max(1, math.ceil(len(items) / columns))
+        atlas = Image.new("RGB", (columns * ATLAS_TILE, rows * ATLAS_TILE), (26, 26, 26))
+
+        offsets = {}
+        for i, (name, preview) in enumerate(items):
+            try:
+                with Image.open(preview) as img:
+                    # JPEG 可直接以缩小的尺寸解码
+                    img.draft("RGB", (ATLAS_TILE, ATLAS_TILE))
+                    img = img.convert("RGB")
+                    img.thumbnail((ATLAS_TILE, ATLAS_TILE))
+            except Exception as e:
+                print(f"[XBHH] Error reading LoRA preview {preview}: {e}")
+                continue
+            x = (i % columns) * ATLAS_TILE
+            y = (i // columns) * ATLAS_TILE
+            # 缩略图在格子中居中
+            atlas.paste(img, (x + (ATLAS_TILE - img.width) // 2, y + (ATLAS_TILE - img.height) // 2))
+            offsets[name] = [x, y, ATLAS_TILE, ATLAS_TILE]
+
+        os.makedirs(atlas_dir, exist_ok=True)
+        image_name = signature + ".webp"
+        tmp_path = os.path.join(atlas_dir, image_name + ".tmp")
+        atlas.save(tmp_path, format="WEBP", quality=80, method=4)
+        os.replace(tmp_path, os.path.join(atlas_dir, image_name))
+
+        manifest = {
+            "image": f"/xbhh/lora_atlas/image/{image_name}",
+            "tile": ATLAS_TILE,
+            "width": atlas.width,
+            "height": atlas.height,
+            "items": offsets,
+        }
+        manifest_path = os.path.join(atlas_dir, signature + ".json")
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        self._prune(atlas_dir)
+        return manifest
+
+    @staticmethod
+    def _prune(atlas_dir):
+        """只保留最近生成的 MAX_ATLAS_FILES 个图集"""
+        manifests = []
+        for name in os.listdir(atlas_dir):
+            if name.endswith(".json"):
+                path = os.path.join(atlas_dir, name)
+                manifests.append((os.path.getmtime(path), name[:-len(".json")]))
+        manifests.sort(reverse=True)
+        for _, signature in manifests[MAX_ATLAS_FILES:]:
+            for ext in (".json", ".webp"):
+                try:
+                    os.remove(os.path.join(atlas_dir, signature + ext))
+                except OSError:
+                    pass
+
+
+# 单例实例
+_atlas_instance: Optional[LoraAtlasCache] = None
+_atlas_lock = threading.Lock()
+
+def get_atlas_cache() -> LoraAtlasCache:
+    """获取 LoRA 缩略图集缓存单例实例"""
+    global _atlas_instance
+    with _atlas_lock:
+        if _atlas_instance is None:
+            _atlas_instance = LoraAtlasCache()
+    return _atlas_instance
@@ -0,0 +1,188 @@
+"""
+XBHH LoRA 堆栈烘焙
+
+把一组启用的 LoRA（含各自强度）合并成单个 LoRA 文件并缓存：
+    ΔW = Σ sᵢ·(αᵢ/rᵢ)·Upᵢ·Downᵢ = [s₁·k₁·Up₁ | s₂·k₂·Up₂ | …] · [Down₁; Down₂; …]
+即沿秩的维度拼接，结果与逐个应用完全等价（无 SVD 近似），
+指向同一权重的模块合并为一个，之后每次只需读取一个文件、每个权重只打一次补丁。
+
+缓存文件按堆栈指纹（文件路径/size/mtime + 强度 + 目标模型的 LoRA 键映射）命名，保存在用户目录下，数量有上限。
+仅支持标准 up/down 结构的 LoRA；LoHa、LoKr、DoRA 等格式不烘焙，交由常规流程逐个应用。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Optional, List, Tuple
+
+import torch
+import folder_paths
+from safetensors.torch import save_file
+
+from .lora_compat import get_key_map
+from .lora_meta import split_lora_key
+
+
+BAKE_VERSION = 2
+# 最多保留的烘焙文件数量（按最近使用淘汰）
+MAX_BAKE_FILES = 32
+
+
+class NotBakeableError(ValueError):
+    """堆栈中含有无法按秩拼接的 LoRA 格式"""
+
+
+class LoraStackBaker:
+    """LoRA 堆栈烘焙缓存"""
+
+    DATA_DIR_NAME = "xbhh"
+    BAKE_DIR_NAME = "lora_bakes"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _get_bake_dir(self) -> str:
+        user_dir = folder_paths.get_user_directory()
+        return os.path.join(user_dir, self.DATA_DIR_NAME, self.BAKE_DIR_NAME)
+
+    @staticmethod
+    def key_map_digest(key_map) -> str:
+        """
+        目标模型键映射的摘要
+
+        合并结果取决于键映射（丢弃模型中不存在的模块、按目标权重区分模型/CLIP 强度），
+        不同架构或有无 CLIP 的烘焙文件不能互相复用。
+        """
+        h = hashlib.sha256()
+        for key in sorted(key_map):
+            target = key_map[key]
+            h.update(f"{key}={target if isinstance(target, str) else target[0]}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def fingerprint(stack: List[Tuple[str, float, float]], key_digest: str = "") -> str:
+        """堆栈指纹: [(LoRA 完整路径, 模型强度, CLIP 强度)] + 目标模型键映射摘要"""
+        items = []
+        for lora_path, strength_model, strength_clip in stack:
+            st = os.stat(lora_path)
+            items.append([lora_path, st.st_size, st.st_mtime_ns, float(strength_model), float(strength_clip)])
+        data = json.dumps([BAKE_VERSION, key_digest, items], ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()[:32]
+
+    def get_or_bake(self, engine, model, clip, stack) -> Tuple[str, bool]:
+        """
+        获取堆栈对应的烘焙文件，不存在时生成
+
+        Returns:
+            (文件路径, 本次是否新生成)
+        """
+        bake_dir = self._get_bake_dir()
+        key_map, _ = get_key_map(model, clip)
+        path = os.path.join(bake_dir, self.fingerprint(stack, self.key_map_digest(key_map)) + ".safetensors")
+        with self._lock:
+            if os.path.isfile(path):
+                # 只更新访问时间作为最近使用标记；mtime 是权重缓存键的一部分，不能改
+                os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+                return path, False
+
+            tensors = self._merge(engine, model, clip, stack)
+            os.makedirs(bake_dir, exist_ok=True)
+            tmp_path = path + ".tmp"
+            metadata = {
+                "xbhh_bake_version": str(BAKE_VERSION),
+                "xbhh_bake_stack": json.dumps(
+                    [[os.path.basename(p), sm, sc] for p, sm, sc in stack], ensure_ascii=False
+                ),
+            }
+            save_file(tensors, tmp_path, metadata=metadata)
+            os.replace(tmp_path, path)
+            self._prune(bake_dir)
+        return path, True
+
+    @staticmethod
+    def _merge(engine, model, clip, stack):
+        """沿秩拼接所有 LoRA，返回新 LoRA 的张量字典"""
+        from .lora_core import lora_convert
+
+        key_map, _ = get_key_map(model, clip)
+        # 目标权重 -> {"name": 输出模块名, "ups": [], "downs": []}
+        merged = {}
+        # 输出使用各来源精度的公共类型
+        dtype = None
+
+        for lora_path, strength_model, strength_clip in stack:
+            lora = engine.load_weights(lora_path)
+            if lora_convert is not None:
+                lora = lora_convert.convert_lora(lora)
+
+            modules = {}
+            for key, tensor in lora.items():
+                module, role = split_lora_key(key)
+                if module is None:
+                    raise NotBakeableError(f"unsupported key {key} in {os.path.basename(lora_path)}")
+                modules.setdefault(module, {})[role] = tensor
+
+            for module, parts in modules.items():
+                target = key_map.get(module)
+                if target is None or "up" not in parts or "down" not in parts:
+                    continue
+                weight_key = target if isinstance(target, str) else target[0]
+                strength = strength_model if weight_key.startswith("diffusion_model.") else strength_clip
+                if strength == 0:
+                    continue
+
+                up, down = parts["up"], parts["down"]
+                rank = down.shape[0]
+                alpha = parts["alpha"].item() if "alpha" in parts else rank
+                scale = strength * alpha / rank
+
+                group = merged.setdefault(target, {"name": module, "ups": [], "downs": []})
+                if group["ups"] and (group["ups"][0].dim() != up.dim() or group["downs"][0].dim() != down.dim()):
+                    raise NotBakeableError(f"mixed layer shapes for {module}")
+                group["ups"].append(up.float() * scale)
+                group["downs"].append(down.float())
+                for t in (up, down):
+                    dtype = t.dtype if dtype is None else torch.promote_types(dtype, t.dtype)
+
+        tensors = {}
+        for group in merged.values():
+            up = torch.cat(group["ups"], dim=1)
+            down = torch.cat(group["downs"], dim=0)
+            name = group["name"]
+            # alpha 等于合并后的秩，缩放系数为 1
+            tensors[f"{name}.lora_up.weight"] = up.to(dtype).contiguous()
+            tensors[f"{name}.lora_down.weight"] = down.to(dtype).contiguous()
+            tensors[f"{name}.alpha"] = torch.tensor(float(down.shape[0]))
+        if not tensors:
+            raise NotBakeableError("nothing to bake")
+        return tensors
+
+    @staticmethod
+    def _prune(bake_dir):
+        """只保留最近使用的 MAX_BAKE_FILES 个烘焙文件"""
+        files = []
+        for name in os.listdir(bake_dir):
+            if name.endswith(".safetensors"):
+                path = os.path.join(bake_dir, name)
+                files.append((os.path.getatime(path), path))
+        files.sort(reverse=True)
+        for _, path in files[MAX_BAKE_FILES:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# 单例实例
+_baker_instance: Optional[LoraStackBaker] = None
+_baker_lock = threading.Lock()
+
+def get_lora_baker() -> LoraStackBaker:
+    """获取 LoRA 堆栈烘焙器单例实例"""
+    global _baker_instance
+    with _baker_lock:
+        if _baker_instance is None:
+            _baker_instance = LoraStackBaker()
+    return _baker_instance
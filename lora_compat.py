@@ -0,0 +1,151 @@
+"""
+XBHH LoRA 兼容性预检
+
+在读取权重之前，用 safetensors 文件头中声明的张量键名和形状
+与目标模型的 LoRA 键映射比较：
+- 没有任何模块能匹配到模型（例如把 SDXL LoRA 接到 SD1.5 上）→ 不兼容
+- 匹配到的模块中超过一半形状不符 → 不兼容
+
+键名先经过与加载流程相同的 lora_convert 转换（用 meta 张量，不读取权重）。
+非 safetensors 文件、转换失败、或键名前缀在模型键映射中完全不存在（未知格式）时不做判断，按原流程加载。
+"""
+
+import weakref
+import threading
+from typing import Optional, Dict, Any
+
+import torch
+import comfy.lora
+
+from .lora_meta import get_lora_meta_index, split_lora_key
+
+# 较新的 ComfyUI 在应用前会先转换非标准格式的 LoRA 键名
+try:
+    import comfy.lora_convert as lora_convert
+except ImportError:
+    lora_convert = None
+
+
+# 形状不符的模块占已匹配模块的比例超过该值即视为不兼容
+SHAPE_MISMATCH_RATIO = 0.5
+
+# 模型对象 -> (LoRA 键映射, 权重形状)；模型释放后自动清除
+_key_maps = weakref.WeakKeyDictionary()
+_key_maps_lock = threading.Lock()
+
+
+def _model_key_map(module, build):
+    """获取（并缓存）某个底层模型的 LoRA 键映射和各权重形状"""
+    with _key_maps_lock:
+        cached = _key_maps.get(module)
+    if cached is not None:
+        return cached
+
+    key_map = build(module, {})
+    shapes = {k: tuple(v.shape) for k, v in module.state_dict().items()}
+    cached = (key_map, shapes)
+    with _key_maps_lock:
+        _key_maps[module] = cached
+    return cached
+
+
+def _converted_modules(header) -> Dict[str, Dict[str, list]]:
+    """按加载流程转换键名后的模块: 模块名 -> {"down": 形状, "up": 形状, "alpha": 形状}"""
+    tensors = {}
+    for key, info in header.items():
+        if key == "__metadata__" or not isinstance(info, dict):
+            continue
+        tensors[key] = torch.empty(info.get("shape", []), device="meta")
+    if lora_convert is not None:
+        tensors = lora_convert.convert_lora(tensors)
+
+    modules = {}
+    for key, tensor in tensors.items():
+        module, role = split_lora_key(key)
+        if module is not None:
+            modules.setdefault(module, {})[role] = list(tensor.shape)
+    return modules
+
+
+def _key_prefix(name: str) -> str:
+    """模块名的格式前缀，如 lora_unet_、lora_te1_、diffusion_model."""
+    if name.startswith("lora_"):
+        return "_".join(name.split("_", 2)[:2]) + "_"
+    return name.split(".", 1)[0] + "."
+
+
+def get_key_map(model, clip):
+    """合并 UNet 与文本编码器的 LoRA 键映射，返回 (键映射, 权重形状)"""
+    key_map = {}
+    shapes = {}
+    if model is not None:
+        unet_map, unet_shapes = _model_key_map(model.model, comfy.lora.model_lora_keys_unet)
+        key_map.update(unet_map)
+        shapes.update(unet_shapes)
+    if clip is not None:
+        clip_map, clip_shapes = _model_key_map(clip.cond_stage_model, comfy.lora.model_lora_keys_clip)
+        key_map.update(clip_map)
+        shapes.update(clip_shapes)
+    return key_map, shapes
+
+
+def check_compatibility(model, clip, lora_path: str) -> Optional[Dict[str, Any]]:
+    """
+    检查 LoRA 与模型是否兼容（只读取文件头）
+
+    Returns:
+        None 表示无法判断；否则为
+        {"compatible", "matched", "total", "shape_mismatch", "arch", "reason"}
+    """
+    if not lora_path.lower().endswith(".safetensors"):
+        return None
+
+    index = get_lora_meta_index()
+    header = index.get_header(lora_path)
+    try:
+        modules = _converted_modules(header)
+    except Exception as e:
+        print(f"[XBHH] Warning: LoRA key conversion failed for compatibility check: {e}")
+        return None
+    if not modules:
+        return None
+
+    key_map, shapes = get_key_map(model, clip)
+
+    matched = 0
+    shape_mismatch = 0
+    for name, lora_shapes in modules.items():
+        target = key_map.get(name)
+        if target is None:
+            continue
+        matched += 1
+        # 元组表示映射到权重的一个切片，不比较形状
+        if not isinstance(target, str):
+            continue
+        weight = shapes.get(target)
+        down = lora_shapes.get("down") or []
+        up = lora_shapes.get("up") or []
+        if weight is None or len(weight) < 2 or len(down) < 2 or not up:
+            continue
+        if down[1] != weight[1] or up[0] != weight[0]:
+            shape_mismatch += 1
+
+    result = {
+        "compatible": True,
+        "matched": matched,
+        "total": len(modules),
+        "shape_mismatch": shape_mismatch,
+        "arch": index.get_path_meta(lora_path).get("arch"),
+        "reason": "",
+    }
+    if matched == 0:
+        # 模型键映射中没有任何同前缀的键：无法识别的格式，交给加载流程判断
+        prefixes = {_key_prefix(name) for name in modules}
+        if not any(key.startswith(tuple(prefixes)) for key in key_map if isinstance(key, str)):
+            return None
+        result["compatible"] = False
+        result["reason"] = f"no matching keys (0/{len(modules)}, lora arch: {result['arch']})"
+    elif shape_mismatch > matched * SHAPE_MISMATCH_RATIO:
+        result["compatible"] = False
+        result["reason"] = f"shape mismatch ({shape_mismatch}/{matched}, lora arch: {result['arch']})"
+    return result
@@ -0,0 +1,528 @@
+"""
+XBHH LoRA 公共引擎
+
+XBHHMultiLoraLoader 与 XBHHMultiLoraLoaderPlus 共用的核心：
+- 灵活输入类型 (AnyType / FlexibleOptionalInputType)
+- LoRA 名称解析（带索引缓存，名称找不到时按内容哈希查找）
+- LoRA 权重缓存（全局内存预算，LRU 淘汰）
+- LoRA 堆栈应用与统计信息
+- 每个 LoRA 的耗时与内存变化记录（解析/读取/打补丁）
+- 读取权重前的兼容性预检，跳过与模型不匹配的 LoRA
+- 可选把整个堆栈烘焙为单个缓存文件（见 lora_bake.py）
+- 可选读取半精度转码副本（见 lora_transcode.py）
+
+两个节点共用同一个引擎实例，任一节点预热的缓存对另一个同样有效。
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Optional, Dict, Any, List
+
+import torch
+import folder_paths
+import comfy.sd
+import comfy.lora
+import comfy.utils
+
+from .lora_bake import get_lora_baker
+from .lora_compat import check_compatibility, get_key_map
+from .lora_hash import get_lora_hash_index
+from .lora_transcode import get_transcode_cache
+from .metrics import registry
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# 较新的 ComfyUI 在应用前会先转换非标准格式的 LoRA 键名
+try:
+    import comfy.lora_convert as lora_convert
+except ImportError:
+    lora_convert = None
+
+
+# 权重缓存的全局内存预算: 1GB
+LORA_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# 性能记录环形缓冲区长度
+LORA_PROFILE_HISTORY = 500
+# 读取权重前检查 LoRA 与模型的键/形状是否匹配
+LORA_COMPAT_CHECK = True
+
+
+# ============================================================================
+# 灵活输入类型 - 支持动态LoRA输入 (参考rgthree)
+# ============================================================================
+class AnyType(str):
+    """特殊类型，在比较时始终相等"""
+    def __ne__(self, __value: object) -> bool:
+        return False
+
+
+class FlexibleOptionalInputType(dict):
+    """允许任意额外输入的类型"""
+    def __init__(self, type, data=None):
+        self.type = type
+        self.data = data
+        if data:
+            for k, v in data.items():
+                self[k] = v
+
+    def __getitem__(self, key):
+        if self.data and key in self.data:
+            return self.data[key]
+        return (self.type,)
+
+    def __contains__(self, key):
+        return True
+
+
+any_type = AnyType("*")
+
+
+# ============================================================================
+# 输入解析
+# ============================================================================
+def parse_lora_inputs(kwargs) -> List[Dict[str, Any]]:
+    """
+    从节点的动态输入中解析 LoRA 条目
+
+    只返回格式完整且选择了 LoRA 的条目（包括未启用的），保持输入顺序。
+    """
+    entries = []
+    for key, value in kwargs.items():
+        # 检查是否是LoRA输入
+        if not key.upper().startswith('LORA_') or not isinstance(value, dict):
+            continue
+        if 'on' not in value or 'lora' not in value or 'strength' not in value:
+            continue
+
+        lora_name = value.get('lora')
+        if not lora_name or lora_name == 'None':
+            continue
+
+        strength_model = value.get('strength', 1.0)
+        entries.append({
+            "key": key,
+            "lora": lora_name,
+            "on": value.get('on', False),
+            "strength_model": strength_model,
+            "strength_clip": value.get('strengthTwo', strength_model),
+            "trigger": value.get('trigger', ''),
+            "trigger_weight": value.get('triggerWeight', 1.0),
+            "hash": value.get('hash') or '',
+        })
+    return entries
+
+
+# ============================================================================
+# LoRA 引擎
+# ============================================================================
+class LoraEngine:
+    """LoRA 名称解析、权重缓存和堆栈应用"""
+
+    def __init__(self, max_cache_bytes: int = LORA_CACHE_MAX_BYTES):
+        self.max_cache_bytes = max_cache_bytes
+        self._lock = threading.RLock()
+
+        # 名称索引，随 get_filename_list 的结果变化而重建
+        self._index_list_obj = None
+        self._index_source = None
+        self._names = set()
+        self._names_no_ext = {}
+        self._name_list = []
+
+        # 权重缓存: (路径, 大小, mtime) -> (state_dict, 字节数)
+        self._weights = OrderedDict()
+        self._cached_bytes = 0
+
+        # 每个 LoRA 的性能记录
+        self._history = deque(maxlen=LORA_PROFILE_HISTORY)
+
+        self._stats = {
+            "resolve_hits": 0,
+            "resolve_misses": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "cache_evictions": 0,
+            "loras_applied": 0,
+            "apply_errors": 0,
+            "compat_skipped": 0,
+            "bakes_built": 0,
+            "bakes_reused": 0,
+        }
+
+    # ---------------------------------------------------------------- 名称解析
+    def _ensure_index(self):
+        """LoRA 列表变化时重建索引（调用方需持有锁）"""
+        lora_paths = folder_paths.get_filename_list("loras")
+        # folder_paths 命中自身缓存时返回同一个列表对象
+        if lora_paths is self._index_list_obj:
+            return
+        self._index_list_obj = lora_paths
+        source = tuple(lora_paths)
+        if source == self._index_source:
+            return
+
+        self._index_source = source
+        self._name_list = list(lora_paths)
+        self._names = set(lora_paths)
+        self._names_no_ext = {}
+        for path in lora_paths:
+            # 与原实现一致：同名时取列表中第一个
+            self._names_no_ext.setdefault(os.path.splitext(path)[0], path)
+
+    def resolve(self, filename, file_hash: str = "") -> Optional[str]:
+        """通过文件名获取LoRA；名称不存在时先按内容哈希（SHA-256 或 AutoV2）查找，再模糊匹配"""
+        with self._lock:
+            self._ensure_index()
+
+            result = None
+            if filename in self._names:
+                result = filename
+            else:
+                # 不带扩展名匹配
+                result = self._names_no_ext.get(os.path.splitext(filename)[0])
+
+            if result is None and file_hash:
+                for name in get_lora_hash_index().find(file_hash):
+                    if name in self._names:
+                        result = name
+                        break
+
+            if result is None:
+                # 模糊匹配
+                for lora_path in self._name_list:
+                    if filename in lora_path:
+                        result = lora_path
+                        break
+
+            self._stats["resolve_hits" if result is not None else "resolve_misses"] += 1
+            return result
+
+    # ---------------------------------------------------------------- 权重缓存
+    def load_weights(self, lora_path: str) -> Dict[str, torch.Tensor]:
+        """加载 LoRA 权重，命中缓存时不再读盘"""
+        return self._load_weights(lora_path)[0]
+
+    def _load_weights(self, lora_path: str):
+        """加载 LoRA 权重，同时返回实际读取的字节数（命中缓存时为 0）"""
+        # 开启转码缓存且已有半精度副本时改读副本
+        lora_path = get_transcode_cache().resolve(lora_path)
+        st = os.stat(lora_path)
+        key = (lora_path, st.st_size, st.st_mtime_ns)
+
+        with self._lock:
+            cached = self._weights.get(key)
+            if cached is not None:
+                self._weights.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                registry.cache_hit("lora_weights")
+                return cached[0], 0
+            self._stats["cache_misses"] += 1
+        registry.cache_miss("lora_weights")
+
+        lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
+        size = sum(t.numel() * t.element_size() for t in lora.values() if isinstance(t, torch.Tensor))
+
+        with self._lock:
+            if size <= self.max_cache_bytes and key not in self._weights:
+                self._weights[key] = (lora, size)
+                self._cached_bytes += size
+                while self._cached_bytes > self.max_cache_bytes:
+                    _, (_, evicted) = self._weights.popitem(last=False)
+                    self._cached_bytes -= evicted
+                    self._stats["cache_evictions"] += 1
+        return lora, st.st_size
+
+    def clear_cache(self):
+        """释放所有缓存的权重"""
+        with self._lock:
+            self._weights.clear()
+            self._cached_bytes = 0
+
+    # ---------------------------------------------------------------- 堆栈应用
+    def apply_lora(self, model, clip, lora_file, strength_model, strength_clip, record=None):
+        """
+        应用单个 LoRA，与官方 LoraLoader.load_lora 等价
+
+        传入 record 字典时，写入 load_ms / patch_ms / bytes_read / cache_hit。
+        """
+        lora_path = folder_paths.get_full_path("loras", lora_file)
+        if lora_path is None:
+            raise FileNotFoundError(lora_file)
+        return self.apply_lora_file(model, clip, lora_path, strength_model, strength_clip, record)
+
+    def apply_lora_file(self, model, clip, lora_path, strength_model, strength_clip, record=None):
+        """按完整路径应用单个 LoRA，record 同 apply_lora"""
+        t0 = time.perf_counter()
+        lora, bytes_read = self._load_weights(lora_path)
+        t1 = time.perf_counter()
+        result = comfy.sd.load_lora_for_models(model, clip, lora, strength_model, strength_clip)
+        t2 = time.perf_counter()
+
+        if record is not None:
+            record["load_ms"] = round((t1 - t0) * 1000, 3)
+            record["patch_ms"] = round((t2 - t1) * 1000, 3)
+            record["bytes_read"] = bytes_read
+            record["cache_hit"] = bytes_read == 0
+        return result
+
+    def load_patches(self, model, clip, lora_file):
+        """
+        读取 LoRA 并转换为与强度无关的补丁字典
+
+        相当于 comfy.sd.load_lora_for_models 中除 add_patches 以外的部分，
+        同一模型可以用不同强度多次调用 apply_patches 而无需重新读取和转换。
+        """
+        lora_path = folder_paths.get_full_path("loras", lora_file)
+        if lora_path is None:
+            raise FileNotFoundError(lora_file)
+        lora = self.load_weights(lora_path)
+        if lora_convert is not None:
+            lora = lora_convert.convert_lora(lora)
+        key_map, _ = get_key_map(model, clip)
+        return comfy.lora.load_lora(lora, key_map)
+
+    @staticmethod
+    def apply_patches(model, clip, patches, strength_model, strength_clip):
+        """以给定强度把 load_patches 的结果加到模型副本上"""
+        if model is not None and strength_model != 0:
+            model = model.clone()
+            model.add_patches(patches, strength_model)
+        if clip is not None and strength_clip != 0:
+            clip = clip.clone()
+            clip.add_patches(patches, strength_clip)
+        return model, clip
+
+    def apply_stack(self, model, clip, entries, source="", bake=False):
+        """
+        按顺序应用所有启用的 LoRA 条目（parse_lora_inputs 的结果）
+
+        bake=True 时，两个及以上可应用的 LoRA 会合并为一个缓存文件后一次性应用，
+        无法烘焙时回退为逐个应用。
+
+        Returns:
+            (model, clip, 本次每个 LoRA 的性能记录列表)
+        """
+        records = []
+        # 通过解析和预检、等待应用的条目: (记录, 文件名, 模型强度, CLIP 强度)
+        pending = []
+        for entry in entries:
+            if not entry["on"]:
+                continue
+
+            lora_name = entry["lora"]
+            strength_model = entry["strength_model"]
+            strength_clip = entry["strength_clip"]
+
+            if clip is None:
+                strength_clip = 0
+
+            if strength_model == 0 and strength_clip == 0:
+                continue
+
+            record = {
+                "key": entry["key"],
+                "lora": lora_name,
+                "source": source,
+                "strength_model": strength_model,
+                "strength_clip": strength_clip,
+                "timestamp": time.time(),
+            }
+            records.append(record)
+
+            t0 = time.perf_counter()
+            lora_file = self.resolve(lora_name, entry.get("hash", ""))
+            record["resolve_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+            record["file"] = lora_file
+            if lora_file is None:
+                record["error"] = "not found"
+                print(f"[XBHH] Warning: LoRA not found: {lora_name}")
+                continue
+
+            if model is not None and LORA_COMPAT_CHECK:
+                compat = self._check_compat(model, clip, lora_file, record)
+                if compat is not None and not compat["compatible"]:
+                    record["skipped"] = True
+                    record["error"] = f"incompatible: {compat['reason']}"
+                    with self._lock:
+                        self._stats["compat_skipped"] += 1
+                    print(f"[XBHH] Skipping incompatible LoRA {lora_name}: {compat['reason']}")
+                    continue
+
+            if model is not None:
+                pending.append((record, lora_file, strength_model, strength_clip))
+
+        if bake and len(pending) > 1:
+            try:
+                model, clip = self._apply_baked(model, clip, pending, records, source)
+                pending = []
+            except Exception as e:
+                print(f"[XBHH] LoRA stack bake failed, applying individually: {e}")
+
+        for record, lora_file, strength_model, strength_clip in pending:
+            rss_before, vram_before = _memory_snapshot()
+            try:
+                model, clip = self.apply_lora(
+                    model, clip, lora_file, strength_model, strength_clip, record=record
+                )
+                with self._lock:
+                    self._stats["loras_applied"] += 1
+            except Exception as e:
+                record["error"] = str(e)
+                with self._lock:
+                    self._stats["apply_errors"] += 1
+                print(f"[XBHH] Error loading LoRA {record['lora']}: {e}")
+            rss_after, vram_after = _memory_snapshot()
+            record["rss_delta"] = rss_after - rss_before if PSUTIL_AVAILABLE else None
+            record["vram_delta"] = vram_after - vram_before if torch.cuda.is_available() else None
+
+        with self._lock:
+            self._history.extend(records)
+        return model, clip, records
+
+    def _apply_baked(self, model, clip, pending, records, source):
+        """把待应用的条目烘焙为一个 LoRA 并应用，追加一条烘焙记录"""
+        stack = []
+        for _, lora_file, strength_model, strength_clip in pending:
+            lora_path = folder_paths.get_full_path("loras", lora_file)
+            if lora_path is None:
+                raise FileNotFoundError(lora_file)
+            stack.append((lora_path, strength_model, strength_clip))
+
+        record = {
+            "key": "",
+            "lora": f"[baked x{len(stack)}]",
+            "source": source,
+            "strength_model": 1.0,
+            "strength_clip": 1.0 if clip is not None else 0,
+            "timestamp": time.time(),
+        }
+        rss_before, vram_before = _memory_snapshot()
+        t0 = time.perf_counter()
+        baked_path, built = get_lora_baker().get_or_bake(self, model, clip, stack)
+        record["bake_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        record["file"] = os.path.basename(baked_path)
+        record["bake_built"] = built
+
+        model, clip = self.apply_lora_file(
+            model, clip, baked_path, 1.0, record["strength_clip"], record=record
+        )
+        rss_after, vram_after = _memory_snapshot()
+        record["rss_delta"] = rss_after - rss_before if PSUTIL_AVAILABLE else None
+        record["vram_delta"] = vram_after - vram_before if torch.cuda.is_available() else None
+
+        for r, _, _, _ in pending:
+            r["baked"] = True
+        records.append(record)
+        with self._lock:
+            self._stats["bakes_built" if built else "bakes_reused"] += 1
+            self._stats["loras_applied"] += 1
+        return model, clip
+
+    def _check_compat(self, model, clip, lora_file, record):
+        """兼容性预检，结果写入 record；文件头不可读时交由加载流程报错"""
+        lora_path = folder_paths.get_full_path("loras", lora_file)
+        if lora_path is None:
+            return None
+        t0 = time.perf_counter()
+        try:
+            compat = check_compatibility(model, clip, lora_path)
+        except (OSError, ValueError) as e:
+            print(f"[XBHH] Warning: LoRA compatibility check failed for {lora_file}: {e}")
+            compat = None
+        record["check_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        if compat is not None:
+            record["compat"] = compat
+        return compat
+
+    # ---------------------------------------------------------------- 统计
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        with self._lock:
+            return {
+                **self._stats,
+                "cached_loras": len(self._weights),
+                "cached_bytes": self._cached_bytes,
+                "max_cache_bytes": self.max_cache_bytes,
+            }
+
+    def collect_metrics(self):
+        """导出 LoRA 权重缓存的实时占用"""
+        stats = self.get_stats()
+        return [
+            ("xbhh_lora_cache_bytes", "gauge", "LoRA 权重缓存占用字节数", {}, stats["cached_bytes"]),
+            ("xbhh_lora_cache_entries", "gauge", "LoRA 权重缓存条目数", {}, stats["cached_loras"]),
+        ]
+
+    def get_history(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """获取最近的 LoRA 性能记录（最新的在前）"""
+        with self._lock:
+            return list(self._history)[-limit:][::-1]
+
+
+def _memory_snapshot():
+    """当前进程 RSS 与已分配显存（字节）"""
+    rss = psutil.Process().memory_info().rss if PSUTIL_AVAILABLE else 0
+    vram = torch.cuda.memory_allocated() if torch.cuda.is_available() else 0
+    return rss, vram
+
+
+def format_profile(records) -> str:
+    """把一次堆栈应用的性能记录格式化为文本表格"""
+    if not records:
+        return ""
+
+    def mb(value):
+        return "-" if value is None else f"{value / 1024 / 1024:+.1f}MB"
+
+    lines = ["lora | resolve | load | patch | read | rss | vram"]
+    for r in records:
+        if r.get("baked"):
+            lines.append(f"{r['lora']} | {r.get('resolve_ms', 0):.1f}ms | 🔥 baked")
+            continue
+        if "bake_ms" in r:
+            lines.append(
+                f"{r['lora']} | bake {r['bake_ms']:.1f}ms{' (new)' if r.get('bake_built') else ' (cache)'}"
+                f" | {r.get('load_ms', 0):.1f}ms{' (cache)' if r.get('cache_hit') else ''} | {r.get('patch_ms', 0):.1f}ms"
+                f" | {r.get('bytes_read', 0) / 1024 / 1024:.1f}MB | {mb(r.get('rss_delta'))} | {mb(r.get('vram_delta'))}"
+            )
+            continue
+        if r.get("skipped"):
+            lines.append(f"{r['lora']} | {r.get('resolve_ms', 0):.1f}ms | ⏭️ {r['error']}")
+            continue
+        if "error" in r and "load_ms" not in r:
+            lines.append(f"{r['lora']} | {r.get('resolve_ms', 0):.1f}ms | ❌ {r['error']}")
+            continue
+        lines.append(
+            f"{r['lora']} | {r.get('resolve_ms', 0):.1f}ms | {r.get('load_ms', 0):.1f}ms"
+            f"{' (cache)' if r.get('cache_hit') else ''} | {r.get('patch_ms', 0):.1f}ms"
+            f" | {r.get('bytes_read', 0) / 1024 / 1024:.1f}MB | {mb(r.get('rss_delta'))} | {mb(r.get('vram_delta'))}"
+        )
+    total = sum(r.get("resolve_ms", 0) + r.get("check_ms", 0) + r.get("bake_ms", 0)
+                + r.get("load_ms", 0) + r.get("patch_ms", 0) for r in records)
+    lines.append(f"total: {total:.1f}ms")
+    return "\n".join(lines)
+
+
+# 单例引擎实例
+_engine_instance: Optional[LoraEngine] = None
+_engine_lock = threading.Lock()
+
+def get_lora_engine() -> LoraEngine:
+    """获取 LoRA 引擎单例实例"""
+    global _engine_instance
+    with _engine_lock:
+        if _engine_instance is None:
+            _engine_instance = LoraEngine()
+            registry.register_collector(_engine_instance.collect_metrics)
+    return _engine_instance
+
+
+def get_lora_by_filename(filename):
+    """通过文件名获取LoRA"""
+    return get_lora_engine().resolve(filename)
@@ -0,0 +1,294 @@
+"""
+XBHH LoRA 内容哈希索引
+
+按大块 mmap 计算每个 LoRA 的 SHA-256 及 AutoV2 短哈希（SHA-256 前 10 位），
+由启动预热（限速）或 POST /xbhh/lora_hashes 触发全量计算，结果持久化在用户目录下，按 size/mtime 失效：
+- 每完成若干文件即落盘，重启后只需处理剩余/变化的文件
+- 哈希 -> 文件 的字典查找为 O(1)，预设跨机器迁移时可按哈希找回 LoRA
+- 同一内容位于多个位置时可检测为重复文件
+"""
+
+import os
+import json
+import time
+import mmap
+import hashlib
+import threading
+from typing import Optional, Dict, Any, List
+
+import folder_paths
+
+from .io_pace import pace
+
+
+INDEX_VERSION = 1
+# 每次送入哈希的块大小
+HASH_CHUNK_SIZE = 16 * 1024 * 1024
+# 后台哈希距离上次落盘超过该秒数即保存一次进度
+CHECKPOINT_INTERVAL = 10.0
+# AutoV2 短哈希长度
+AUTOV2_LENGTH = 10
+
+
+def sha256_file(path: str) -> str:
+    """按块 mmap 计算文件 SHA-256"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return h.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, size, HASH_CHUNK_SIZE):
+                    h.update(view[offset:offset + HASH_CHUNK_SIZE])
+                    pace(min(HASH_CHUNK_SIZE, size - offset))
+            finally:
+                view.release()
+    return h.hexdigest()
+
+
+class LoraHashIndex:
+    """LoRA 文件内容哈希的持久化索引"""
+
+    DATA_DIR_NAME = "xbhh"
+    INDEX_FILE_NAME = "lora_hashes.json"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # 完整路径 -> {"name", "size", "mtime_ns", "sha256"}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # sha256 / autov2 -> {完整路径}
+        self._by_hash: Dict[str, set] = {}
+        self._loaded = False
+        self._dirty = False
+        self._running = False
+        self._status = {
+            "state": "idle",
+            "total": 0,
+            "done": 0,
+            "hashed": 0,
+            "hashed_bytes": 0,
+            "errors": 0,
+            "elapsed": 0.0,
+        }
+
+    def _get_index_path(self) -> str:
+        user_dir = folder_paths.get_user_directory()
+        return os.path.join(user_dir, self.DATA_DIR_NAME, self.INDEX_FILE_NAME)
+
+    # ---------------------------------------------------------------- 持久化
+    def _ensure_loaded(self):
+        """首次使用时读取磁盘上的索引（调用方需持有锁）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        path = self._get_index_path()
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                for lora_path, entry in data.get("entries", {}).items():
+                    self._put(lora_path, entry)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"[XBHH] Error loading LoRA hash index: {e}")
+
+    def save(self):
+        """原子地写回索引"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": INDEX_VERSION, "entries": dict(self._entries)}
+            self._dirty = False
+
+        path = self._get_index_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except IOError as e:
+            print(f"[XBHH] Error saving LoRA hash index: {e}")
+
+    def _put(self, lora_path, entry):
+        """写入条目并更新哈希反查表（调用方需持有锁）"""
+        self._remove(lora_path)
+        self._entries[lora_path] = entry
+        sha = entry["sha256"]
+        for key in (sha, sha[:AUTOV2_LENGTH]):
+            self._by_hash.setdefault(key, set()).add(lora_path)
+
+    def _remove(self, lora_path):
+        old = self._entries.pop(lora_path, None)
+        if old is None:
+            return
+        sha = old["sha256"]
+        for key in (sha, sha[:AUTOV2_LENGTH]):
+            paths = self._by_hash.get(key)
+            if paths is not None:
+                paths.discard(lora_path)
+                if not paths:
+                    del self._by_hash[key]
+
+    # ---------------------------------------------------------------- 查询
+    def get_cached(self, lora_path: str) -> Optional[Dict[str, Any]]:
+        """返回仍然有效的哈希条目（不计算）"""
+        try:
+            st = os.stat(lora_path)
+        except OSError:
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(lora_path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry
+        return None
+
+    def get_autov2(self, lora_name: str) -> str:
+        """LoRA 的 AutoV2 短哈希；尚未计算时返回空字符串"""
+        lora_path = folder_paths.get_full_path("loras", lora_name)
+        entry = self.get_cached(lora_path) if lora_path else None
+        return entry["sha256"][:AUTOV2_LENGTH] if entry else ""
+
+    def hash_path(self, lora_path: str, name: str = "") -> Dict[str, Any]:
+        """计算（或取缓存的）文件哈希"""
+        entry = self.get_cached(lora_path)
+        if entry is not None:
+            return entry
+        st = os.stat(lora_path)
+        sha = sha256_file(lora_path)
+        entry = {"name": name, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+        with self._lock:
+            self._put(lora_path, entry)
+            self._dirty = True
+            self._status["hashed"] += 1
+            self._status["hashed_bytes"] += st.st_size
+        return entry
+
+    def find(self, file_hash: str) -> List[str]:
+        """按 SHA-256 或 AutoV2 查找 LoRA 名称（仅返回当前仍存在且未变化的文件）"""
+        file_hash = (file_hash or "").strip().lower()
+        if not file_hash:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            paths = list(self._by_hash.get(file_hash, ()))
+        names = []
+        for lora_path in sorted(paths):
+            entry = self.get_cached(lora_path)
+            if entry is not None and entry.get("name"):
+                names.append(entry["name"])
+        return names
+
+    def duplicates(self) -> List[List[str]]:
+        """内容相同的 LoRA 分组（每组至少两个）"""
+        groups = {}
+        with self._lock:
+            self._ensure_loaded()
+            for entry in self._entries.values():
+                groups.setdefault(entry["sha256"], []).append(entry.get("name", ""))
+        return [sorted(names) for names in groups.values() if len(names) > 1]
+
+    def snapshot(self) -> Dict[str, Dict[str, str]]:
+        """全部已计算的 LoRA: 名称 -> {"sha256", "autov2"}"""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                entry.get("name", ""): {"sha256": entry["sha256"], "autov2": entry["sha256"][:AUTOV2_LENGTH]}
+                for entry in self._entries.values()
+            }
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._status)
+
+    # ---------------------------------------------------------------- 后台哈希
+    def start(self) -> bool:
+        """启动后台哈希；已在运行时返回 False"""
+        if not self._claim():
+            return False
+        threading.Thread(target=self._run, name="xbhh-lora-hash", daemon=True).start()
+        return True
+
+    def run(self) -> bool:
+        """在当前线程中完成一次全量哈希（启动预热使用，受 io_pace 限速）；已在运行时返回 False"""
+        if not self._claim():
+            return False
+        self._run()
+        return True
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+            return True
+
+    def _run(self):
+        try:
+            self._hash_all()
+        finally:
+            with self._lock:
+                self._running = False
+
+    def _hash_all(self):
+        start = time.perf_counter()
+        names = folder_paths.get_filename_list("loras")
+        with self._lock:
+            self._ensure_loaded()
+            self._status.update(state="running", total=len(names), done=0, hashed=0, hashed_bytes=0, errors=0)
+
+        seen = set()
+        last_save = time.monotonic()
+        for i, name in enumerate(names):
+            pace(files=1)
+            lora_path = folder_paths.get_full_path("loras", name)
+            if lora_path is not None:
+                seen.add(lora_path)
+                try:
+                    entry = self.hash_path(lora_path, name)
+                    if entry.get("name") != name:
+                        # 文件未变但在列表中的名称变了（例如切换了额外模型目录）
+                        with self._lock:
+                            self._put(lora_path, {**entry, "name": name})
+                            self._dirty = True
+                except OSError as e:
+                    with self._lock:
+                        self._status["errors"] += 1
+                    print(f"[XBHH] Error hashing LoRA {name}: {e}")
+
+            with self._lock:
+                self._status["done"] = i + 1
+                self._status["elapsed"] = round(time.perf_counter() - start, 3)
+            if time.monotonic() - last_save >= CHECKPOINT_INTERVAL:
+                self.save()
+                last_save = time.monotonic()
+
+        # 清理已删除的文件
+        with self._lock:
+            stale = [p for p in self._entries if p not in seen]
+            for p in stale:
+                self._remove(p)
+            if stale:
+                self._dirty = True
+        self.save()
+
+        with self._lock:
+            self._status["state"] = "done"
+            self._status["elapsed"] = round(time.perf_counter() - start, 3)
+
+
+# 单例索引实例
+_index_instance: Optional[LoraHashIndex] = None
+_index_lock = threading.Lock()
+
+def get_lora_hash_index() -> LoraHashIndex:
+    """获取 LoRA 哈希索引单例实例"""
+    global _index_instance
+    with _index_lock:
+        if _index_instance is None:
+            _index_instance = LoraHashIndex()
+    return _index_instance
@@ -1,40 +1,107 @@
 import os
-import glob
+import re
+import json
+import asyncio
+import hashlib
 import folder_paths
-from nodes import LoraLoader
 from server import PromptServer
 from aiohttp import web
 
+# 本模块在启动时导入以注册路由；lora_core / lora_transcode 依赖 safetensors、comfy.sd 等，
+# 在路由和节点函数中按需导入
+from .lora_atlas import find_lora_preview, get_atlas_cache
+from .lora_hash import get_lora_hash_index
+from .lora_meta import get_lora_meta_index
+from .io_pace import pace
+from .metrics import timed
+from .route_pool import coalesce, run_blocking, single_flight
+from .shared_catalog import get_catalog_store
+
 
 # ============================================================================
 # API 路由
 # ============================================================================
-@PromptServer.instance.routes.get("/xbhh/images/loras")
-async def get_lora_images(request):
-    """获取所有LoRA对应的预览图列表"""
-    names = folder_paths.get_filename_list("loras")
+def scan_lora_images(names=None):
+    """扫描所有LoRA对应的预览图: {LoRA名称: "loras/xxx.png"}"""
+    if names is None:
+        names = folder_paths.get_filename_list("loras")
     
     images = {}
     for item_name in names:
+        pace(files=1)
         file_path = folder_paths.get_full_path("loras", item_name)
         
         if file_path is None:
             continue
         
-        file_path_no_ext = os.path.splitext(file_path)[0]
         file_name = os.path.splitext(item_name)[0]
         
         # 查找对应的预览图
-        for ext in ["png", "jpg", "jpeg", "preview.png", "preview.jpeg"]:
-            image_path = file_path_no_ext + "." + ext
-            if os.path.isfile(image_path):
-                images[item_name] = f"loras/{file_name}.{ext}"
-                break
+        ext = find_lora_preview(file_path)
+        if ext is not None:
+            images[item_name] = f"loras/{file_name}.{ext}"
     
-    return web.json_response(images)
+    return images
+
+
+def _lora_watch_dirs():
+    """LoRA 根目录及所有子目录，增删 LoRA 或预览图都会改变所在目录的 mtime"""
+    dirs = []
+    for base in folder_paths.get_folder_paths("loras"):
+        for root, _, _ in os.walk(base, followlinks=True):
+            pace(files=1)
+            dirs.append(root)
+    return dirs
+
+
+def _build_lora_catalog():
+    names = folder_paths.get_filename_list("loras")
+    return {
+        "names": json.dumps(names, ensure_ascii=False).encode("utf-8"),
+        "images": json.dumps(scan_lora_images(names), ensure_ascii=False).encode("utf-8"),
+    }
+
+
+def get_lora_catalog():
+    """
+    LoRA 名称与预览图的共享目录快照
+
+    同一台机器上的多个 ComfyUI 进程共用一份（见 shared_catalog.py），
+    按 LoRA 根目录配置区分，不同配置的进程互不影响。
+    """
+    bases = json.dumps(folder_paths.get_folder_paths("loras"), ensure_ascii=False)
+    name = "loras-" + hashlib.sha1(bases.encode("utf-8")).hexdigest()[:12]
+    return get_catalog_store().get(name, _lora_watch_dirs, _build_lora_catalog)
+
+
+def _catalog_response(request, snapshot, section):
+    """直接以共享目录中预序列化的字节作为响应体"""
+    etag = snapshot.etag(section)
+    if etag and request is not None and request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+    return web.Response(body=snapshot.section(section), content_type="application/json", headers={
+        "ETag": etag,
+        "Cache-Control": "no-cache"
+    })
+
+
+@PromptServer.instance.routes.get("/xbhh/images/loras")
+@timed("lora_images")
+async def get_lora_images(request):
+    """获取所有LoRA对应的预览图列表"""
+    snapshot = await coalesce("lora_catalog", get_lora_catalog)
+    return _catalog_response(request, snapshot, "images")
+
+
+def _find_view_file(type_name, file_name):
+    image_path = folder_paths.get_full_path(type_name, file_name)
+    if not image_path or not os.path.isfile(image_path):
+        return None
+    return image_path
 
 
 @PromptServer.instance.routes.get("/xbhh/view/{name:.*}")
+@timed("lora_view")
 async def view_lora_image(request):
     """查看LoRA预览图"""
     name = request.match_info["name"]
@@ -46,8 +113,8 @@ async def view_lora_image(request):
     else:
         return web.Response(status=400)
     
-    image_path = folder_paths.get_full_path(type_name, file_name)
-    if not image_path or not os.path.isfile(image_path):
+    image_path = await coalesce(("lora_view", type_name, file_name), _find_view_file, type_name, file_name)
+    if image_path is None:
         return web.Response(status=404)
     
     filename = os.path.basename(image_path)
@@ -56,66 +123,164 @@ async def view_lora_image(request):
     })
 
 
+@PromptServer.instance.routes.get("/xbhh/lora_atlas")
+@timed("lora_atlas")
+async def get_lora_atlas(request):
+    """获取文件夹内LoRA预览图的缩略图集清单 (?folder=a/b&page=0)"""
+    folder = request.query.get("folder", "")
+    try:
+        page = int(request.query.get("page", 0))
+    except ValueError:
+        return web.Response(status=400)
+    try:
+        # 图集在专用工作线程中生成，同一页的并发请求共享一次生成
+        manifest = await single_flight(
+            ("lora_atlas", folder, page),
+            lambda: asyncio.wrap_future(get_atlas_cache().submit(folder, page))
+        )
+    except IndexError:
+        return web.Response(status=404)
+    return web.json_response(manifest)
+
+
+@PromptServer.instance.routes.get("/xbhh/lora_atlas/image/{name}")
+async def get_lora_atlas_image(request):
+    """获取缩略图集图片（文件名即内容签名，可长期缓存）"""
+    name = request.match_info["name"]
+    if not re.fullmatch(r"[0-9a-f]{40}\.webp", name):
+        return web.Response(status=400)
+    path = os.path.join(get_atlas_cache().get_atlas_dir(), name)
+    if not await run_blocking(os.path.isfile, path):
+        return web.Response(status=404)
+    return web.FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
 @PromptServer.instance.routes.get("/xbhh/loras")
 async def get_loras(request):
     """获取LoRA列表"""
-    loras = folder_paths.get_filename_list("loras")
-    return web.json_response(loras)
+    snapshot = await coalesce("lora_catalog", get_lora_catalog)
+    return _catalog_response(request, snapshot, "names")
 
 
-# ============================================================================
-# 灵活输入类型 - 支持动态LoRA输入 (参考rgthree)
-# ============================================================================
-class AnyType(str):
-    """特殊类型，在比较时始终相等"""
-    def __ne__(self, __value: object) -> bool:
-        return False
-
-
-class FlexibleOptionalInputType(dict):
-    """允许任意额外输入的类型"""
-    def __init__(self, type, data=None):
-        self.type = type
-        self.data = data
-        if data:
-            for k, v in data.items():
-                self[k] = v
-    
-    def __getitem__(self, key):
-        if self.data and key in self.data:
-            return self.data[key]
-        return (self.type,)
-    
-    def __contains__(self, key):
-        return True
+@PromptServer.instance.routes.get("/xbhh/stats/loras")
+async def get_lora_stats(request):
+    """获取LoRA加载统计和最近的性能记录"""
+    try:
+        limit = int(request.query.get("limit", 100))
+    except ValueError:
+        return web.Response(status=400)
+    return web.json_response(await run_blocking(_read_lora_stats, limit))
 
 
-any_type = AnyType("*")
+def _read_lora_stats(limit):
+    from .lora_core import get_lora_engine
 
+    engine = get_lora_engine()
+    return {
+        "stats": engine.get_stats(),
+        "history": engine.get_history(limit)
+    }
+
+
+@PromptServer.instance.routes.get("/xbhh/lora_meta")
+@timed("lora_meta")
+async def get_lora_meta(request):
+    """获取LoRA文件头元数据（触发词、基础模型、秩等）
+
+    ?name=xxx 返回单个LoRA（未索引时立即读取文件头），否则返回已索引的全部LoRA并启动后台索引
+    """
+    index = get_lora_meta_index()
+    name = request.query.get("name")
+    if name:
+        try:
+            meta = await coalesce(("lora_meta", name), index.get_meta, name)
+        except (OSError, ValueError) as e:
+            return web.json_response({"error": str(e)}, status=422)
+        if meta is None:
+            return web.Response(status=404)
+        return web.json_response(meta)
+
+    return web.json_response(await coalesce("lora_meta_all", _read_lora_meta))
+
+
+def _read_lora_meta():
+    index = get_lora_meta_index()
+    # 首次调用会从磁盘读取索引，snapshot 还要逐个定位文件
+    index.start()
+    return {
+        "status": index.get_status(),
+        "loras": index.snapshot()
+    }
+
+
+def _read_lora_hashes():
+    index = get_lora_hash_index()
+    return {
+        "status": index.get_status(),
+        "hashes": index.snapshot(),
+        "duplicates": index.duplicates()
+    }
+
+
+@PromptServer.instance.routes.get("/xbhh/lora_hashes")
+async def get_lora_hashes(request):
+    """获取已计算的LoRA内容哈希及重复文件分组（只读，不启动哈希）"""
+    return web.json_response(await coalesce("lora_hashes", _read_lora_hashes))
 
-# ============================================================================
-# 辅助函数
-# ============================================================================
-def get_lora_by_filename(filename):
-    """通过文件名获取LoRA"""
-    lora_paths = folder_paths.get_filename_list("loras")
-    
-    if filename in lora_paths:
-        return filename
-    
-    # 不带扩展名匹配
-    lora_paths_no_ext = [os.path.splitext(x)[0] for x in lora_paths]
-    file_no_ext = os.path.splitext(filename)[0]
-    
-    if file_no_ext in lora_paths_no_ext:
-        return lora_paths[lora_paths_no_ext.index(file_no_ext)]
-    
-    # 模糊匹配
-    for i, lora_path in enumerate(lora_paths):
-        if filename in lora_path:
-            return lora_paths[i]
-    
-    return None
+
+@PromptServer.instance.routes.post("/xbhh/lora_hashes")
+async def start_lora_hashes(request):
+    """立即启动后台哈希（不限速；启动预热会以限速方式自动运行一次）"""
+    index = get_lora_hash_index()
+    started = await run_blocking(index.start)
+    return web.json_response({"started": started, "status": index.get_status()})
+
+
+@PromptServer.instance.routes.get("/xbhh/lora_transcode")
+async def get_lora_transcode(request):
+    """获取LoRA半精度转码缓存的配置和状态"""
+    return web.json_response(await coalesce("lora_transcode", _read_lora_transcode))
+
+
+def _read_lora_transcode():
+    from .lora_transcode import get_transcode_cache
+
+    cache = get_transcode_cache()
+    return {
+        "config": cache.get_config(),
+        "status": cache.get_status()
+    }
+
+
+@PromptServer.instance.routes.post("/xbhh/lora_transcode")
+async def set_lora_transcode(request):
+    """修改LoRA半精度转码缓存配置: {"enabled": bool, "dtype": "fp16"|"bf16", "max_bytes": int}"""
+    try:
+        changes = await request.json()
+    except ValueError:
+        return web.Response(status=400)
+    if not isinstance(changes, dict):
+        return web.Response(status=400)
+    # 保存配置并可能淘汰副本，需要读写文件
+    await run_blocking(_set_lora_transcode, changes)
+    # 不与 GET 合并：进行中的 GET 可能读到修改前的配置
+    return web.json_response(await run_blocking(_read_lora_transcode))
+
+
+def _set_lora_transcode(changes):
+    from .lora_transcode import get_transcode_cache
+
+    return get_transcode_cache().set_config(**changes)
+
+
+@PromptServer.instance.routes.get("/xbhh/lora_hashes/{hash}")
+async def find_lora_by_hash(request):
+    """按 SHA-256 或 AutoV2 哈希查找LoRA"""
+    file_hash = request.match_info["hash"]
+    names = await coalesce(("lora_hash_find", file_hash), get_lora_hash_index().find, file_hash)
+    if not names:
+        return web.Response(status=404)
+    return web.json_response({"names": names})
 
 
 # ============================================================================
@@ -131,13 +296,15 @@ class XBHHMultiLoraLoader:
     - 悬浮显示LoRA预览图
     """
     
-    RETURN_TYPES = ("MODEL", "CLIP")
-    RETURN_NAMES = ("MODEL", "CLIP")
+    RETURN_TYPES = ("MODEL", "CLIP", "STRING")
+    RETURN_NAMES = ("MODEL", "CLIP", "profile")
     FUNCTION = "load_loras"
     CATEGORY = "XBHH/loaders"
     
     @classmethod
     def INPUT_TYPES(cls):
+        from .lora_core import FlexibleOptionalInputType, any_type
+
         return {
             "required": {},
             "optional": FlexibleOptionalInputType(type=any_type, data={
@@ -149,42 +316,10 @@ class XBHHMultiLoraLoader:
     
     def load_loras(self, model=None, clip=None, **kwargs):
         """循环加载所有启用的LoRA"""
-        
-        for key, value in kwargs.items():
-            key_upper = key.upper()
-            
-            # 检查是否是LoRA输入
-            if key_upper.startswith('LORA_') and isinstance(value, dict):
-                if 'on' not in value or 'lora' not in value or 'strength' not in value:
-                    continue
-                
-                if not value.get('on', False):
-                    continue
-                
-                lora_name = value.get('lora')
-                if not lora_name or lora_name == 'None':
-                    continue
-                
-                strength_model = value.get('strength', 1.0)
-                strength_clip = value.get('strengthTwo', strength_model)
-                
-                if clip is None:
-                    strength_clip = 0
-                
-                if strength_model == 0 and strength_clip == 0:
-                    continue
-                
-                lora_file = get_lora_by_filename(lora_name)
-                if lora_file is None:
-                    print(f"[XBHH] Warning: LoRA not found: {lora_name}")
-                    continue
-                
-                if model is not None:
-                    try:
-                        model, clip = LoraLoader().load_lora(
-                            model, clip, lora_file, strength_model, strength_clip
-                        )
-                    except Exception as e:
-                        print(f"[XBHH] Error loading LoRA {lora_name}: {e}")
-        
-        return (model, clip)
+        from .lora_core import format_profile, get_lora_engine, parse_lora_inputs
+
+        entries = parse_lora_inputs(kwargs)
+        model, clip, records = get_lora_engine().apply_stack(
+            model, clip, entries, source="XBHHMultiLoraLoader"
+        )
+        return (model, clip, format_profile(records))
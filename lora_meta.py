@@ -0,0 +1,397 @@
+"""
+XBHH LoRA 元数据索引
+
+只读取 .safetensors 的文件头（8 字节长度 + JSON），不读取任何权重：
+- ss_tag_frequency → 触发词候选
+- ss_base_model_version / modelspec.architecture → 基础模型
+- ss_network_dim / ss_network_alpha / ss_network_module
+- 张量形状摘要：秩、特征维度、根据键名推断的架构
+
+索引持久化在用户目录下，按文件 size/mtime 失效；全量索引在后台线程中进行。
+"""
+
+import os
+import json
+import time
+import struct
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+import folder_paths
+
+from .io_pace import pace
+
+
+INDEX_VERSION = 1
+# 合法文件头的上限，防止损坏文件导致读取巨量数据
+SAFETENSORS_MAX_HEADER = 100 * 1024 * 1024
+# 每个 LoRA 保留的触发词候选数量
+MAX_TRIGGER_TAGS = 20
+# 内存中保留完整文件头（含全部张量键名和形状）的 LoRA 数量
+HEADER_CACHE_SIZE = 64
+# 后台索引每处理多少个文件落盘一次
+SAVE_EVERY = 500
+
+# LoRA 权重键后缀 -> 角色
+LORA_KEY_SUFFIXES = (
+    (".lora_down.weight", "down"),
+    (".lora_up.weight", "up"),
+    (".lora_A.weight", "down"),
+    (".lora_B.weight", "up"),
+    (".lora.down.weight", "down"),
+    (".lora.up.weight", "up"),
+    (".alpha", "alpha"),
+)
+
+
+# ============================================================================
+# 文件头解析
+# ============================================================================
+def read_safetensors_header(path: str) -> Dict[str, Any]:
+    """读取 safetensors 文件头 JSON（不读取张量数据）"""
+    with open(path, "rb") as f:
+        prefix = f.read(8)
+        if len(prefix) != 8:
+            raise ValueError("file too small")
+        (length,) = struct.unpack("<Q", prefix)
+        if length <= 0 or length > SAFETENSORS_MAX_HEADER:
+            raise ValueError(f"invalid header length {length}")
+        raw = f.read(length)
+    pace(8 + len(raw))
+    if len(raw) != length:
+        raise ValueError("truncated header")
+    header = json.loads(raw)
+    if not isinstance(header, dict):
+        raise ValueError("header is not an object")
+    return header
+
+
+def split_lora_key(key: str):
+    """把 LoRA 张量键拆成 (模块名, 角色)；不是 LoRA 权重键时返回 (None, None)"""
+    for suffix, role in LORA_KEY_SUFFIXES:
+        if key.endswith(suffix):
+            return key[:-len(suffix)], role
+    return None, None
+
+
+def lora_modules(header: Dict[str, Any]) -> Dict[str, Dict[str, List[int]]]:
+    """模块名 -> {"down": 形状, "up": 形状, "alpha": 形状}"""
+    modules = {}
+    for key, info in header.items():
+        if key == "__metadata__" or not isinstance(info, dict):
+            continue
+        module, role = split_lora_key(key)
+        if module is None:
+            continue
+        modules.setdefault(module, {})[role] = info.get("shape", [])
+    return modules
+
+
+def detect_arch(modules: Dict[str, Dict[str, List[int]]]) -> str:
+    """根据模块名和形状推断 LoRA 对应的模型架构"""
+    names = list(modules)
+    joined = "\n".join(names)
+    if "double_blocks" in joined or "single_blocks" in joined or "single_transformer_blocks" in joined:
+        return "flux"
+    if "joint_blocks" in joined:
+        return "sd3"
+    if "lora_te2_" in joined or "input_blocks" in joined:
+        return "sdxl"
+    if "down_blocks" in joined or "up_blocks" in joined or "lora_te_" in joined or "lora_te1_" in joined:
+        # 交叉注意力的上下文维度: SD1.x 为 768，SD2.x 为 1024，SDXL 为 2048
+        for name, shapes in modules.items():
+            if name.endswith("attn2_to_k") and len(shapes.get("down", [])) == 2:
+                context = shapes["down"][1]
+                return {768: "sd15", 1024: "sd2", 2048: "sdxl"}.get(context, "unknown")
+        return "sd15"
+    return "unknown"
+
+
+def _parse_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def _trigger_tags(metadata: Dict[str, Any]) -> List[str]:
+    """从训练元数据中提取触发词候选（按出现次数降序）"""
+    tags = []
+    phrase = metadata.get("modelspec.trigger_phrase")
+    if phrase:
+        tags.extend(t.strip() for t in str(phrase).split(",") if t.strip())
+
+    frequency = metadata.get("ss_tag_frequency")
+    if frequency:
+        try:
+            datasets = json.loads(frequency) if isinstance(frequency, str) else frequency
+        except json.JSONDecodeError:
+            datasets = {}
+        counts = {}
+        for dataset in datasets.values() if isinstance(datasets, dict) else []:
+            if not isinstance(dataset, dict):
+                continue
+            for tag, count in dataset.items():
+                tag = tag.strip()
+                if tag:
+                    counts[tag] = counts.get(tag, 0) + (count if isinstance(count, (int, float)) else 0)
+        for tag, _ in sorted(counts.items(), key=lambda kv: -kv[1]):
+            if tag not in tags:
+                tags.append(tag)
+            if len(tags) >= MAX_TRIGGER_TAGS:
+                break
+    return tags[:MAX_TRIGGER_TAGS]
+
+
+def summarize_header(header: Dict[str, Any]) -> Dict[str, Any]:
+    """把文件头压缩成可持久化的摘要"""
+    metadata = header.get("__metadata__") or {}
+    modules = lora_modules(header)
+
+    ranks = set()
+    dims = set()
+    dtypes = set()
+    for key, info in header.items():
+        if key != "__metadata__" and isinstance(info, dict) and info.get("dtype"):
+            dtypes.add(info["dtype"])
+    for shapes in modules.values():
+        down = shapes.get("down") or []
+        up = shapes.get("up") or []
+        if down:
+            ranks.add(down[0])
+            dims.update(down[1:2])
+        if up:
+            dims.add(up[0])
+
+    dim = _parse_number(metadata.get("ss_network_dim"))
+    if dim is None and len(ranks) == 1:
+        dim = next(iter(ranks))
+
+    return {
+        "base_model": metadata.get("ss_base_model_version") or metadata.get("modelspec.architecture"),
+        "arch": detect_arch(modules),
+        "network_module": metadata.get("ss_network_module"),
+        "network_dim": dim,
+        "network_alpha": _parse_number(metadata.get("ss_network_alpha")),
+        "title": metadata.get("modelspec.title") or metadata.get("ss_output_name"),
+        "triggers": _trigger_tags(metadata),
+        "tensor_count": sum(1 for k in header if k != "__metadata__"),
+        "module_count": len(modules),
+        "ranks": sorted(ranks),
+        "dims": sorted(dims),
+        "dtypes": sorted(dtypes),
+    }
+
+
+# ============================================================================
+# 元数据索引
+# ============================================================================
+class LoraMetaIndex:
+    """LoRA 文件头元数据的持久化索引"""
+
+    DATA_DIR_NAME = "xbhh"
+    INDEX_FILE_NAME = "lora_meta.json"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # 完整路径 -> {"size", "mtime_ns", "meta"}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self._dirty = False
+        # (路径, size, mtime) -> 完整文件头，供兼容性检查使用
+        self._headers = OrderedDict()
+        self._running = False
+        self._status = {
+            "state": "idle",
+            "total": 0,
+            "done": 0,
+            "indexed": 0,
+            "errors": 0,
+            "elapsed": 0.0,
+        }
+
+    def _get_index_path(self) -> str:
+        user_dir = folder_paths.get_user_directory()
+        return os.path.join(user_dir, self.DATA_DIR_NAME, self.INDEX_FILE_NAME)
+
+    # ---------------------------------------------------------------- 持久化
+    def _ensure_loaded(self):
+        """首次使用时读取磁盘上的索引（调用方需持有锁）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        path = self._get_index_path()
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self._entries = data.get("entries", {})
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"[XBHH] Error loading LoRA meta index: {e}")
+
+    def save(self):
+        """原子地写回索引"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": INDEX_VERSION, "entries": dict(self._entries)}
+            self._dirty = False
+
+        path = self._get_index_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except IOError as e:
+            print(f"[XBHH] Error saving LoRA meta index: {e}")
+
+    # ---------------------------------------------------------------- 查询
+    def get_header(self, lora_path: str) -> Dict[str, Any]:
+        """读取完整文件头（带内存 LRU 缓存）"""
+        st = os.stat(lora_path)
+        key = (lora_path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            header = self._headers.get(key)
+            if header is not None:
+                self._headers.move_to_end(key)
+                return header
+
+        header = read_safetensors_header(lora_path)
+        with self._lock:
+            self._headers[key] = header
+            while len(self._headers) > HEADER_CACHE_SIZE:
+                self._headers.popitem(last=False)
+        return header
+
+    def get_path_meta(self, lora_path: str) -> Optional[Dict[str, Any]]:
+        """按完整路径获取元数据，索引缺失或过期时立即读取文件头"""
+        if not lora_path.lower().endswith(".safetensors"):
+            return None
+        st = os.stat(lora_path)
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(lora_path)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                return entry["meta"]
+
+        meta = summarize_header(self.get_header(lora_path))
+        with self._lock:
+            self._entries[lora_path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "meta": meta}
+            self._dirty = True
+        return meta
+
+    def get_meta(self, lora_name: str) -> Optional[Dict[str, Any]]:
+        """按 LoRA 名称（loras 目录下的相对路径）获取元数据"""
+        lora_path = folder_paths.get_full_path("loras", lora_name)
+        if lora_path is None:
+            return None
+        return self.get_path_meta(lora_path)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """当前已索引的全部 LoRA: 名称 -> 元数据"""
+        result = {}
+        with self._lock:
+            self._ensure_loaded()
+            entries = dict(self._entries)
+        for name in folder_paths.get_filename_list("loras"):
+            lora_path = folder_paths.get_full_path("loras", name)
+            entry = entries.get(lora_path)
+            if entry is not None:
+                result[name] = entry["meta"]
+        return result
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._status)
+
+    # ---------------------------------------------------------------- 后台索引
+    def start(self) -> bool:
+        """启动后台全量索引；已在运行时返回 False"""
+        if not self._claim():
+            return False
+        threading.Thread(target=self._run, name="xbhh-lora-meta", daemon=True).start()
+        return True
+
+    def run(self) -> bool:
+        """在当前线程中完成一次全量索引（启动预热使用，受 io_pace 限速）；已在运行时返回 False"""
+        if not self._claim():
+            return False
+        self._run()
+        return True
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+            return True
+
+    def _run(self):
+        try:
+            self._index_all()
+        finally:
+            with self._lock:
+                self._running = False
+
+    def _index_all(self):
+        start = time.perf_counter()
+        names = [n for n in folder_paths.get_filename_list("loras") if n.lower().endswith(".safetensors")]
+        with self._lock:
+            self._ensure_loaded()
+            self._status.update(state="running", total=len(names), done=0, indexed=0, errors=0)
+
+        seen = set()
+        for i, name in enumerate(names):
+            pace(files=1)
+            lora_path = folder_paths.get_full_path("loras", name)
+            if lora_path is not None:
+                seen.add(lora_path)
+                try:
+                    with self._lock:
+                        before = self._entries.get(lora_path)
+                    self.get_path_meta(lora_path)
+                    if self._entries.get(lora_path) is not before:
+                        with self._lock:
+                            self._status["indexed"] += 1
+                except (OSError, ValueError) as e:
+                    with self._lock:
+                        self._status["errors"] += 1
+                    print(f"[XBHH] Error reading LoRA header {name}: {e}")
+
+            with self._lock:
+                self._status["done"] = i + 1
+                self._status["elapsed"] = round(time.perf_counter() - start, 3)
+            if (i + 1) % SAVE_EVERY == 0:
+                self.save()
+
+        # 清理已删除的文件
+        with self._lock:
+            stale = [p for p in self._entries if p not in seen]
+            for p in stale:
+                del self._entries[p]
+            if stale:
+                self._dirty = True
+        self.save()
+
+        with self._lock:
+            self._status["state"] = "done"
+            self._status["elapsed"] = round(time.perf_counter() - start, 3)
+
+
+# 单例索引实例
+_index_instance: Optional[LoraMetaIndex] = None
+_index_lock = threading.Lock()
+
+def get_lora_meta_index() -> LoraMetaIndex:
+    """获取 LoRA 元数据索引单例实例"""
+    global _index_instance
+    with _index_lock:
+        if _index_instance is None:
+            _index_instance = LoraMetaIndex()
+    return _index_instance
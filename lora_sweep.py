@@ -0,0 +1,144 @@
+import itertools
+
+import folder_paths
+
+from .lora_core import get_lora_by_filename, get_lora_engine
+from .metrics import timed
+
+
+# 单个强度序列的最大步数
+MAX_SWEEP_STEPS = 100
+
+
+def parse_schedule(text, default=None):
+    """
+    解析强度序列
+
+    支持:
+    - 逗号分隔的列表: "0, 0.5, 1"
+    - 闭区间步进: "0:1:0.25" → 0, 0.25, 0.5, 0.75, 1
+    留空时返回 default。
+    """
+    text = (text or "").strip()
+    if not text:
+        return list(default) if default is not None else []
+
+    values = []
+    for part in text.replace("\n", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            try:
+                start, stop, step = (float(x) for x in part.split(":"))
+            except ValueError:
+                raise ValueError(f"无效的强度区间: {part}（格式 起点:终点:步长）")
+            if step == 0 or (stop - start) / step < 0:
+                raise ValueError(f"无效的强度区间: {part}")
+            count = int(round((stop - start) / step)) + 1
+            if count > MAX_SWEEP_STEPS:
+                raise ValueError(f"强度区间步数过多: {count} > {MAX_SWEEP_STEPS}")
+            values.extend(round(start + i * step, 6) for i in range(count))
+        else:
+            try:
+                values.append(float(part))
+            except ValueError:
+                raise ValueError(f"无效的强度值: {part}")
+
+    if len(values) > MAX_SWEEP_STEPS:
+        raise ValueError(f"强度序列过长: {len(values)} > {MAX_SWEEP_STEPS}")
+    return values
+
+
+class XBHHLoraStrengthSweep:
+    """
+    XBHH LoRA 强度扫描
+
+    对一个或两个 LoRA 按强度序列批量生成模型，输出列表：
+    - 每个 LoRA 只读取和转换一次，每一步只克隆模型并以新强度挂载补丁
+    - 两个 LoRA 时可选网格（笛卡尔积）或逐项配对
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        loras = folder_paths.get_filename_list("loras")
+        return {
+            "required": {
+                "model": ("MODEL",),
+                "lora_name": (loras,),
+                "strengths": ("STRING", {"default": "0:1:0.25", "tooltip": "模型强度序列，如 0,0.5,1 或 0:1:0.25"}),
+            },
+            "optional": {
+                "clip": ("CLIP",),
+                "clip_strengths": ("STRING", {"default": "", "tooltip": "CLIP 强度序列，留空时与模型强度相同"}),
+                "lora_name_2": (["None"] + loras, {"default": "None"}),
+                "strengths_2": ("STRING", {"default": "0:1:0.25", "tooltip": "第二个 LoRA 的强度序列（CLIP 强度相同）"}),
+                "mode": (["grid", "zip"], {"default": "grid", "tooltip": "grid: 两个序列的所有组合; zip: 按位置配对"}),
+            }
+        }
+
+    RETURN_TYPES = ("MODEL", "CLIP", "STRING")
+    RETURN_NAMES = ("MODEL", "CLIP", "labels")
+    OUTPUT_IS_LIST = (True, True, True)
+    FUNCTION = "sweep"
+    CATEGORY = "XBHH/loaders"
+
+    @timed("lora_sweep")
+    def sweep(self, model, lora_name, strengths, clip=None, clip_strengths="",
+              lora_name_2="None", strengths_2="", mode="grid"):
+        engine = get_lora_engine()
+
+        strengths_model = parse_schedule(strengths)
+        if not strengths_model:
+            raise ValueError("强度序列不能为空")
+        strengths_clip = parse_schedule(clip_strengths, default=strengths_model)
+        if len(strengths_clip) != len(strengths_model):
+            raise ValueError("CLIP 强度序列长度必须与模型强度序列相同")
+        steps = [[(lora_name, sm, sc) for sm, sc in zip(strengths_model, strengths_clip)]]
+
+        if lora_name_2 and lora_name_2 != "None":
+            strengths_second = parse_schedule(strengths_2)
+            if not strengths_second:
+                raise ValueError("第二个 LoRA 的强度序列不能为空")
+            steps.append([(lora_name_2, s, s) for s in strengths_second])
+
+        if mode == "zip":
+            if len(steps) > 1 and len(steps[0]) != len(steps[1]):
+                raise ValueError("zip 模式下两个强度序列长度必须相同")
+            combos = list(zip(*steps))
+        else:
+            combos = list(itertools.product(*steps))
+
+        # 每个 LoRA 只读取并转换一次
+        patches = {}
+        for sequence in steps:
+            name = sequence[0][0]
+            lora_file = get_lora_by_filename(name)
+            if lora_file is None:
+                raise FileNotFoundError(f"LoRA not found: {name}")
+            patches[name] = engine.load_patches(model, clip, lora_file)
+
+        models, clips, labels = [], [], []
+        for combo in combos:
+            m, c = model, clip
+            parts = []
+            for name, sm, sc in combo:
+                m, c = engine.apply_patches(m, c, patches[name], sm, sc if clip is not None else 0)
+                label = f"{name.rsplit('/', 1)[-1]}:{sm:g}"
+                if clip is not None and sc != sm:
+                    label += f"/{sc:g}"
+                parts.append(label)
+            models.append(m)
+            clips.append(c)
+            labels.append(", ".join(parts))
+
+        return (models, clips, labels)
+
+
+# 注册节点
+NODE_CLASS_MAPPINGS = {
+    "XBHHLoraStrengthSweep": XBHHLoraStrengthSweep
+}
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "XBHHLoraStrengthSweep": "XBHH Lora Strength Sweep 🎚️"
+}
@@ -0,0 +1,349 @@
+"""
+XBHH LoRA 半精度转码缓存（默认关闭）
+
+很多 LoRA 以 fp32 保存，而打补丁时并不需要这么高的精度。开启后：
+- 加载 fp32 LoRA 时把它排入后台队列，转码为 fp16/bf16 副本写入缓存目录
+- 之后的加载透明地改读副本，磁盘读取量和内存缓存占用约减半
+- 副本按源文件 SHA-256 命名（内容相同的文件共用一个副本），并记录源文件 size/mtime 用于失效
+- 缓存总大小有上限，超出时按最近使用淘汰；被淘汰的源文件之后再被加载时重新转码
+- 副本预计（约为源文件一半）就超过上限的源文件不转码，避免转码后立即被淘汰的循环
+
+fp16 超出表示范围的张量保留原精度。
+配置保存在 user/xbhh/lora_transcode.json，可通过 /xbhh/lora_transcode 查看和修改。
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+from typing import Optional, Dict, Any
+
+import torch
+import folder_paths
+from safetensors import safe_open
+from safetensors.torch import load_file, save_file
+
+from .lora_hash import get_lora_hash_index
+
+
+TRANSCODE_DTYPES = {
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+}
+# fp16 能表示的最大值
+FP16_MAX = 65504.0
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "dtype": "fp16",
+    "max_bytes": 8 * 1024 * 1024 * 1024,
+}
+
+
+class LoraTranscodeCache:
+    """LoRA 半精度副本缓存"""
+
+    DATA_DIR_NAME = "xbhh"
+    CACHE_DIR_NAME = "lora_transcoded"
+    CONFIG_FILE_NAME = "lora_transcode.json"
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._config = None
+        # 源文件完整路径 -> {"size", "mtime_ns", "sha256", "dtype", "file"}
+        # file 为 None 表示源文件没有可转码的 fp32 张量或转码失败
+        self._index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._thread: Optional[threading.Thread] = None
+        self._status = {
+            "converted": 0,
+            "skipped": 0,
+            "errors": 0,
+            "saved_bytes": 0,
+            "evicted": 0,
+        }
+
+    def _get_data_dir(self) -> str:
+        user_dir = folder_paths.get_user_directory()
+        return os.path.join(user_dir, self.DATA_DIR_NAME)
+
+    def _get_cache_dir(self) -> str:
+        return os.path.join(self._get_data_dir(), self.CACHE_DIR_NAME)
+
+    # ---------------------------------------------------------------- 配置
+    def get_config(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._config is None:
+                self._config = dict(DEFAULT_CONFIG)
+                path = os.path.join(self._get_data_dir(), self.CONFIG_FILE_NAME)
+                if os.path.exists(path):
+                    try:
+                        with open(path, "r", encoding="utf-8") as f:
+                            self._config.update(json.load(f))
+                    except (json.JSONDecodeError, IOError) as e:
+                        print(f"[XBHH] Error loading LoRA transcode config: {e}")
+            return dict(self._config)
+
+    def set_config(self, **changes) -> Dict[str, Any]:
+        """修改并保存配置，忽略未知或非法的值"""
+        config = self.get_config()
+        if "enabled" in changes:
+            config["enabled"] = bool(changes["enabled"])
+        if changes.get("dtype") in TRANSCODE_DTYPES:
+            config["dtype"] = changes["dtype"]
+        if "max_bytes" in changes:
+            try:
+                config["max_bytes"] = max(0, int(changes["max_bytes"]))
+            except (TypeError, ValueError):
+                pass
+
+        path = os.path.join(self._get_data_dir(), self.CONFIG_FILE_NAME)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+        with self._lock:
+            self._config = config
+        self._prune()
+        return dict(config)
+
+    # ---------------------------------------------------------------- 索引
+    def _ensure_index(self):
+        """首次使用时读取索引（调用方需持有锁）"""
+        if self._index is not None:
+            return
+        self._index = {}
+        path = os.path.join(self._get_cache_dir(), self.INDEX_FILE_NAME)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    # 旧版本把被淘汰的源文件标记为 evicted 并永不重新转码，这里丢弃这些条目
+                    self._index = {p: e for p, e in json.load(f).items() if not e.get("evicted")}
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"[XBHH] Error loading LoRA transcode index: {e}")
+
+    def _save_index(self):
+        with self._lock:
+            data = dict(self._index or {})
+        cache_dir = self._get_cache_dir()
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, self.INDEX_FILE_NAME)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except IOError as e:
+            print(f"[XBHH] Error saving LoRA transcode index: {e}")
+
+    # ---------------------------------------------------------------- 查询
+    def resolve(self, lora_path: str) -> str:
+        """
+        返回实际应读取的文件：已有有效副本时为副本路径，否则为源文件
+
+        未开启或不适用时原样返回；缺少副本时排入后台转码。
+        """
+        config = self.get_config()
+        if not config["enabled"] or not lora_path.lower().endswith(".safetensors"):
+            return lora_path
+        # 插件自己生成的文件（烘焙结果、副本本身）不再转码
+        data_dir = os.path.abspath(self._get_data_dir())
+        if os.path.abspath(lora_path).startswith(data_dir + os.sep):
+            return lora_path
+
+        try:
+            st = os.stat(lora_path)
+        except OSError:
+            return lora_path
+        # 半精度副本至少是源文件的一半，超过上限时转码后也会立即被淘汰
+        if st.st_size // 2 > config["max_bytes"]:
+            return lora_path
+
+        with self._lock:
+            self._ensure_index()
+            entry = self._index.get(lora_path)
+        if (entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+                and entry["dtype"] == config["dtype"]):
+            if entry["file"] is None:
+                return lora_path
+            cached = os.path.join(self._get_cache_dir(), entry["file"])
+            if os.path.isfile(cached):
+                # 只更新访问时间作为最近使用标记
+                os.utime(cached, ns=(time.time_ns(), os.stat(cached).st_mtime_ns))
+                return cached
+
+        self._enqueue(lora_path)
+        return lora_path
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_index()
+            files = {e["file"] for e in self._index.values() if e.get("file")}
+            status = dict(self._status)
+            status["pending"] = len(self._pending)
+        cache_dir = self._get_cache_dir()
+        status["cached_files"] = len(files)
+        status["cached_bytes"] = sum(
+            os.path.getsize(os.path.join(cache_dir, f)) for f in files if os.path.isfile(os.path.join(cache_dir, f))
+        )
+        return status
+
+    # ---------------------------------------------------------------- 后台转码
+    def _enqueue(self, lora_path):
+        with self._lock:
+            if lora_path in self._pending:
+                return
+            self._pending.add(lora_path)
+            # 在锁内入队，避免工作线程恰好在空闲退出时漏掉任务
+            self._queue.put(lora_path)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="xbhh-lora-transcode", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                lora_path = self._queue.get(timeout=30)
+            except queue.Empty:
+                # 空闲时退出，下次有任务时重新启动
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            try:
+                self._transcode(lora_path)
+            except Exception as e:
+                with self._lock:
+                    self._status["errors"] += 1
+                print(f"[XBHH] Error transcoding LoRA {os.path.basename(lora_path)}: {e}")
+                self._mark_failed(lora_path)
+            finally:
+                with self._lock:
+                    self._pending.discard(lora_path)
+
+    def _transcode(self, lora_path):
+        config = self.get_config()
+        dtype_name = config["dtype"]
+        target = TRANSCODE_DTYPES[dtype_name]
+
+        st = os.stat(lora_path)
+        if st.st_size // 2 > config["max_bytes"]:
+            return
+        sha = get_lora_hash_index().hash_path(lora_path, self._lora_name(lora_path))["sha256"]
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha, "dtype": dtype_name, "file": None}
+
+        file_name = f"{sha[:32]}.{dtype_name}.safetensors"
+        cache_dir = self._get_cache_dir()
+        cached = os.path.join(cache_dir, file_name)
+
+        if os.path.isfile(cached):
+            # 内容相同的另一个文件已经转码过
+            entry["file"] = file_name
+        else:
+            with safe_open(lora_path, framework="pt") as f:
+                metadata = f.metadata() or {}
+            tensors = load_file(lora_path)
+            converted = 0
+            for key, tensor in tensors.items():
+                if tensor.dtype != torch.float32:
+                    continue
+                if target == torch.float16 and tensor.numel() and tensor.abs().max().item() > FP16_MAX:
+                    continue
+                tensors[key] = tensor.to(target)
+                converted += 1
+
+            if converted:
+                metadata = {**metadata, "xbhh_transcoded_from": os.path.basename(lora_path)}
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = cached + ".tmp"
+                save_file(tensors, tmp_path, metadata=metadata)
+                os.replace(tmp_path, cached)
+                entry["file"] = file_name
+            del tensors
+
+        with self._lock:
+            self._ensure_index()
+            self._index[lora_path] = entry
+            if entry["file"] is None:
+                self._status["skipped"] += 1
+            else:
+                self._status["converted"] += 1
+                self._status["saved_bytes"] += max(0, st.st_size - os.path.getsize(cached))
+        self._prune()
+        self._save_index()
+
+    def _mark_failed(self, lora_path):
+        """记录失败，源文件变化前不再重试"""
+        try:
+            st = os.stat(lora_path)
+        except OSError:
+            return
+        with self._lock:
+            self._ensure_index()
+            self._index[lora_path] = {
+                "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": "",
+                "dtype": self.get_config()["dtype"], "file": None,
+            }
+        self._save_index()
+
+    @staticmethod
+    def _lora_name(lora_path):
+        """源文件在 loras 列表中的名称（用于哈希索引）"""
+        full = os.path.abspath(lora_path)
+        for base in folder_paths.get_folder_paths("loras"):
+            base = os.path.abspath(base)
+            if full.startswith(base + os.sep):
+                return os.path.relpath(full, base).replace(os.sep, "/")
+        return os.path.basename(lora_path)
+
+    def _prune(self):
+        """按最近使用淘汰副本，直到总大小不超过上限"""
+        max_bytes = self.get_config()["max_bytes"]
+        cache_dir = self._get_cache_dir()
+        if not os.path.isdir(cache_dir):
+            return
+
+        files = []
+        total = 0
+        for name in os.listdir(cache_dir):
+            if not name.endswith(".safetensors"):
+                continue
+            path = os.path.join(cache_dir, name)
+            st = os.stat(path)
+            files.append((st.st_atime, st.st_size, name))
+            total += st.st_size
+
+        removed = set()
+        for _, size, name in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+            removed.add(name)
+
+        if removed:
+            with self._lock:
+                self._ensure_index()
+                # 删除条目：源文件之后再被加载时重新转码
+                for path in [p for p, e in self._index.items() if e.get("file") in removed]:
+                    del self._index[path]
+                self._status["evicted"] += len(removed)
+            self._save_index()
+
+
+# 单例实例
+_cache_instance: Optional[LoraTranscodeCache] = None
+_cache_lock = threading.Lock()
+
+def get_transcode_cache() -> LoraTranscodeCache:
+    """获取 LoRA 转码缓存单例实例"""
+    global _cache_instance
+    with _cache_lock:
+        if _cache_instance is None:
+            _cache_instance = LoraTranscodeCache()
+    return _cache_instance
@@ -0,0 +1,203 @@
+"""
+XBHH 轻量指标注册表
+
+- 计数器、固定分桶直方图、缓存命中率
+- timed 装饰器：同时支持普通函数和 async 路由处理函数
+- 以 Prometheus 文本格式在 /xbhh/metrics 暴露
+
+本模块不依赖 ComfyUI，节点模块可直接导入；路由由插件入口调用 setup_routes 注册。
+"""
+
+import time
+import bisect
+import asyncio
+import functools
+import threading
+from typing import Dict, Tuple, Callable, List
+
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        # 名称 -> {标签: 值}
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        # 名称 -> {标签: [各分桶计数, 总和, 次数]}
+        self._histograms: Dict[str, Dict[tuple, list]] = {}
+        # 采集时调用，返回 [(名称, 类型, 说明, 标签字典, 值)]
+        self._collectors: List[Callable] = []
+
+    def _declare(self, name, kind, help_text):
+        if name not in self._help:
+            self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, help: str = "", **labels):
+        """计数器加值"""
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._declare(name, "counter", help)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, help: str = "", **labels):
+        """直方图记录一个观测值"""
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._declare(name, "histogram", help)
+            series = self._histograms.setdefault(name, {})
+            data = series.get(key)
+            if data is None:
+                data = series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                data[0][index] += 1
+            data[1] += value
+            data[2] += 1
+
+    def cache_hit(self, cache: str):
+        self.inc("xbhh_cache_requests_total", help="缓存访问次数", cache=cache, result="hit")
+
+    def cache_miss(self, cache: str):
+        self.inc("xbhh_cache_requests_total", help="缓存访问次数", cache=cache, result="miss")
+
+    def register_collector(self, collector: Callable):
+        """注册采集回调，用于导出由其他模块维护的实时数值"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """渲染为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            for name, series in self._counters.items():
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series.items():
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+            for name, series in self._histograms.items():
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, (counts, total, count) in series.items():
+                    cumulative = 0
+                    for bound, n in zip(self.buckets + (float("inf"),), counts + [count - sum(counts)]):
+                        cumulative += n
+                        le = labels + (("le", _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(le)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+            # 根据命中/未命中计数计算各缓存命中率
+            requests = self._counters.get("xbhh_cache_requests_total", {})
+            ratios = {}
+            for labels, value in requests.items():
+                d = dict(labels)
+                hit, total = ratios.get(d["cache"], (0, 0))
+                ratios[d["cache"]] = (hit + (value if d["result"] == "hit" else 0), total + value)
+            collectors = list(self._collectors)
+
+        if ratios:
+            lines.append("# HELP xbhh_cache_hit_ratio 缓存命中率")
+            lines.append("# TYPE xbhh_cache_hit_ratio gauge")
+            for cache, (hit, total) in ratios.items():
+                lines.append(f'xbhh_cache_hit_ratio{{cache="{_escape(cache)}"}} {_format_value(hit / total if total else 0.0)}')
+
+        declared = set()
+        for collector in collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                print(f"[XBHH] Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                if name not in declared:
+                    declared.add(name)
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {kind}")
+                key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表
+registry = MetricsRegistry()
+
+
+def timed(target: str):
+    """
+    记录函数耗时和异常次数
+
+    指标: xbhh_call_duration_seconds{target=...}、xbhh_call_errors_total{target=...}
+    """
+    def decorator(func):
+        def record(start, failed):
+            registry.observe("xbhh_call_duration_seconds", time.perf_counter() - start,
+                             help="节点与路由的调用耗时", target=target)
+            if failed:
+                registry.inc("xbhh_call_errors_total", help="节点与路由抛出异常的次数", target=target)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                failed = True
+                try:
+                    result = await func(*args, **kwargs)
+                    failed = False
+                    return result
+                finally:
+                    record(start, failed)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                record(start, failed)
+        return wrapper
+
+    return decorator
+
+
+def setup_routes():
+    """注册 /xbhh/metrics 路由"""
+    from server import PromptServer
+    from aiohttp import web
+
+    @PromptServer.instance.routes.get("/xbhh/metrics")
+    async def get_metrics(request):
+        return web.Response(
+            body=registry.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
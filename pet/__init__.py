@@ -1,16 +1,34 @@
 # XBHH Pet Module - 仅保留 CUI 虚拟货币和图片保存功能
+from ..lazy_nodes import lazy_node
 from .wallet import CUIWallet
-from .save_image_cui import XBHHSaveImageWithCUI
 from .live2d_api import Live2DApi
+# 写入队列的路由需在启动时注册
+from . import write_queue
 
 Live2DApi.setup()
 
+# 节点名 -> (相对插件根包的模块, 类名, 显示名)
+NODE_MANIFEST = {
+    "XBHHSaveImageWithCUI": (".pet.save_image_cui", "XBHHSaveImageWithCUI", "xbhh 保存图片 (CUI奖励) 💰"),
+}
+
 NODE_CLASS_MAPPINGS = {
-    "XBHHSaveImageWithCUI": XBHHSaveImageWithCUI,
+    name: lazy_node(module, class_name, package=__package__.rsplit(".", 1)[0])
+    for name, (module, class_name, _) in NODE_MANIFEST.items()
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "XBHHSaveImageWithCUI": "xbhh 保存图片 (CUI奖励) 💰",
+    name: display_name
+    for name, (_, _, display_name) in NODE_MANIFEST.items()
 }
 
+
+def __getattr__(name):
+    # 保存节点依赖 numpy/PIL，按需导入
+    if name == "XBHHSaveImageWithCUI":
+        from .save_image_cui import XBHHSaveImageWithCUI
+        return XBHHSaveImageWithCUI
+    raise AttributeError(name)
+
+
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "CUIWallet", "XBHHSaveImageWithCUI"]
@@ -1,49 +1,229 @@
 import os
+import gzip
 import json
+import hashlib
+import threading
 from server import PromptServer
 from aiohttp import web
 
+from .live2d_bundle import get_bundle_cache
+from ..io_pace import pace
+from ..metrics import registry, timed
+from ..route_pool import coalesce
+from ..shared_catalog import get_catalog_store
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
 class Live2DApi:
+    # waifu-tips.json 缓存：模板 mtime 或模型目录变化时重新生成
+    _tips_key = None
+    _tips_variants = None
+    _tips_lock = threading.Lock()
+
     @classmethod
     def setup(cls):
         @PromptServer.instance.routes.get("/xbhh/live2d_models")
+        @timed("live2d_models")
         async def get_models(request):
-            return web.json_response(cls.scan_models())
+            # 目录扫描放到路由线程池，并发请求只扫描一次
+            _, body, etag = await coalesce("live2d_models", cls.get_catalog)
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers={"ETag": etag})
+            return web.Response(body=body, content_type="application/json", headers={
+                "ETag": etag,
+                "Cache-Control": "no-cache"
+            })
 
         @PromptServer.instance.routes.get("/xbhh/waifu-tips.json")
         async def get_waifu_tips(request):
-            root_path = os.path.dirname(os.path.dirname(__file__))
-            ext_name = os.path.basename(root_path)
-            # 原始 JSON 模板路径
-            json_path = os.path.join(root_path, "web", "js", "pet", "waifu-tips.json")
-            
-            if not os.path.exists(json_path):
-                return web.Response(status=404)
-                
             try:
-                with open(json_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                
-                # 动态注入扫描到的 V2 模型
-                scanned = cls.scan_models()
-                v2_models = []
-                for m in scanned["v2"]:
-                    v2_models.append({
-                        "name": m["name"],
-                        "paths": [f"/extensions/{ext_name}/live2d/v2/{m['name']}/{c}" for c in m["clothes"]],
-                        "message": f"来自 {m['name']} 的动态加载模型 ~"
-                    })
-                
-                if v2_models:
-                    data["models"] = v2_models
-                    
-                return web.json_response(data)
+                variants = await coalesce("waifu_tips", cls.get_waifu_tips)
             except Exception as e:
                 print(f"[XBHH] Error generating dynamic waifu-tips.json: {e}")
                 return web.Response(status=500)
 
+            if variants is None:
+                return web.Response(status=404)
+
+            # 按 Accept-Encoding 选择预压缩的版本
+            accept = request.headers.get("Accept-Encoding", "")
+            encoding = "identity"
+            for candidate in ("br", "gzip"):
+                if candidate in variants and candidate in accept:
+                    encoding = candidate
+                    break
+            body, etag = variants[encoding]
+
+            headers = {
+                "ETag": etag,
+                "Cache-Control": "no-cache",
+                "Vary": "Accept-Encoding"
+            }
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers=headers)
+            if encoding != "identity":
+                headers["Content-Encoding"] = encoding
+            return web.Response(body=body, content_type="application/json", headers=headers)
+
+        @PromptServer.instance.routes.get("/xbhh/live2d_bundle/{version}/{name}")
+        async def get_model_bundle(request):
+            version = request.match_info["version"]
+            name = request.match_info["name"]
+            entry = request.query.get("entry", "")
+
+            if version not in ("v2", "v4", "v5"):
+                return web.Response(status=400)
+            # 只允许模型目录下的文件名，禁止路径穿越（NUL 会让 os.path 抛出 ValueError）
+            for part in (name, entry):
+                if "/" in part or "\\" in part or "\0" in part or part in (".", ".."):
+                    return web.Response(status=400)
+
+            model_dir = os.path.join(cls._get_live2d_path(), version, name)
+            entry = await coalesce(("live2d_entry", model_dir, entry), cls._resolve_entry, version, model_dir, entry)
+            if not entry:
+                return web.Response(status=404)
+
+            try:
+                # 打包需要读取全部资源，放到线程池中执行，同一模型的并发请求只打包一次
+                bundle = await coalesce(
+                    ("live2d_bundle", model_dir, entry), get_bundle_cache().get_bundle, model_dir, entry
+                )
+            except Exception as e:
+                print(f"[XBHH] Error building Live2D bundle {version}/{name}: {e}")
+                return web.Response(status=500)
+
+            headers = {"ETag": bundle["etag"], "Cache-Control": "no-cache"}
+            if request.headers.get("If-None-Match") == bundle["etag"]:
+                return web.Response(status=304, headers=headers)
+            headers["Content-Type"] = "application/octet-stream"
+            return web.FileResponse(bundle["path"], headers=headers)
+
+    @classmethod
+    def _resolve_entry(cls, version, model_dir, entry):
+        """校验模型目录和入口文件，未指定入口时自动查找；不存在时返回 None"""
+        if not os.path.isdir(model_dir):
+            return None
+        if not entry:
+            entry = cls._find_entry(version, model_dir)
+        if not entry or not os.path.isfile(os.path.join(model_dir, entry)):
+            return None
+        return entry
+
+    @staticmethod
+    def _find_entry(version, model_dir):
+        """模型入口文件：V2 为 model.json，V4/V5 为第一个 *.model3.json"""
+        if version == "v2":
+            return "model.json"
+        for filename in sorted(os.listdir(model_dir)):
+            if filename.endswith(".model3.json"):
+                return filename
+        return None
+
+    @classmethod
+    def get_waifu_tips(cls):
+        """
+        获取注入了 V2 模型列表的 waifu-tips.json
+
+        只在模板文件或模型目录变化时重新生成，结果以
+        {编码: (字节, ETag)} 形式缓存，包含 identity/gzip（以及可用时的 br）。
+        模板不存在时返回 None。
+        """
+        root_path = os.path.dirname(os.path.dirname(__file__))
+        ext_name = os.path.basename(root_path)
+        # 原始 JSON 模板路径
+        json_path = os.path.join(root_path, "web", "js", "pet", "waifu-tips.json")
+
+        try:
+            st = os.stat(json_path)
+        except OSError:
+            return None
+
+        scanned, _, catalog_etag = cls.get_catalog()
+        key = (st.st_mtime_ns, st.st_size, catalog_etag)
+
+        with cls._tips_lock:
+            if cls._tips_key == key:
+                registry.cache_hit("waifu_tips")
+                return cls._tips_variants
+            registry.cache_miss("waifu_tips")
+
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+            # 动态注入扫描到的 V2 模型
+            v2_models = []
+            for m in scanned["v2"]:
+                v2_models.append({
+                    "name": m["name"],
+                    "paths": [f"/extensions/{ext_name}/live2d/v2/{m['name']}/{c}" for c in m["clothes"]],
+                    "message": f"来自 {m['name']} 的动态加载模型 ~"
+                })
+
+            if v2_models:
+                data["models"] = v2_models
+
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            tag = hashlib.sha1(body).hexdigest()[:16]
+            variants = {
+                "identity": (body, f'"{tag}"'),
+                "gzip": (gzip.compress(body, compresslevel=9), f'"{tag}-gzip"'),
+            }
+            if BROTLI_AVAILABLE:
+                variants["br"] = (brotli.compress(body), f'"{tag}-br"')
+
+            cls._tips_key = key
+            cls._tips_variants = variants
+            return variants
+
+    @staticmethod
+    def _get_live2d_path():
+        root_path = os.path.dirname(os.path.dirname(__file__))
+        return os.path.join(root_path, "web", "live2d")
+
+    @classmethod
+    def _watched_dirs(cls):
+        """需要监视的目录：live2d 根目录、各版本目录以及每个模型目录"""
+        live2d_path = cls._get_live2d_path()
+        dirs = [live2d_path] + [os.path.join(live2d_path, v) for v in ("v2", "v4", "v5")]
+        for v_dir in ("v2", "v4", "v5"):
+            v_path = os.path.join(live2d_path, v_dir)
+            if os.path.isdir(v_path):
+                for dirname in os.listdir(v_path):
+                    pace(files=1)
+                    dirpath = os.path.join(v_path, dirname)
+                    if os.path.isdir(dirpath):
+                        dirs.append(dirpath)
+        return dirs
+
+    @classmethod
+    def get_catalog(cls):
+        """
+        获取模型目录（多进程共享，见 shared_catalog.py）
+
+        Returns:
+            (models, 预序列化的 JSON 字节, ETag)
+        """
+        live2d_path = cls._get_live2d_path()
+        name = "live2d-" + hashlib.sha1(live2d_path.encode("utf-8")).hexdigest()[:12]
+        snapshot = get_catalog_store().get(name, cls._watched_dirs, cls._build_catalog)
+        return snapshot.json("models"), snapshot.section("models"), snapshot.etag("models")
+
+    @classmethod
+    def _build_catalog(cls):
+        models = cls._scan_models_uncached()
+        return {"models": json.dumps(models, ensure_ascii=False).encode("utf-8")}
+
+    @classmethod
+    def scan_models(cls):
+        """获取模型列表（使用缓存）"""
+        return cls.get_catalog()[0]
+
     @staticmethod
-    def scan_models():
+    def _scan_models_uncached():
         # 获取插件根目录
         root_path = os.path.dirname(os.path.dirname(__file__))
         ext_name = os.path.basename(root_path)
@@ -63,6 +243,7 @@ class Live2DApi:
         if os.path.exists(v2_path):
             if os.path.isdir(v2_path):
                 for dirname in os.listdir(v2_path):
+                    pace(files=1)
                     dirpath = os.path.join(v2_path, dirname)
                     if os.path.isdir(dirpath):
                         # 查找 model.json 作为主入口
@@ -85,6 +266,7 @@ class Live2DApi:
             v_path = os.path.join(live2d_path, v_dir)
             if os.path.exists(v_path):
                 for dirname in os.listdir(v_path):
+                    pace(files=1)
                     dirpath = os.path.join(v_path, dirname)
                     if os.path.isdir(dirpath):
                         for filename in os.listdir(dirpath):
@@ -0,0 +1,189 @@
+"""
+XBHH Live2D 模型打包
+
+把一个模型入口文件 (model.json / *.model3.json) 及其引用的全部资源
+打包成单个文件，浏览器一次请求即可拿到整个模型。
+
+包格式:
+    b"XL2B" | uint32 LE 清单长度 | 清单 JSON (UTF-8) | 资源数据
+清单:
+    {"entry": 入口文件, "signature": 签名, "files": [{"path", "offset", "size"}]}
+    offset 相对于资源数据起点。
+
+打包结果缓存在用户目录下，按入口及资源文件的 size/mtime 签名失效。
+"""
+
+import os
+import json
+import struct
+import hashlib
+import threading
+from typing import Optional, Dict, Any, List
+
+import folder_paths
+
+
+BUNDLE_MAGIC = b"XL2B"
+BUNDLE_VERSION = 1
+
+
+class Live2DBundleCache:
+    """Live2D 模型打包缓存"""
+
+    DATA_DIR_NAME = "xbhh_pet"
+    BUNDLE_DIR_NAME = "live2d_bundles"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 缓存键 -> {"path", "files", "signature", "etag"}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # 缓存键 -> 打包锁；只串行同一个模型的打包，不同模型互不阻塞
+        self._bundle_locks: Dict[str, threading.Lock] = {}
+
+    def _get_bundle_dir(self) -> str:
+        user_dir = folder_paths.get_user_directory()
+        return os.path.join(user_dir, self.DATA_DIR_NAME, self.BUNDLE_DIR_NAME)
+
+    @staticmethod
+    def _signature(model_dir: str, entry: str, files: List[str]) -> str:
+        """入口文件及所有资源的 size/mtime 签名"""
+        h = hashlib.sha1(str(BUNDLE_VERSION).encode())
+        for rel in [entry] + files:
+            st = os.stat(os.path.join(model_dir, rel))
+            h.update(f"{rel}|{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def _collect_references(model_dir: str, entry: str) -> List[str]:
+        """
+        收集入口文件中引用的资源（相对模型目录的路径）
+
+        遍历 JSON 中所有字符串值，凡是能解析到模型目录内已存在文件的都算引用，
+        因此同时适用于 V2 的 model.json 和 V4/V5 的 model3.json。
+        """
+        with open(os.path.join(model_dir, entry), "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        entry_dir = os.path.dirname(os.path.join(model_dir, entry))
+        model_root = os.path.abspath(model_dir)
+        found = []
+        seen = set()
+
+        def walk(node):
+            if isinstance(node, dict):
+                for v in node.values():
+                    walk(v)
+            elif isinstance(node, list):
+                for v in node:
+                    walk(v)
+            elif isinstance(node, str) and node and "://" not in node:
+                full = os.path.abspath(os.path.join(entry_dir, node))
+                if os.path.commonpath((model_root, full)) != model_root:
+                    return
+                if not os.path.isfile(full):
+                    return
+                rel = os.path.relpath(full, model_root).replace(os.sep, "/")
+                if rel not in seen and rel != entry:
+                    seen.add(rel)
+                    found.append(rel)
+
+        walk(data)
+        return found
+
+    @staticmethod
+    def _read_header(bundle_path: str) -> Optional[Dict[str, Any]]:
+        """读取已缓存包的清单，格式不符时返回 None"""
+        try:
+            with open(bundle_path, "rb") as f:
+                if f.read(4) != BUNDLE_MAGIC:
+                    return None
+                (length,) = struct.unpack("<I", f.read(4))
+                return json.loads(f.read(length).decode("utf-8"))
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def _build(self, model_dir: str, entry: str, bundle_path: str) -> Dict[str, Any]:
+        """读取全部资源并写出新的包"""
+        files = self._collect_references(model_dir, entry)
+        signature = self._signature(model_dir, entry, files)
+
+        manifest_files = []
+        offset = 0
+        for rel in [entry] + files:
+            size = os.path.getsize(os.path.join(model_dir, rel))
+            manifest_files.append({"path": rel, "offset": offset, "size": size})
+            offset += size
+
+        manifest = json.dumps({
+            "entry": entry,
+            "signature": signature,
+            "files": manifest_files
+        }, ensure_ascii=False).encode("utf-8")
+
+        os.makedirs(os.path.dirname(bundle_path), exist_ok=True)
+        tmp_path = bundle_path + ".tmp"
+        with open(tmp_path, "wb") as out:
+            out.write(BUNDLE_MAGIC)
+            out.write(struct.pack("<I", len(manifest)))
+            out.write(manifest)
+            for item in manifest_files:
+                with open(os.path.join(model_dir, item["path"]), "rb") as src:
+                    out.write(src.read())
+        os.replace(tmp_path, bundle_path)
+
+        return {"files": files, "signature": signature}
+
+    def get_bundle(self, model_dir: str, entry: str) -> Dict[str, Any]:
+        """
+        获取模型包，必要时重新打包
+
+        Returns:
+            {"path": 包文件路径, "etag": ETag}
+        """
+        key = os.path.normcase(os.path.abspath(os.path.join(model_dir, entry)))
+        bundle_path = os.path.join(
+            self._get_bundle_dir(),
+            hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + ".bin"
+        )
+
+        with self._lock:
+            bundle_lock = self._bundle_locks.setdefault(key, threading.Lock())
+
+        with bundle_lock:
+            with self._lock:
+                cached = self._entries.get(key)
+            if cached is None:
+                # 进程重启后，先尝试复用磁盘上的包
+                header = self._read_header(bundle_path)
+                if header is not None and header.get("entry") == entry:
+                    cached = {
+                        "files": [f["path"] for f in header["files"][1:]],
+                        "signature": header.get("signature")
+                    }
+
+            valid = False
+            if cached is not None and os.path.isfile(bundle_path):
+                try:
+                    valid = self._signature(model_dir, entry, cached["files"]) == cached["signature"]
+                except OSError:
+                    valid = False
+
+            if not valid:
+                cached = self._build(model_dir, entry, bundle_path)
+
+            cached["path"] = bundle_path
+            cached["etag"] = '"' + cached["signature"][:20] + '"'
+            with self._lock:
+                self._entries[key] = cached
+            return {"path": bundle_path, "etag": cached["etag"]}
+
+
+# 单例打包缓存
+_bundle_cache_instance: Optional[Live2DBundleCache] = None
+
+def get_bundle_cache() -> Live2DBundleCache:
+    """获取打包缓存单例实例"""
+    global _bundle_cache_instance
+    if _bundle_cache_instance is None:
+        _bundle_cache_instance = Live2DBundleCache()
+    return _bundle_cache_instance
@@ -0,0 +1,114 @@
+"""
+XBHH 保存计数器缓存
+
+folder_paths.get_save_image_path 每次都会 listdir 输出目录来确定下一个序号，
+目录中图片很多时代价很高。这里按 (输出目录, 文件名前缀) 在内存中维护计数器：
+
+- 首次使用时调用一次 get_save_image_path 扫描目录作为初始值
+- 之后在锁内原子地预留整批序号，不再扫描
+- 仅当检测到目标文件已存在（冲突）或目录消失时重新扫描同步
+"""
+
+import os
+import threading
+from typing import Optional, Dict, Tuple
+
+import folder_paths
+
+
+class SaveCounterCache:
+    """按前缀缓存的保存序号分配器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, str], int] = {}
+
+    @staticmethod
+    def _key(full_output_folder: str, filename: str) -> Tuple[str, str]:
+        return (os.path.normcase(os.path.abspath(full_output_folder)), os.path.normcase(filename))
+
+    @staticmethod
+    def _is_static_prefix(filename_prefix: str) -> bool:
+        """前缀中没有需要服务端替换的 %变量%（%batch_num% 由节点自己替换）"""
+        return "%" not in filename_prefix.replace("%batch_num%", "")
+
+    @staticmethod
+    def _resolve(filename_prefix: str, output_dir: str):
+        """与 get_save_image_path 相同的路径拆分，但不扫描目录"""
+        subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+        filename = os.path.basename(os.path.normpath(filename_prefix))
+        full_output_folder = os.path.join(output_dir, subfolder)
+
+        if os.path.commonpath((output_dir, os.path.abspath(full_output_folder))) != output_dir:
+            err = "**** ERROR: Saving image outside the output folder is not allowed." + \
+                  "\n full_output_folder: " + os.path.abspath(full_output_folder) + \
+                  "\n         output_dir: " + output_dir + \
+                  "\n         commonpath: " + os.path.commonpath((output_dir, os.path.abspath(full_output_folder)))
+            print(err)
+            raise Exception(err)
+
+        return full_output_folder, filename, subfolder
+
+    @staticmethod
+    def _collides(full_output_folder: str, filename: str, counter: int, ext: str) -> bool:
+        """检查预留的第一个文件名是否已被占用"""
+        first = f"{filename.replace('%batch_num%', '0')}_{counter:05}_.{ext}"
+        return os.path.exists(os.path.join(full_output_folder, first))
+
+    def reserve(self, filename_prefix: str, output_dir: str, image_width: int = 0,
+                image_height: int = 0, count: int = 1, ext: str = "png"):
+        """
+        预留 count 个连续序号
+
+        返回值与 folder_paths.get_save_image_path 相同:
+        (full_output_folder, filename, counter, subfolder, filename_prefix)
+        """
+        if not self._is_static_prefix(filename_prefix):
+            # 含日期/尺寸等变量的前缀交给官方实现解析，只用缓存保证序号不回退
+            full_output_folder, filename, counter, subfolder, filename_prefix = \
+                folder_paths.get_save_image_path(filename_prefix, output_dir, image_width, image_height)
+            key = self._key(full_output_folder, filename)
+            with self._lock:
+                counter = max(counter, self._counters.get(key, 0))
+                self._counters[key] = counter + count
+            return full_output_folder, filename, counter, subfolder, filename_prefix
+
+        full_output_folder, filename, subfolder = self._resolve(filename_prefix, output_dir)
+        key = self._key(full_output_folder, filename)
+
+        with self._lock:
+            counter: Optional[int] = self._counters.get(key)
+            if counter is not None and (
+                not os.path.isdir(full_output_folder)
+                or self._collides(full_output_folder, filename, counter, ext)
+            ):
+                # 目录被删除或有其他进程写入了同名文件，重新扫描
+                counter = None
+
+            if counter is None:
+                _, _, scanned, _, _ = folder_paths.get_save_image_path(
+                    filename_prefix, output_dir, image_width, image_height
+                )
+                counter = max(scanned, self._counters.get(key, 0))
+                while self._collides(full_output_folder, filename, counter, ext):
+                    counter += 1
+
+            self._counters[key] = counter + count
+
+        return full_output_folder, filename, counter, subfolder, filename_prefix
+
+    def clear(self):
+        """清空缓存，下次保存时重新扫描"""
+        with self._lock:
+            self._counters.clear()
+
+
+# 单例计数器缓存
+_counter_cache_instance: Optional[SaveCounterCache] = None
+
+def get_counter_cache() -> SaveCounterCache:
+    """获取计数器缓存单例实例"""
+    global _counter_cache_instance
+    if _counter_cache_instance is None:
+        _counter_cache_instance = SaveCounterCache()
+    return _counter_cache_instance
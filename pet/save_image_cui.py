@@ -9,9 +9,11 @@ XBHH 保存图片节点 (带CUI奖励)
 4. 显示奖励信息
 """
 
+import io
 import os
 import json
 import numpy as np
+import torch
 from PIL import Image
 from PIL.PngImagePlugin import PngInfo
 from datetime import datetime
@@ -20,6 +22,92 @@ import folder_paths
 from comfy.cli_args import args
 
 from .wallet import CUIWallet, get_wallet
+from .write_queue import get_write_queue
+from .save_counter import get_counter_cache
+from ..metrics import timed
+
+
+def images_to_uint8(images) -> np.ndarray:
+    """
+    将整批图片张量一次性转换为 uint8 数组
+
+    images: [batch, height, width, channels]，取值 0~1
+    只做一次设备到主机的拷贝，缩放和裁剪都在该副本上原地完成，
+    最后写入预分配的 uint8 缓冲区。返回数组的每个 [i] 都是视图，
+    可直接交给 PIL，无需逐张再转换。
+    """
+    # copy=True 保证在 CPU 输入上也不会改写原张量
+    batch = images.detach().to(device="cpu", dtype=torch.float32, copy=True)
+    batch.mul_(255.).clamp_(0, 255)
+
+    out = torch.empty(batch.shape, dtype=torch.uint8)
+    out.copy_(batch)  # 与 astype(np.uint8) 相同，向零截断
+    return out.numpy()
+
+
+# 元数据压缩方式
+METADATA_COMPRESSION_MODES = ["无", "zTXt", "iTXt"]
+
+
+def build_png_metadata(prompt=None, extra_pnginfo=None, cui_info=None,
+                       compression="无") -> PngInfo:
+    """
+    为整批图片构建一次 PNG 元数据
+
+    PngInfo 在 add_text/add_itxt 时就已生成最终的块数据（含压缩），
+    因此同一个实例可被批次内所有图片复用，工作流 JSON 只序列化一次。
+    """
+    metadata = PngInfo()
+
+    def add(key, value):
+        text = json.dumps(value)
+        if compression == "iTXt":
+            metadata.add_itxt(key, text, zip=True)
+        else:
+            metadata.add_text(key, text, zip=(compression == "zTXt"))
+
+    if prompt is not None:
+        add("prompt", prompt)
+    if extra_pnginfo is not None:
+        for x in extra_pnginfo:
+            add(x, extra_pnginfo[x])
+    if cui_info is not None:
+        # CUI 奖励信息很短，始终以未压缩文本写入
+        metadata.add_text("cui_reward", json.dumps(cui_info))
+    return metadata
+
+
+def build_exif_metadata(prompt=None, extra_pnginfo=None, cui_info=None) -> bytes:
+    """
+    为 WebP/JPEG 构建一次 EXIF 元数据
+
+    与官方 SaveAnimatedWEBP 相同：prompt 写入 Model(0x0110)，
+    extra_pnginfo 从 Make(0x010f) 开始依次向下写入 "键:JSON"。
+    """
+    exif = Image.Exif()
+    if prompt is not None:
+        exif[0x0110] = "prompt:{}".format(json.dumps(prompt))
+    tag = 0x010f
+    if extra_pnginfo is not None:
+        for x in extra_pnginfo:
+            exif[tag] = "{}:{}".format(x, json.dumps(extra_pnginfo[x]))
+            tag -= 1
+    if cui_info is not None:
+        exif[tag] = "cui_reward:{}".format(json.dumps(cui_info))
+    return exif.tobytes()
+
+
+# 输出格式: 名称 -> (扩展名, 是否使用 PNG 元数据)
+OUTPUT_FORMATS = {
+    "png": ("png", True),
+    "png (快速)": ("png", True),
+    "webp (无损)": ("webp", False),
+    "webp": ("webp", False),
+    "jpeg": ("jpg", False),
+}
+
+# JPEG 的 APP1 段上限为 64KB，超出时无法写入 EXIF
+JPEG_MAX_EXIF_SIZE = 65533
 
 
 class XBHHSaveImageWithCUI:
@@ -30,6 +118,8 @@ class XBHHSaveImageWithCUI:
         self.type = "output"
         self.prefix_append = ""
         self.compress_level = 4
+        # 后台写入（async_write）尚未完成的文件
+        self._pending_writes = []
     
     @classmethod
     def INPUT_TYPES(s):
@@ -41,6 +131,27 @@ class XBHHSaveImageWithCUI:
                     "tooltip": "文件名前缀，支持格式化如 %date:yyyy-MM-dd%"
                 }),
             },
+            "optional": {
+                "metadata_compression": (METADATA_COMPRESSION_MODES, {
+                    "default": "无",
+                    "tooltip": "工作流元数据的压缩方式，zTXt/iTXt 可显著减小文件体积，但部分工具可能无法读取压缩块"
+                }),
+                "image_format": (list(OUTPUT_FORMATS.keys()), {
+                    "default": "png",
+                    "tooltip": "输出格式：png (快速) 使用压缩级别1，适合草稿；webp/jpeg 体积更小、写入更快"
+                }),
+                "quality": ("INT", {
+                    "default": 90,
+                    "min": 1,
+                    "max": 100,
+                    "step": 1,
+                    "tooltip": "JPEG/WebP 质量；无损 WebP 时表示压缩力度"
+                }),
+                "async_write": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "编码完成即返回，由后台队列写盘（适合网络存储），预览在落盘前直接读取内存；写入失败会在下一次执行时报错"
+                }),
+            },
             "hidden": {
                 "prompt": "PROMPT", 
                 "extra_pnginfo": "EXTRA_PNGINFO"
@@ -53,7 +164,34 @@ class XBHHSaveImageWithCUI:
     CATEGORY = "XBHH/Pet"
     DESCRIPTION = "保存图片到输出目录，并根据图片尺寸获得CUI虚拟货币奖励。按批次计算，多张图片只计算一次奖励。"
     
-    def save_and_earn(self, images, filename_prefix="XBHH", prompt=None, extra_pnginfo=None):
+    def _get_save_kwargs(self, image_format, quality, metadata):
+        """根据输出格式生成 PIL save 参数"""
+        if image_format == "png (快速)":
+            return {"format": "PNG", "pnginfo": metadata, "compress_level": 1}
+        if image_format == "webp (无损)":
+            kwargs = {"format": "WEBP", "lossless": True, "quality": quality}
+        elif image_format == "webp":
+            kwargs = {"format": "WEBP", "quality": quality}
+        elif image_format == "jpeg":
+            kwargs = {"format": "JPEG", "quality": quality}
+        else:
+            return {"format": "PNG", "pnginfo": metadata, "compress_level": self.compress_level}
+        
+        if metadata is not None:
+            kwargs["exif"] = metadata
+        return kwargs
+    
+    def _raise_failed_writes(self):
+        """抛出已结束的后台写入中的第一个错误，仍在写入的留到下次检查"""
+        failed = [f.exception() for f in self._pending_writes if f.done() and f.exception() is not None]
+        self._pending_writes = [f for f in self._pending_writes if not f.done()]
+        if failed:
+            raise failed[0]
+    
+    @timed("save_image_cui")
+    def save_and_earn(self, images, filename_prefix="XBHH", metadata_compression="无",
+                      image_format="png", quality=90, async_write=False,
+                      prompt=None, extra_pnginfo=None):
         """保存图片并计算CUI奖励"""
         
         filename_prefix += self.prefix_append
@@ -81,47 +219,62 @@ class XBHHSaveImageWithCUI:
             }
         )
         
-        # 保存图片
+        if image_format not in OUTPUT_FORMATS:
+            image_format = "png"
+        ext, use_pnginfo = OUTPUT_FORMATS[image_format]
+        
+        # 保存图片：从缓存中一次预留整批序号，避免每次扫描输出目录
         full_output_folder, filename, counter, subfolder, filename_prefix = \
-            folder_paths.get_save_image_path(
+            get_counter_cache().reserve(
                 filename_prefix, 
                 self.output_dir, 
                 images[0].shape[1],  # width
-                images[0].shape[0]   # height
+                images[0].shape[0],  # height
+                count=batch_size,
+                ext=ext
             )
         
+        # 整批转换一次，循环内只取视图
+        pixels = images_to_uint8(images)
+        
+        # 元数据在批次内完全相同，只构建一次
+        metadata = None
+        if not args.disable_metadata:
+            cui_info = {
+                "earned": cui_reward,
+                "balance": new_balance,
+                "size": f"{width}x{height}",
+                "batch_size": batch_size
+            }
+            if use_pnginfo:
+                metadata = build_png_metadata(
+                    prompt, extra_pnginfo, cui_info, compression=metadata_compression
+                )
+            else:
+                metadata = build_exif_metadata(prompt, extra_pnginfo, cui_info)
+                if image_format == "jpeg" and len(metadata) > JPEG_MAX_EXIF_SIZE:
+                    print(f"[XBHH] Warning: workflow metadata too large for JPEG EXIF ({len(metadata)} bytes), skipped")
+                    metadata = None
+        
+        save_kwargs = self._get_save_kwargs(image_format, quality, metadata)
+        
         results = []
-        for batch_number, image in enumerate(images):
-            # 转换图片格式
-            i = 255. * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-            
-            # 添加元数据
-            metadata = None
-            if not args.disable_metadata:
-                metadata = PngInfo()
-                if prompt is not None:
-                    metadata.add_text("prompt", json.dumps(prompt))
-                if extra_pnginfo is not None:
-                    for x in extra_pnginfo:
-                        metadata.add_text(x, json.dumps(extra_pnginfo[x]))
-                
-                # 添加CUI奖励信息到元数据
-                metadata.add_text("cui_reward", json.dumps({
-                    "earned": cui_reward,
-                    "balance": new_balance,
-                    "size": f"{width}x{height}",
-                    "batch_size": batch_size
-                }))
+        for batch_number in range(batch_size):
+            img = Image.fromarray(pixels[batch_number])
+            if image_format == "jpeg" and img.mode != "RGB":
+                img = img.convert("RGB")
             
             # 生成文件名并保存
             filename_with_batch_num = filename.replace("%batch_num%", str(batch_number))
-            file = f"{filename_with_batch_num}_{counter:05}_.png"
-            img.save(
-                os.path.join(full_output_folder, file), 
-                pnginfo=metadata, 
-                compress_level=self.compress_level
-            )
+            file = f"{filename_with_batch_num}_{counter:05}_.{ext}"
+            file_path = os.path.join(full_output_folder, file)
+            if async_write:
+                # 在当前线程编码，写盘交给后台队列（在途内存超限时会阻塞）
+                buffer = io.BytesIO()
+                img.save(buffer, **save_kwargs)
+                self._pending_writes.append(get_write_queue().submit(file_path, buffer.getvalue()))
+            else:
+                img.save(file_path, **save_kwargs)
             
             results.append({
                 "filename": file,
@@ -130,6 +283,9 @@ class XBHHSaveImageWithCUI:
             })
             counter += 1
         
+        # 不等待写盘；已经失败的后台写入在这里报错，与同步写入一样中断执行
+        self._raise_failed_writes()
+        
         # 返回UI结果，包含CUI信息
         return {
             "ui": {
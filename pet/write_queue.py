@@ -0,0 +1,246 @@
+"""
+XBHH 异步写入队列 (write-behind)
+
+保存节点在执行线程中完成编码后，把编码好的字节交给后台线程写盘并立即返回，
+后续节点和下一次执行不必等待慢速/网络存储。
+
+- 队列中尚未落盘的字节总数受内存预算限制
+- 超出预算时 submit 会阻塞，直到磁盘追上（背压）
+- submit 返回 Future，写入失败时其中带有异常，调用方可据此报错
+- 文件落盘前，/view 请求由中间件直接返回队列中的字节，预览不会缺图
+- 提供 flush / 状态查询接口及对应的 API 路由
+"""
+
+import os
+import time
+import atexit
+import asyncio
+import mimetypes
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional, Dict, Any
+
+import folder_paths
+from server import PromptServer
+from aiohttp import web
+
+
+# 默认在途内存预算: 512MB
+DEFAULT_MAX_INFLIGHT_BYTES = 512 * 1024 * 1024
+# 默认后台写入线程数
+DEFAULT_WORKERS = 2
+
+
+class WriteBehindQueue:
+    """有内存上限的后台文件写入队列"""
+
+    def __init__(self, max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+                 workers: int = DEFAULT_WORKERS):
+        self.max_inflight_bytes = max_inflight_bytes
+        self.workers = max(1, workers)
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+
+        # 在途字节数 / 文件数（包含正在写入的）
+        self._inflight_bytes = 0
+        self._pending = 0
+        # 尚未落盘的文件: 规范化路径 -> (字节, Future)
+        self._pending_files: Dict[str, tuple] = {}
+
+        # 统计信息
+        self._written = 0
+        self._failed = 0
+        self._bytes_written = 0
+        self._blocked_seconds = 0.0
+        self._last_error = None
+
+    def _ensure_workers(self):
+        """按需启动写入线程（调用方需持有锁）"""
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._run, name="xbhh-write-behind", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def submit(self, path: str, data: bytes) -> Future:
+        """
+        提交一个待写入文件，返回 Future：写入成功时结果为路径，失败时带有异常
+
+        在途字节超出预算时阻塞等待；单个文件超过预算时，
+        会等队列清空后再放行，避免永久阻塞。
+        """
+        size = len(data)
+        done = Future()
+        with self._cond:
+            if self._inflight_bytes > 0 and self._inflight_bytes + size > self.max_inflight_bytes:
+                start = time.perf_counter()
+                self._cond.wait_for(
+                    lambda: self._inflight_bytes == 0
+                    or self._inflight_bytes + size <= self.max_inflight_bytes
+                )
+                self._blocked_seconds += time.perf_counter() - start
+
+            self._queue.append((path, data, done))
+            self._pending_files[self._key(path)] = (data, done)
+            self._inflight_bytes += size
+            self._pending += 1
+            self._ensure_workers()
+            self._cond.notify_all()
+        return done
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._queue) > 0)
+                path, data, done = self._queue.popleft()
+
+            error = None
+            # 先写临时文件再重命名，避免读到写了一半的图片
+            tmp_path = path + ".tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                error = e
+                print(f"[XBHH] Error writing image {path}: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+            with self._cond:
+                key = self._key(path)
+                # 同一路径可能已被重新提交，只移除自己的记录
+                if self._pending_files.get(key, (None, None))[1] is done:
+                    del self._pending_files[key]
+                self._inflight_bytes -= len(data)
+                self._pending -= 1
+                if error is None:
+                    self._written += 1
+                    self._bytes_written += len(data)
+                else:
+                    self._failed += 1
+                    self._last_error = f"{path}: {error}"
+                self._cond.notify_all()
+
+            if error is None:
+                done.set_result(path)
+            else:
+                done.set_exception(error)
+
+    def get_pending(self, path: str) -> Optional[tuple]:
+        """尚未落盘的文件返回 (字节, Future)，否则返回 None"""
+        with self._cond:
+            return self._pending_files.get(self._key(path))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待所有已提交的文件写完，超时返回 False"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取队列状态"""
+        with self._cond:
+            return {
+                "pending": self._pending,
+                "inflight_bytes": self._inflight_bytes,
+                "max_inflight_bytes": self.max_inflight_bytes,
+                "written": self._written,
+                "failed": self._failed,
+                "bytes_written": self._bytes_written,
+                "blocked_seconds": round(self._blocked_seconds, 3),
+                "last_error": self._last_error,
+            }
+
+
+# 单例写入队列
+_queue_instance: Optional[WriteBehindQueue] = None
+_queue_lock = threading.Lock()
+
+def get_write_queue() -> WriteBehindQueue:
+    """获取写入队列单例实例"""
+    global _queue_instance
+    with _queue_lock:
+        if _queue_instance is None:
+            _queue_instance = WriteBehindQueue()
+            # 进程退出前尽量写完剩余文件
+            atexit.register(_queue_instance.flush, 30)
+    return _queue_instance
+
+
+# ============================================================================
+# /view 中间件：文件落盘前直接返回队列中的字节
+# ============================================================================
+# /view 的这些参数需要 ComfyUI 自己处理图片，只能等文件落盘
+_VIEW_TRANSFORM_PARAMS = ("preview", "channel")
+
+
+def _find_pending_view(query) -> Optional[tuple]:
+    filename = query.get("filename")
+    if _queue_instance is None or not filename:
+        return None
+    base_dir = folder_paths.get_directory_by_type(query.get("type", "output"))
+    if base_dir is None:
+        return None
+    base_dir = os.path.abspath(base_dir)
+    path = os.path.abspath(os.path.join(base_dir, query.get("subfolder", ""), filename))
+    if os.path.commonpath((base_dir, path)) != base_dir:
+        return None
+    return _queue_instance.get_pending(path)
+
+
+@web.middleware
+async def serve_pending_writes(request, handler):
+    """保存节点已返回但文件仍在队列中时，/view 不会 404"""
+    if request.method == "GET" and request.path.endswith("/view"):
+        pending = _find_pending_view(request.query)
+        if pending is not None:
+            data, done = pending
+            if not any(p in request.query for p in _VIEW_TRANSFORM_PARAMS):
+                content_type = mimetypes.guess_type(request.query["filename"])[0]
+                return web.Response(body=data, content_type=content_type or "application/octet-stream")
+            try:
+                await asyncio.wrap_future(done)
+            except Exception:
+                return web.Response(status=404)
+    return await handler(request)
+
+
+def _install_middleware():
+    app = getattr(PromptServer.instance, "app", None)
+    if app is not None:
+        app.middlewares.append(serve_pending_writes)
+
+
+_install_middleware()
+
+
+# ============================================================================
+# API 路由
+# ============================================================================
+@PromptServer.instance.routes.get("/xbhh/save_queue/status")
+async def get_save_queue_status(request):
+    """获取后台写入队列状态"""
+    return web.json_response(get_write_queue().get_status())
+
+
+@PromptServer.instance.routes.post("/xbhh/save_queue/flush")
+async def flush_save_queue(request):
+    """等待后台写入队列清空"""
+    try:
+        timeout = float(request.query.get("timeout", 60))
+    except ValueError:
+        return web.Response(status=400)
+
+    queue = get_write_queue()
+    loop = asyncio.get_running_loop()
+    done = await loop.run_in_executor(None, queue.flush, timeout)
+    return web.json_response({"flushed": done, **queue.get_status()})
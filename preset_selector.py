@@ -2,18 +2,17 @@ import json
 import os
 from pathlib import Path
 
-# ====== 重点：动态获取可用键（在节点加载时读取文件） ======
-try:
-    # 尝试读取默认的preset.json（在ComfyUI工作目录）
-    default_preset = "preset.json"
-    if os.path.exists(default_preset):
-        with open(default_preset, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            available_keys = list(data.keys())
-    else:
-        available_keys = []
-except:
-    available_keys = []
+# ====== 重点：动态获取可用键（在获取节点定义时读取文件，而非导入时） ======
+def get_available_keys(preset_file="preset.json"):
+    """读取ComfyUI工作目录下preset.json的所有键"""
+    try:
+        if os.path.exists(preset_file):
+            with open(preset_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                return list(data.keys())
+    except:
+        pass
+    return []
 
 class PresetSelector:
     CATEGORY = "XBHH"
@@ -22,6 +21,7 @@ class PresetSelector:
     
     @classmethod
     def INPUT_TYPES(cls):
+        available_keys = get_available_keys()
         return {
             "required": {
                 "preset_file": ("STRING", {
@@ -0,0 +1,90 @@
+"""
+XBHH 路由公共层
+
+所有 /xbhh 路由处理函数都运行在 PromptServer 的事件循环上，其中的文件扫描等阻塞操作
+会拖慢队列和 websocket 消息。本模块提供：
+- 有上限的专用线程池，阻塞操作放到池中执行，不占用事件循环，也不挤占默认线程池
+- 单飞（single-flight）合并：同一个键的并发请求只计算一次，结果（或异常）共享给所有等待者
+
+本模块不依赖 ComfyUI，可直接导入。
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .metrics import registry
+
+
+# 路由线程池的最大线程数
+ROUTE_POOL_WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# 键 -> 正在进行的计算；只在事件循环线程中访问
+_inflight: Dict[Hashable, asyncio.Future] = {}
+
+
+def get_route_executor() -> ThreadPoolExecutor:
+    """获取路由线程池单例"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ROUTE_POOL_WORKERS, thread_name_prefix="xbhh-route")
+    return _executor
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """在路由线程池中执行阻塞函数（不合并）"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_route_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def single_flight(key: Hashable, factory: Callable) -> Any:
+    """
+    合并同一个键的并发请求
+
+    没有进行中的计算时调用 factory() 获取 awaitable 并开始计算；否则等待已有的计算。
+    某个请求被取消（如客户端断开）不会影响其他等待者。
+    """
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(factory())
+        _inflight[key] = future
+        future.add_done_callback(functools.partial(_finish, key))
+        registry.inc("xbhh_route_calls_total", help="路由阻塞计算次数（coalesced 为合并到已有计算的请求）",
+                     route=_route_label(key), result="run")
+    else:
+        registry.inc("xbhh_route_calls_total", help="路由阻塞计算次数（coalesced 为合并到已有计算的请求）",
+                     route=_route_label(key), result="coalesced")
+    return await asyncio.shield(future)
+
+
+async def coalesce(key: Hashable, func: Callable, *args, **kwargs) -> Any:
+    """在路由线程池中执行阻塞函数，并合并同一个键的并发请求"""
+    return await single_flight(key, lambda: run_blocking(func, *args, **kwargs))
+
+
+def _finish(key, future):
+    if _inflight.get(key) is future:
+        del _inflight[key]
+    # 所有等待者都已取消时也要取走异常，避免 "exception was never retrieved" 警告
+    if not future.cancelled():
+        future.exception()
+
+
+def _route_label(key) -> str:
+    """指标标签只取键的第一项（路由名），避免参数导致标签无限增长"""
+    return str(key[0] if isinstance(key, tuple) else key)
+
+
+def _collect():
+    return [
+        ("xbhh_route_inflight", "gauge", "正在进行的路由阻塞计算数", {}, len(_inflight)),
+    ]
+
+
+registry.register_collector(_collect)
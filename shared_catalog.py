@@ -0,0 +1,337 @@
+"""
+XBHH 多进程共享目录文件
+
+同一台机器上常常运行多个 ComfyUI 进程，它们使用相同的模型和插件目录。
+LoRA 名称/预览图、Live2D 模型列表等目录数据写成版本化的二进制文件，所有进程只读 mmap 打开：
+- 扫描只由抢到租约（lock 文件）的一个进程执行，其余进程继续使用旧数据；
+  没有旧数据时只短暂等待它写完，超时后在内存中自行扫描（不写文件），不长时间占用路由线程
+- 各段数据是预序列化的 JSON 字节，路由可直接把 mmap 切片作为响应体，内存由页缓存共享
+- 记录扫描时各目录的 mtime，读取方只需 stat 这些目录即可判断是否过期
+
+文件布局（小端）:
+    头部   magic(8) | 格式版本 u32 | 段数 u32 | generation u64 | 生成时间 ns u64
+    段表   名称(16, ASCII) | 偏移 u64 | 长度 u64   × 段数
+    数据   各段字节；"meta" 段为 JSON: {"dirs": [[目录, mtime_ns]], "etags": {段名: ETag}}
+
+每次重建写入新的 {名称}.{generation}.cat，再原子替换指针文件 {名称}.current，
+旧文件可能仍被其他进程映射，只在能删除时才删除（Windows 上映射中的文件无法删除）。
+持有租约的进程在扫描期间定期刷新 lock 文件的 mtime，扫描再慢也不会被其他进程当作过期接管；
+即使两个进程同时重建也是安全的，只是多做一次扫描。
+"""
+
+import os
+import json
+import time
+import mmap
+import struct
+import hashlib
+import threading
+from typing import Optional, Dict, Any, Callable, List, Tuple
+
+import folder_paths
+
+from .metrics import registry
+
+
+CATALOG_MAGIC = b"XBHHCAT\0"
+CATALOG_VERSION = 1
+_HEADER = struct.Struct("<8sIIQQ")
+_SECTION = struct.Struct("<16sQQ")
+# 租约超过该时间（秒）未刷新视为持有者已退出
+LEASE_TIMEOUT = 120.0
+# 重建期间刷新租约的间隔（秒）
+LEASE_HEARTBEAT = LEASE_TIMEOUT / 4
+# 没有旧数据时等待其他进程重建的最长时间（秒），超时后在内存中自行扫描
+WRITER_WAIT = 2.0
+
+
+def _dir_signature(dirs) -> List[list]:
+    sig = []
+    for d in dirs:
+        try:
+            sig.append([d, os.stat(d).st_mtime_ns])
+        except OSError:
+            sig.append([d, None])
+    return sig
+
+
+def pack_catalog(sections: Dict[str, bytes], meta: Dict[str, Any], generation: int) -> bytes:
+    """把各段数据打包为目录文件内容"""
+    sections = {"meta": json.dumps(meta, ensure_ascii=False).encode("utf-8"), **sections}
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    for name, data in sections.items():
+        encoded = name.encode("ascii")
+        if len(encoded) > 16:
+            raise ValueError(f"section name too long: {name}")
+        table.append(_SECTION.pack(encoded, offset, len(data)))
+        offset += len(data)
+    header = _HEADER.pack(CATALOG_MAGIC, CATALOG_VERSION, len(sections), generation, time.time_ns())
+    return b"".join([header, *table, *sections.values()])
+
+
+class CatalogSnapshot:
+    """某一代目录文件的只读视图（mmap 或内存字节）"""
+
+    def __init__(self, buffer, path: Optional[str] = None):
+        self.path = path
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, version, count, generation, built_at_ns = _HEADER.unpack_from(view, 0)
+        if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+            raise ValueError("unsupported catalog file")
+        self.generation = generation
+        self.built_at_ns = built_at_ns
+        self._sections: Dict[str, memoryview] = {}
+        for i in range(count):
+            name, offset, length = _SECTION.unpack_from(view, _HEADER.size + i * _SECTION.size)
+            if offset + length > len(view):
+                raise ValueError("truncated catalog file")
+            self._sections[name.rstrip(b"\0").decode("ascii")] = view[offset:offset + length]
+        self.meta = json.loads(bytes(self._sections["meta"]))
+        self._parsed: Dict[str, Any] = {}
+        self._parsed_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str) -> "CatalogSnapshot":
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm, path)
+
+    def section(self, name: str) -> memoryview:
+        """段的原始字节（零拷贝）"""
+        return self._sections[name]
+
+    def json(self, name: str) -> Any:
+        """解析后的段数据（每个进程每代只解析一次）"""
+        with self._parsed_lock:
+            if name not in self._parsed:
+                self._parsed[name] = json.loads(bytes(self._sections[name]))
+            return self._parsed[name]
+
+    def etag(self, name: str) -> str:
+        return self.meta.get("etags", {}).get(name, "")
+
+    def is_fresh(self) -> bool:
+        """记录的目录 mtime 是否都没有变化"""
+        dirs = self.meta.get("dirs", [])
+        return _dir_signature(d for d, _ in dirs) == dirs
+
+
+class SharedCatalogStore:
+    """共享目录文件的读取、过期检查与重建"""
+
+    DATA_DIR_NAME = "xbhh"
+    CATALOG_DIR_NAME = "catalog"
+    # 两次过期检查的最小间隔（秒）
+    CHECK_INTERVAL = 2.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 目录名 -> 重建锁，同一进程内的并发调用只重建一次
+        self._build_locks: Dict[str, threading.Lock] = {}
+        # 目录名 -> (快照, 上次检查时间)
+        self._views: Dict[str, Tuple[CatalogSnapshot, float]] = {}
+
+    def get_catalog_dir(self) -> str:
+        user_dir = folder_paths.get_user_directory()
+        return os.path.join(user_dir, self.DATA_DIR_NAME, self.CATALOG_DIR_NAME)
+
+    def get(self, name: str, watch: Callable[[], List[str]],
+            build: Callable[[], Dict[str, bytes]]) -> CatalogSnapshot:
+        """
+        获取目录快照，过期或不存在时重建
+
+        Args:
+            name: 目录名（文件名安全的字符串）
+            watch: 返回需要监视 mtime 的目录列表
+            build: 扫描函数，返回 {段名: JSON 字节}
+        """
+        with self._lock:
+            cached = self._views.get(name)
+            if cached is not None and time.monotonic() - cached[1] < self.CHECK_INTERVAL:
+                registry.cache_hit(f"catalog_{name}")
+                return cached[0]
+            build_lock = self._build_locks.setdefault(name, threading.Lock())
+
+        with build_lock:
+            snapshot = cached[0] if cached is not None else None
+            generation = self._read_pointer(name)
+            if generation is not None and (snapshot is None or snapshot.generation != generation):
+                # 其他进程写入了新的一代
+                try:
+                    snapshot = CatalogSnapshot.open(self._data_path(name, generation))
+                except (OSError, ValueError):
+                    pass
+
+            if snapshot is not None and snapshot.is_fresh():
+                registry.cache_hit(f"catalog_{name}")
+            else:
+                registry.cache_miss(f"catalog_{name}")
+                snapshot = self._refresh(name, watch, build, snapshot)
+
+            with self._lock:
+                self._views[name] = (snapshot, time.monotonic())
+            return snapshot
+
+    def invalidate(self, name: Optional[str] = None):
+        """让下次访问重新检查（不删除文件）"""
+        with self._lock:
+            if name is None:
+                self._views.clear()
+            else:
+                self._views.pop(name, None)
+
+    # ---------------------------------------------------------------- 重建
+    def _refresh(self, name, watch, build, stale: Optional[CatalogSnapshot]) -> CatalogSnapshot:
+        catalog_dir = self.get_catalog_dir()
+        try:
+            os.makedirs(catalog_dir, exist_ok=True)
+            leased = self._acquire_lease(name)
+        except OSError:
+            leased = False
+
+        if not leased:
+            # 其他进程正在重建：有旧数据时先继续使用，否则短暂等待它写完，
+            # 仍未写完就在内存中扫描一次（不写文件，文件仍由持有租约的进程写出）
+            if stale is not None:
+                return stale
+            snapshot = self._wait_for_writer(name)
+            if snapshot is not None:
+                return snapshot
+            return self._build(name, watch, build, write=False)
+
+        stop = self._start_heartbeat(name)
+        try:
+            return self._build(name, watch, build, write=True)
+        finally:
+            stop.set()
+            self._release_lease(name)
+
+    def _build(self, name, watch, build, write: bool) -> CatalogSnapshot:
+        generation = time.time_ns()
+        # 先记录目录签名再扫描，扫描期间的改动会在下次检查时被发现
+        dir_sig = _dir_signature(watch())
+        sections = build()
+        meta = {
+            "dirs": dir_sig,
+            "etags": {k: '"' + hashlib.sha1(v).hexdigest()[:16] + '"' for k, v in sections.items()},
+        }
+        data = pack_catalog(sections, meta, generation)
+        if not write:
+            return CatalogSnapshot(data)
+
+        path = self._data_path(name, generation)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+            pointer = self._pointer_path(name)
+            with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+                f.write(str(generation))
+            os.replace(pointer + ".tmp", pointer)
+            snapshot = CatalogSnapshot.open(path)
+        except OSError as e:
+            print(f"[XBHH] Error writing shared catalog {name}: {e}")
+            return CatalogSnapshot(data)
+        self._prune(name, generation)
+        return snapshot
+
+    def _wait_for_writer(self, name) -> Optional[CatalogSnapshot]:
+        """等待持有租约的进程写出新的一代，超时或对方放弃时返回 None"""
+        deadline = time.monotonic() + WRITER_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            generation = self._read_pointer(name)
+            if generation is not None:
+                try:
+                    snapshot = CatalogSnapshot.open(self._data_path(name, generation))
+                    if snapshot.is_fresh():
+                        return snapshot
+                except (OSError, ValueError):
+                    pass
+            if not os.path.exists(self._lease_path(name)):
+                return None
+        return None
+
+    def _prune(self, name, keep_generation):
+        """删除旧的几代文件，仍被映射而无法删除的留到下次"""
+        prefix = name + "."
+        keep = f"{name}.{keep_generation}.cat"
+        catalog_dir = self.get_catalog_dir()
+        for filename in os.listdir(catalog_dir):
+            if filename.startswith(prefix) and filename.endswith(".cat") and filename != keep:
+                try:
+                    os.remove(os.path.join(catalog_dir, filename))
+                except OSError:
+                    pass
+
+    # ---------------------------------------------------------------- 文件
+    def _data_path(self, name, generation) -> str:
+        return os.path.join(self.get_catalog_dir(), f"{name}.{generation}.cat")
+
+    def _pointer_path(self, name) -> str:
+        return os.path.join(self.get_catalog_dir(), f"{name}.current")
+
+    def _read_pointer(self, name) -> Optional[int]:
+        try:
+            with open(self._pointer_path(name), "r", encoding="utf-8") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def _lease_path(self, name) -> str:
+        return os.path.join(self.get_catalog_dir(), f"{name}.lock")
+
+    def _acquire_lease(self, name) -> bool:
+        """创建租约文件，成功者负责写入；过期的租约（持有者已退出）会被接管"""
+        path = self._lease_path(name)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(path) < LEASE_TIMEOUT:
+                        return False
+                    os.remove(path)
+                except OSError:
+                    return False
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"pid": os.getpid(), "at": time.time()}, f)
+            return True
+        return False
+
+    def _start_heartbeat(self, name) -> threading.Event:
+        """重建期间定期刷新租约文件的 mtime，返回用于停止刷新的事件"""
+        path = self._lease_path(name)
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(LEASE_HEARTBEAT):
+                try:
+                    os.utime(path)
+                except OSError:
+                    return
+
+        threading.Thread(target=beat, name=f"xbhh-lease-{name}", daemon=True).start()
+        return stop
+
+    def _release_lease(self, name):
+        try:
+            os.remove(self._lease_path(name))
+        except OSError:
+            pass
+
+
+# 单例实例
+_store_instance: Optional[SharedCatalogStore] = None
+_store_lock = threading.Lock()
+
+def get_catalog_store() -> SharedCatalogStore:
+    """获取共享目录存储单例实例"""
+    global _store_instance
+    with _store_lock:
+        if _store_instance is None:
+            _store_instance = SharedCatalogStore()
+    return _store_instance
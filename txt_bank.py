@@ -0,0 +1,116 @@
+"""
+XBHH txt 词库缓存
+
+txt选择器 / txt随机抽取每次执行都要读取整个词库文件。这里按路径缓存非空行列表，
+每次使用前用 size/mtime 校验，文件被修改后立即重新读取。
+用过的文件路径会记录下来，启动预热（warmup.py）时提前读取。
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, List
+
+import folder_paths
+
+from .metrics import registry
+
+
+# 缓存的词库文件总大小上限（字节）
+MAX_CACHED_BYTES = 256 * 1024 * 1024
+# 记录的最近使用文件数量
+MAX_RECENT_FILES = 64
+
+
+class TxtBankCache:
+    """按 size/mtime 校验的 txt 词库行缓存"""
+
+    DATA_DIR_NAME = "xbhh"
+    RECENT_FILE_NAME = "txt_banks.json"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 完整路径 -> (size, mtime_ns, 行列表)，按最近使用排序
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cached_bytes = 0
+        self._recent: Optional[List[str]] = None
+
+    def get_lines(self, file_path: str) -> List[str]:
+        """读取词库的非空行（已去除首尾空白）"""
+        file_path = os.path.abspath(file_path)
+        st = os.stat(file_path)
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                self._entries.move_to_end(file_path)
+                registry.cache_hit("txt_bank")
+                return entry[2]
+        registry.cache_miss("txt_bank")
+
+        with open(file_path, "r", encoding="utf-8") as file:
+            lines = [line.strip() for line in file if line.strip()]
+
+        with self._lock:
+            old = self._entries.pop(file_path, None)
+            if old is not None:
+                self._cached_bytes -= old[0]
+            self._entries[file_path] = (st.st_size, st.st_mtime_ns, lines)
+            self._cached_bytes += st.st_size
+            while self._cached_bytes > MAX_CACHED_BYTES and len(self._entries) > 1:
+                _, (size, _, _) = self._entries.popitem(last=False)
+                self._cached_bytes -= size
+        self._remember(file_path)
+        return lines
+
+    # ---------------------------------------------------------------- 最近使用
+    def _recent_path(self) -> str:
+        user_dir = folder_paths.get_user_directory()
+        return os.path.join(user_dir, self.DATA_DIR_NAME, self.RECENT_FILE_NAME)
+
+    def get_recent(self) -> List[str]:
+        """最近使用过的词库文件路径（最新的在前）"""
+        with self._lock:
+            if self._recent is None:
+                self._recent = []
+                path = self._recent_path()
+                if os.path.exists(path):
+                    try:
+                        with open(path, "r", encoding="utf-8") as f:
+                            self._recent = [p for p in json.load(f) if isinstance(p, str)]
+                    except (json.JSONDecodeError, IOError) as e:
+                        print(f"[XBHH] Error loading txt bank list: {e}")
+            return list(self._recent)
+
+    def _remember(self, file_path):
+        recent = self.get_recent()
+        known = file_path in recent
+        recent = [file_path] + [p for p in recent if p != file_path]
+        recent = recent[:MAX_RECENT_FILES]
+        with self._lock:
+            self._recent = recent
+        # 只在出现新文件时写盘，顺序变化不值得每次执行都写
+        if known:
+            return
+
+        path = self._recent_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(recent, f, ensure_ascii=False, indent=2)
+            os.replace(path + ".tmp", path)
+        except IOError as e:
+            print(f"[XBHH] Error saving txt bank list: {e}")
+
+
+# 单例实例
+_bank_instance: Optional[TxtBankCache] = None
+_bank_lock = threading.Lock()
+
+def get_txt_bank() -> TxtBankCache:
+    """获取 txt 词库缓存单例实例"""
+    global _bank_instance
+    with _bank_lock:
+        if _bank_instance is None:
+            _bank_instance = TxtBankCache()
+    return _bank_instance
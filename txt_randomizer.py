@@ -1,6 +1,9 @@
 import os
 import random
 
+from .metrics import timed
+from .txt_bank import get_txt_bank
+
 class PromptRandomizer:
     def __init__(self):
         pass
@@ -18,14 +21,14 @@ class PromptRandomizer:
     FUNCTION = "extract_prompt"
     CATEGORY = "XBHH"
     
+    @timed("prompt_randomizer")
     def extract_prompt(self, file_path, seed):
-        # 确保每次生成都重新读取文件（关键！）
+        # 每次生成都校验文件 size/mtime，文件修改后立即重新读取（关键！）
         if not file_path or not os.path.exists(file_path):
             return ("",)
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                lines = [line.strip() for line in file if line.strip()]
+            lines = get_txt_bank().get_lines(file_path)
             
             if not lines:
                 return ("",)
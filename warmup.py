@@ -0,0 +1,215 @@
+"""
+XBHH 启动预热
+
+ComfyUI 启动完成后，在低优先级后台线程中提前填充插件的各类缓存，
+让重启后的第一次请求与平时一样快：
+- LoRA 名称与预览图目录（LoRA 选择器）
+- Live2D 模型目录与 waifu-tips.json（桌宠）
+- txt 词库（txt选择器 / txt随机抽取，包括最近用过的文件）
+- LoRA 文件头元数据索引
+- LoRA 内容哈希（预设按哈希找回 LoRA、重复检测；需要完整读取文件，放在最后）
+
+所有任务的目录扫描、文件头和词库读取都按字节限速（io_pace.py），各任务之间留出间隔，
+不影响启动和正在执行的队列。
+进度可通过 GET /xbhh/warmup 查看，POST /xbhh/warmup 可手动重新预热。
+"""
+
+import os
+import sys
+import time
+import threading
+from typing import Optional, Dict, Any
+
+from server import PromptServer
+from aiohttp import web
+
+from .io_pace import IOThrottle, pace, throttled
+from .lora_hash import get_lora_hash_index
+from .lora_meta import get_lora_meta_index
+from .txt_bank import get_txt_bank
+
+
+# 启动完成后等待多久再开始预热（秒）
+WARMUP_DELAY = 10.0
+# 预热读取速度上限（字节/秒）
+WARMUP_BYTES_PER_SEC = 32 * 1024 * 1024
+# 两个任务之间的间隔（秒）
+WARMUP_TASK_PAUSE = 0.5
+
+
+def _lower_thread_priority():
+    """降低当前线程的 CPU 优先级（Linux 上 nice 值按线程生效，其他平台忽略）"""
+    if sys.platform.startswith("linux") and hasattr(os, "setpriority"):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except OSError:
+            pass
+
+
+class WarmupScheduler:
+    """启动预热调度器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._tasks = [
+            ("lora_catalog", self._warm_lora_catalog),
+            ("live2d", self._warm_live2d),
+            ("txt_banks", self._warm_txt_banks),
+            ("lora_meta", self._warm_lora_meta),
+            ("lora_hashes", self._warm_lora_hashes),
+        ]
+        self._status = self._initial_status()
+
+    def _initial_status(self) -> Dict[str, Any]:
+        return {
+            "state": "idle",
+            "started_at": None,
+            "finished_at": None,
+            "tasks": {
+                name: {"state": "pending", "done": 0, "total": 0, "bytes": 0, "ms": 0, "error": ""}
+                for name, _ in self._tasks
+            },
+        }
+
+    def start(self, delay: float = 0.0) -> bool:
+        """开始预热；已在进行中时返回 False"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._status = self._initial_status()
+            self._status["state"] = "waiting"
+            self._thread = threading.Thread(target=self._run, args=(delay,), name="xbhh-warmup", daemon=True)
+            self._thread.start()
+        return True
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            status = dict(self._status)
+            status["tasks"] = {name: dict(task) for name, task in self._status["tasks"].items()}
+        return status
+
+    def _update(self, name, **changes):
+        with self._lock:
+            self._status["tasks"][name].update(changes)
+
+    def _run(self, delay):
+        _lower_thread_priority()
+        time.sleep(delay)
+        with self._lock:
+            self._status["state"] = "running"
+            self._status["started_at"] = time.time()
+
+        with throttled(IOThrottle(WARMUP_BYTES_PER_SEC)):
+            self._run_tasks()
+
+        with self._lock:
+            self._status["state"] = "done"
+            self._status["finished_at"] = time.time()
+
+    def _run_tasks(self):
+        for name, func in self._tasks:
+            self._update(name, state="running")
+            start = time.perf_counter()
+            try:
+                func(name)
+                self._update(name, state="done")
+            except Exception as e:
+                print(f"[XBHH] Warm-up task {name} failed: {e}")
+                self._update(name, state="error", error=str(e))
+            self._update(name, ms=round((time.perf_counter() - start) * 1000, 1))
+            time.sleep(WARMUP_TASK_PAUSE)
+
+    # ---------------------------------------------------------------- 任务
+    def _warm_lora_catalog(self, name):
+        from .lora_loader import get_lora_catalog
+
+        self._update(name, total=1)
+        get_lora_catalog()
+        self._update(name, done=1)
+
+    def _warm_live2d(self, name):
+        from .pet.live2d_api import Live2DApi
+
+        self._update(name, total=2)
+        Live2DApi.get_catalog()
+        self._update(name, done=1)
+        Live2DApi.get_waifu_tips()
+        self._update(name, done=2)
+
+    def _warm_txt_banks(self, name):
+        from .xbhh_txt_selector import XBHH_FOLDER
+
+        files = []
+        if os.path.isdir(XBHH_FOLDER):
+            files = [os.path.join(XBHH_FOLDER, f) for f in sorted(os.listdir(XBHH_FOLDER)) if f.endswith(".txt")]
+        bank = get_txt_bank()
+        for path in bank.get_recent():
+            if path not in files and os.path.isfile(path):
+                files.append(path)
+
+        self._update(name, total=len(files))
+        total_bytes = 0
+        for i, path in enumerate(files):
+            try:
+                size = os.path.getsize(path)
+                pace(size, files=1)
+                bank.get_lines(path)
+                total_bytes += size
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"[XBHH] Warm-up skipped txt bank {path}: {e}")
+            self._update(name, done=i + 1, bytes=total_bytes)
+
+    def _warm_lora_meta(self, name):
+        # 在预热线程中索引以便限速；已在索引时（例如 /xbhh/lora_meta 触发）跳过，进度见 /xbhh/lora_meta
+        self._update(name, total=1)
+        get_lora_meta_index().run()
+        self._update(name, done=1)
+
+    def _warm_lora_hashes(self, name):
+        # 只有新增或变化的文件需要完整读取；进度见 /xbhh/lora_hashes
+        self._update(name, total=1)
+        get_lora_hash_index().run()
+        self._update(name, done=1)
+
+
+# 单例实例
+_scheduler_instance: Optional[WarmupScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_warmup_scheduler() -> WarmupScheduler:
+    """获取启动预热调度器单例实例"""
+    global _scheduler_instance
+    with _scheduler_lock:
+        if _scheduler_instance is None:
+            _scheduler_instance = WarmupScheduler()
+    return _scheduler_instance
+
+
+def schedule_on_startup():
+    """在 ComfyUI 服务启动完成后开始预热"""
+    app = getattr(PromptServer.instance, "app", None)
+    if app is None:
+        return
+
+    async def start_warmup(app):
+        get_warmup_scheduler().start(delay=WARMUP_DELAY)
+
+    app.on_startup.append(start_warmup)
+
+
+# ============================================================================
+# API 路由
+# ============================================================================
+@PromptServer.instance.routes.get("/xbhh/warmup")
+async def get_warmup_status(request):
+    """获取启动预热进度"""
+    return web.json_response(get_warmup_scheduler().get_status())
+
+
+@PromptServer.instance.routes.post("/xbhh/warmup")
+async def start_warmup(request):
+    """立即重新预热（正在进行时不重复启动）"""
+    scheduler = get_warmup_scheduler()
+    started = scheduler.start()
+    return web.json_response({"started": started, **scheduler.get_status()})
@@ -10,6 +10,8 @@ const IMAGE_SIZE = 300;
 // ============================================================================
 let loraImages = {};
 let loraList = [];
+// LoRA 名称 -> {sha256, autov2}（后台哈希完成的部分）
+let loraHashes = {};
 
 // ============================================================================
 // 工具函数
@@ -18,7 +20,20 @@ function encodeRFC3986URIComponent(str) {
     return encodeURIComponent(str).replace(/[!'()*]/g, c => `%${c.charCodeAt(0).toString(16).toUpperCase()}`);
 }
 
+// 条目记录 AutoV2 哈希，工作流换到文件名不同的机器上时后端可按哈希找回 LoRA
+function fillLoraHash(value) {
+    if (value?.lora && !value.hash) {
+        value.hash = loraHashes[value.lora]?.autov2 || "";
+    }
+    return value;
+}
+
 async function loadLoraData() {
+    // 哈希只是附加信息，读取失败不影响列表
+    api.fetchApi("/xbhh/lora_hashes")
+        .then(r => r.json())
+        .then(data => { loraHashes = data.hashes || {}; })
+        .catch(error => console.error("XBHH: Error loading lora hashes", error));
     try {
         const [images, loras] = await Promise.all([
             api.fetchApi("/xbhh/images/loras").then(r => r.json()),
@@ -26,11 +41,58 @@ async function loadLoraData() {
         ]);
         loraImages = images;
         loraList = loras;
+        // 列表刷新后预览图可能已变化
+        atlasCache.clear();
     } catch (error) {
         console.error("XBHH: Error loading lora data", error);
     }
 }
 
+// ============================================================================
+// 缩略图集：展开文件夹时一次请求拿到该文件夹全部预览图的缩略图
+// ============================================================================
+const THUMB_SIZE = 20;
+// 文件夹路径 -> Promise<图集清单数组>
+const atlasCache = new Map();
+
+function loadFolderAtlas(folder) {
+    if (!atlasCache.has(folder)) {
+        const promise = (async () => {
+            const pages = [];
+            for (let page = 0, total = 1; page < total; page++) {
+                const resp = await api.fetchApi(`/xbhh/lora_atlas?folder=${encodeRFC3986URIComponent(folder)}&page=${page}`);
+                if (!resp.ok) break;
+                const data = await resp.json();
+                pages.push(data);
+                total = data.pages;
+            }
+            return pages;
+        })().catch(error => {
+            atlasCache.delete(folder);
+            console.error("XBHH: Error loading lora atlas", error);
+            return [];
+        });
+        atlasCache.set(folder, promise);
+    }
+    return atlasCache.get(folder);
+}
+
+async function applyFolderAtlas(folder, thumbs) {
+    const pages = await loadFolderAtlas(folder);
+    for (const data of pages) {
+        const scale = THUMB_SIZE / data.tile;
+        for (const [name, [x, y]] of Object.entries(data.items)) {
+            const thumb = thumbs.get(name);
+            if (!thumb) continue;
+            Object.assign(thumb.style, {
+                backgroundImage: `url(${data.image})`,
+                backgroundSize: `${data.width * scale}px ${data.height * scale}px`,
+                backgroundPosition: `-${x * scale}px -${y * scale}px`
+            });
+        }
+    }
+}
+
 // ============================================================================
 // 图片预览
 // ============================================================================
@@ -152,6 +214,19 @@ function showLoraChooserDialog(event, callback) {
     // 存储所有项目和文件夹的引用
     const allItems = [];
     const allFolders = [];
+    // 文件夹路径 -> Map(LoRA 名称 -> 缩略图元素)
+    const folderThumbs = new Map();
+    const shownFolders = new Set();
+
+    function folderOf(loraName) {
+        return loraName.split(splitBy).slice(0, -1).join("/");
+    }
+
+    function showFolderThumbs(folder) {
+        if (shownFolders.has(folder) || !folderThumbs.has(folder)) return;
+        shownFolders.add(folder);
+        applyFolderAtlas(folder, folderThumbs.get(folder));
+    }
 
     // 创建LoRA项目
     function createLoraItem(loraName, indent = 0) {
@@ -169,7 +244,7 @@ function showLoraChooserDialog(event, callback) {
                 overflow: "hidden",
                 textOverflow: "ellipsis"
             },
-            textContent: hasImg ? `🖼️ ${fileName}` : fileName,
+            textContent: fileName,
             onmouseenter: (e) => {
                 item.style.background = "#444";
                 if (hasImg) {
@@ -188,12 +263,30 @@ function showLoraChooserDialog(event, callback) {
             }
         });
         
-        allItems.push({ element: item, loraName, fileName: fileName.toLowerCase() });
+        if (hasImg) {
+            const thumb = $el("span", {
+                style: {
+                    display: "inline-block",
+                    width: `${THUMB_SIZE}px`,
+                    height: `${THUMB_SIZE}px`,
+                    marginRight: "6px",
+                    verticalAlign: "middle",
+                    borderRadius: "3px",
+                    backgroundColor: "#222"
+                }
+            });
+            item.prepend(thumb);
+            const folder = folderOf(loraName);
+            if (!folderThumbs.has(folder)) folderThumbs.set(folder, new Map());
+            folderThumbs.get(folder).set(loraName, thumb);
+        }
+        
+        allItems.push({ element: item, loraName, fileName: fileName.toLowerCase(), folder: folderOf(loraName) });
         return item;
     }
 
     // 创建文件夹
-    function createFolder(name, content, indent = 0) {
+    function createFolder(name, content, indent = 0, path = name) {
         const ITEMS = Symbol.for("items");
         const folder = $el("div.xbhh-lora-folder");
         
@@ -215,7 +308,7 @@ function showLoraChooserDialog(event, callback) {
         // 添加子文件夹
         for (const [subName, subContent] of content.entries()) {
             if (typeof subName === "symbol") continue;
-            children.appendChild(createFolder(subName, subContent, indent + 1));
+            children.appendChild(createFolder(subName, subContent, indent + 1, `${path}/${subName}`));
         }
         
         // 添加LoRA
@@ -228,6 +321,7 @@ function showLoraChooserDialog(event, callback) {
             const isOpen = children.style.display !== "none";
             children.style.display = isOpen ? "none" : "block";
             header.textContent = isOpen ? `📁 ${name}` : `📂 ${name}`;
+            if (!isOpen) showFolderThumbs(path);
         };
         
         allFolders.push({ header, children, name });
@@ -295,6 +389,7 @@ function showLoraChooserDialog(event, callback) {
     }
 
     buildTree();
+    showFolderThumbs("");
 
     // 搜索过滤功能
     searchInput.oninput = () => {
@@ -320,10 +415,11 @@ function showLoraChooserDialog(event, callback) {
             children.style.display = "block";
         });
         
-        allItems.forEach(({ element, loraName, fileName }) => {
+        allItems.forEach(({ element, loraName, fileName, folder }) => {
             const matches = fileName.includes(query) || loraName.toLowerCase().includes(query);
             element.style.display = matches ? "" : "none";
             if (matches) {
+                showFolderThumbs(folder);
                 element.style.paddingLeft = "12px"; // 展平显示
             }
         });
@@ -447,11 +543,12 @@ app.registerExtension({
                 strength: 1.0,
                 strengthTwo: null,
                 trigger: "",
-                triggerWeight: 1.0
+                triggerWeight: 1.0,
+                hash: ""
             }, () => {});
 
             widget.computeSize = () => [this.size[0] - 20, 22];
-            widget.serializeValue = () => widget.value;
+            widget.serializeValue = () => fillLoraHash(widget.value);
 
             widget.draw = (ctx, node, w, posY, h) => {
                 const x = 10;
@@ -564,6 +661,8 @@ app.registerExtension({
                         showLoraChooserDialog(event, value => {
                             if (value) {
                                 widget.value.lora = value;
+                                widget.value.hash = "";
+                                fillLoraHash(widget.value);
                                 node.setDirtyCanvas(true, true);
                             }
                         });
@@ -10,6 +10,8 @@ const IMAGE_SIZE = 300;
 // ============================================================================
 let loraImages = {};
 let loraList = [];
+// LoRA 名称 -> {sha256, autov2}（后台哈希完成的部分）
+let loraHashes = {};
 
 // ============================================================================
 // 工具函数
@@ -18,7 +20,20 @@ function encodeRFC3986URIComponent(str) {
     return encodeURIComponent(str).replace(/[!'()*]/g, c => `%${c.charCodeAt(0).toString(16).toUpperCase()}`);
 }
 
+// 条目记录 AutoV2 哈希，工作流换到文件名不同的机器上时后端可按哈希找回 LoRA
+function fillLoraHash(value) {
+    if (value?.lora && !value.hash) {
+        value.hash = loraHashes[value.lora]?.autov2 || "";
+    }
+    return value;
+}
+
 async function loadLoraData() {
+    // 哈希只是附加信息，读取失败不影响列表
+    api.fetchApi("/xbhh/lora_hashes")
+        .then(r => r.json())
+        .then(data => { loraHashes = data.hashes || {}; })
+        .catch(error => console.error("XBHH: Error loading lora hashes", error));
     try {
         const [images, loras] = await Promise.all([
             api.fetchApi("/xbhh/images/loras").then(r => r.json()),
@@ -26,11 +41,109 @@ async function loadLoraData() {
         ]);
         loraImages = images;
         loraList = loras;
+        // 列表刷新后预览图可能已变化
+        atlasCache.clear();
     } catch (error) {
         console.error("XBHH: Error loading lora data", error);
     }
 }
 
+// ============================================================================
+// 缩略图集：展开文件夹时一次请求拿到该文件夹全部预览图的缩略图
+// ============================================================================
+const THUMB_SIZE = 20;
+// 文件夹路径 -> Promise<图集清单数组>
+const atlasCache = new Map();
+
+function loadFolderAtlas(folder) {
+    if (!atlasCache.has(folder)) {
+        const promise = (async () => {
+            const pages = [];
+            for (let page = 0, total = 1; page < total; page++) {
+                const resp = await api.fetchApi(`/xbhh/lora_atlas?folder=${encodeRFC3986URIComponent(folder)}&page=${page}`);
+                if (!resp.ok) break;
+                const data = await resp.json();
+                pages.push(data);
+                total = data.pages;
+            }
+            return pages;
+        })().catch(error => {
+            atlasCache.delete(folder);
+            console.error("XBHH: Error loading lora atlas", error);
+            return [];
+        });
+        atlasCache.set(folder, promise);
+    }
+    return atlasCache.get(folder);
+}
+
+async function applyFolderAtlas(folder, thumbs) {
+    const pages = await loadFolderAtlas(folder);
+    for (const data of pages) {
+        const scale = THUMB_SIZE / data.tile;
+        for (const [name, [x, y]] of Object.entries(data.items)) {
+            const thumb = thumbs.get(name);
+            if (!thumb) continue;
+            Object.assign(thumb.style, {
+                backgroundImage: `url(${data.image})`,
+                backgroundSize: `${data.width * scale}px ${data.height * scale}px`,
+                backgroundPosition: `-${x * scale}px -${y * scale}px`
+            });
+        }
+    }
+}
+
+// 选择LoRA后，若未填写触发词，则用文件头元数据中的第一个触发词候选填充
+async function fillTriggerFromMeta(widget, node) {
+    if (!widget.value.lora || widget.value.trigger) return;
+    const lora = widget.value.lora;
+    try {
+        const resp = await api.fetchApi(`/xbhh/lora_meta?name=${encodeRFC3986URIComponent(lora)}`);
+        if (!resp.ok) return;
+        const meta = await resp.json();
+        // 请求期间用户可能已修改
+        if (widget.value.lora === lora && !widget.value.trigger && meta.triggers?.length) {
+            widget.value.trigger = meta.triggers[0];
+            node.setDirtyCanvas(true, true);
+        }
+    } catch (error) {
+        console.error("XBHH: Error loading lora meta", error);
+    }
+}
+
+// 烘焙开关：开启后整个堆栈合并为一个缓存文件后一次性应用
+function addBakeWidget(node, bake = false) {
+    const widget = node.addWidget("custom", "bake_stack", { bake }, () => {});
+    widget.computeSize = () => [node.size[0] - 20, 22];
+    widget.serializeValue = () => widget.value;
+    widget.draw = (ctx, node, w, posY, h) => {
+        const x = 10;
+        const width = node.size[0] - 20;
+        const height = 20;
+        const on = !!widget.value?.bake;
+        
+        ctx.fillStyle = on ? "#5a3d2d" : "#2a2a2a";
+        ctx.beginPath();
+        ctx.roundRect(x, posY, width, height, 6);
+        ctx.fill();
+        
+        ctx.fillStyle = on ? "#fff" : "#888";
+        ctx.font = "11px Arial";
+        ctx.textAlign = "left";
+        ctx.textBaseline = "middle";
+        ctx.fillText(on ? "🔥 烘焙堆栈: 开 (合并为单个缓存文件)" : "🔥 烘焙堆栈: 关", x + 8, posY + height / 2);
+    };
+    widget.mouse = (event, pos, node) => {
+        if (event.type === "pointerdown") {
+            widget.value = { bake: !widget.value?.bake };
+            node.setDirtyCanvas(true, true);
+            return true;
+        }
+        return false;
+    };
+    return widget;
+}
+
 // ============================================================================
 // 图片预览
 // ============================================================================
@@ -191,22 +304,37 @@ function showPresetDialog(node, mode) {
         placeholder: "格式: enabled|lora_name|strength_model|strength_clip\n例如: 1|my_lora.safetensors|1.0|1.0"
     });
     
-    // 如果是导出模式，生成预设文本
+    // 如果是导出模式，生成预设文本（已知内容哈希时附加在末尾）
     if (mode === "export") {
-        const lines = [];
-        for (const w of node.loraWidgets || []) {
-            if (w.value?.lora) {
-                const enabled = w.value.on ? "1" : "0";
-                const lora = w.value.lora;
-                const strength = w.value.strength ?? 1.0;
-                const strengthTwo = w.value.strengthTwo ?? strength;
-                const trigger = w.value.trigger || "";
-                const triggerWeight = w.value.triggerWeight ?? 1.0;
-                lines.push(`${enabled}|${lora}|${strength}|${strengthTwo}|${trigger}|${triggerWeight}`);
+        const buildLines = (hashes) => {
+            const lines = [];
+            for (const w of node.loraWidgets || []) {
+                if (w.value?.lora) {
+                    const enabled = w.value.on ? "1" : "0";
+                    const lora = w.value.lora;
+                    const strength = w.value.strength ?? 1.0;
+                    const strengthTwo = w.value.strengthTwo ?? strength;
+                    const trigger = w.value.trigger || "";
+                    const triggerWeight = w.value.triggerWeight ?? 1.0;
+                    const hash = hashes[lora]?.autov2 || w.value.hash || "";
+                    let line = `${enabled}|${lora}|${strength}|${strengthTwo}|${trigger}|${triggerWeight}`;
+                    if (hash) line += `|${hash}`;
+                    lines.push(line);
+                }
             }
-        }
-        textarea.value = lines.join("\n");
+            return lines.join("\n");
+        };
+        textarea.value = buildLines({});
         textarea.readOnly = false;
+        api.fetchApi("/xbhh/lora_hashes")
+            .then(r => r.json())
+            .then(data => {
+                // 用户尚未编辑时才替换
+                if (textarea.value === buildLines({})) {
+                    textarea.value = buildLines(data.hashes || {});
+                }
+            })
+            .catch(error => console.error("XBHH: Error loading lora hashes", error));
     }
     
     content.appendChild(textarea);
@@ -261,7 +389,7 @@ function showPresetDialog(node, mode) {
                 cursor: "pointer"
             },
             textContent: "📥 导入",
-            onclick: () => {
+            onclick: async () => {
                 const text = textarea.value.trim();
                 if (!text) {
                     alert("请输入预设文本");
@@ -284,13 +412,28 @@ function showPresetDialog(node, mode) {
                         const strengthTwo = parseFloat(parts[3]) || strength;
                         const trigger = parts[4] || "";
                         const triggerWeight = parseFloat(parts[5]) || 1.0;
+                        const hash = parts[6] || "";
+                        
+                        // 本机没有同名文件时按内容哈希查找
+                        let resolvedName = loraName;
+                        if (hash && !loraList.includes(loraName)) {
+                            try {
+                                const resp = await api.fetchApi(`/xbhh/lora_hashes/${encodeRFC3986URIComponent(hash)}`);
+                                if (resp.ok) {
+                                    resolvedName = (await resp.json()).names[0] || loraName;
+                                }
+                            } catch (error) {
+                                console.error("XBHH: Error resolving lora hash", error);
+                            }
+                        }
                         
-                        const w = node.addLoraRow(loraName);
+                        const w = node.addLoraRow(resolvedName);
                         w.value.on = enabled;
                         w.value.strength = strength;
                         w.value.strengthTwo = strengthTwo;
                         w.value.trigger = trigger;
                         w.value.triggerWeight = triggerWeight;
+                        w.value.hash = hash;
                     }
                 }
                 
@@ -390,6 +533,19 @@ function showLoraChooserDialog(event, callback) {
 
     const allItems = [];
     const allFolders = [];
+    // 文件夹路径 -> Map(LoRA 名称 -> 缩略图元素)
+    const folderThumbs = new Map();
+    const shownFolders = new Set();
+
+    function folderOf(loraName) {
+        return loraName.split(splitBy).slice(0, -1).join("/");
+    }
+
+    function showFolderThumbs(folder) {
+        if (shownFolders.has(folder) || !folderThumbs.has(folder)) return;
+        shownFolders.add(folder);
+        applyFolderAtlas(folder, folderThumbs.get(folder));
+    }
 
     function createLoraItem(loraName, indent = 0) {
         const fileName = loraName.split(splitBy).pop();
@@ -406,7 +562,7 @@ function showLoraChooserDialog(event, callback) {
                 overflow: "hidden",
                 textOverflow: "ellipsis"
             },
-            textContent: hasImg ? `🖼️ ${fileName}` : fileName,
+            textContent: fileName,
             onmouseenter: (e) => {
                 item.style.background = "#444";
                 if (hasImg) {
@@ -425,11 +581,29 @@ function showLoraChooserDialog(event, callback) {
             }
         });
         
-        allItems.push({ element: item, loraName, fileName: fileName.toLowerCase() });
+        if (hasImg) {
+            const thumb = $el("span", {
+                style: {
+                    display: "inline-block",
+                    width: `${THUMB_SIZE}px`,
+                    height: `${THUMB_SIZE}px`,
+                    marginRight: "6px",
+                    verticalAlign: "middle",
+                    borderRadius: "3px",
+                    backgroundColor: "#222"
+                }
+            });
+            item.prepend(thumb);
+            const folder = folderOf(loraName);
+            if (!folderThumbs.has(folder)) folderThumbs.set(folder, new Map());
+            folderThumbs.get(folder).set(loraName, thumb);
+        }
+        
+        allItems.push({ element: item, loraName, fileName: fileName.toLowerCase(), folder: folderOf(loraName) });
         return item;
     }
 
-    function createFolder(name, content, indent = 0) {
+    function createFolder(name, content, indent = 0, path = name) {
         const folder = $el("div.xbhh-lora-folder");
         
         const header = $el("div.xbhh-folder-header", {
@@ -449,7 +623,7 @@ function showLoraChooserDialog(event, callback) {
         
         for (const [subName, subContent] of content.entries()) {
             if (typeof subName === "symbol") continue;
-            children.appendChild(createFolder(subName, subContent, indent + 1));
+            children.appendChild(createFolder(subName, subContent, indent + 1, `${path}/${subName}`));
         }
         
         const items = content.get(Symbol.for("items")) || [];
@@ -461,6 +635,7 @@ function showLoraChooserDialog(event, callback) {
             const isOpen = children.style.display !== "none";
             children.style.display = isOpen ? "none" : "block";
             header.textContent = isOpen ? `📁 ${name}` : `📂 ${name}`;
+            if (!isOpen) showFolderThumbs(path);
         };
         
         allFolders.push({ header, children, name });
@@ -523,6 +698,7 @@ function showLoraChooserDialog(event, callback) {
     }
 
     buildTree();
+    showFolderThumbs("");
 
     searchInput.oninput = () => {
         const query = searchInput.value.toLowerCase().trim();
@@ -545,10 +721,11 @@ function showLoraChooserDialog(event, callback) {
             children.style.display = "block";
         });
         
-        allItems.forEach(({ element, loraName, fileName }) => {
+        allItems.forEach(({ element, loraName, fileName, folder }) => {
             const matches = fileName.includes(query) || loraName.toLowerCase().includes(query);
             element.style.display = matches ? "" : "none";
             if (matches) {
+                showFolderThumbs(folder);
                 element.style.paddingLeft = "12px";
             }
         });
@@ -614,6 +791,8 @@ app.registerExtension({
             this.loraWidgets = [];
             this.serialize_widgets = true;
             
+            addBakeWidget(this);
+            
             // 添加 LoRA 按钮 (自定义绘制)
             const addLoraBtn = this.addWidget("custom", "➕ Add Lora", null, () => {});
             addLoraBtn.computeSize = () => [this.size[0] - 20, 26];
@@ -725,11 +904,12 @@ app.registerExtension({
                 strength: 1.0,
                 strengthTwo: null,
                 trigger: "",
-                triggerWeight: 1.0
+                triggerWeight: 1.0,
+                hash: ""
             }, () => {});
 
             widget.computeSize = () => [this.size[0] - 20, 22];
-            widget.serializeValue = () => widget.value;
+            widget.serializeValue = () => fillLoraHash(widget.value);
 
             widget.draw = (ctx, node, w, posY, h) => {
                 // 确保 widget.value 存在
@@ -845,7 +1025,10 @@ app.registerExtension({
                         showLoraChooserDialog(event, value => {
                             if (value) {
                                 widget.value.lora = value;
+                                widget.value.hash = "";
+                                fillLoraHash(widget.value);
                                 node.setDirtyCanvas(true, true);
+                                fillTriggerFromMeta(widget, node);
                             }
                         });
                         return true;
@@ -864,7 +1047,7 @@ app.registerExtension({
             };
 
             // 将按钮移到最后
-            const btnNames = ["➕ Add Lora", "preset_buttons"];
+            const btnNames = ["bake_stack", "➕ Add Lora", "preset_buttons"];
             const buttons = [];
             for (const name of btnNames) {
                 const idx = this.widgets.findIndex(w => w.name === name);
@@ -896,13 +1079,18 @@ app.registerExtension({
             this.loraCounter = 0;
             this.loraWidgets = [];
             
+            let bake = false;
             for (const v of info.widgets_values || []) {
                 if (v?.lora !== undefined) {
                     const w = this.addLoraRow(v.lora);
                     w.value = { ...v };
+                } else if (v?.bake !== undefined) {
+                    bake = !!v.bake;
                 }
             }
             
+            addBakeWidget(this, bake);
+            
             // 添加 LoRA 按钮 (自定义绘制)
             const addLoraBtn = this.addWidget("custom", "➕ Add Lora", null, () => {});
             addLoraBtn.computeSize = () => [this.size[0] - 20, 26];
@@ -0,0 +1,94 @@
+/**
+ * XBHH Live2D Bundle
+ * 通过 /xbhh/live2d_bundle 一次请求拿到模型入口及全部资源，
+ * 资源转成 blob URL 后回填到模型配置中，避免逐个文件请求的瀑布流。
+ */
+
+// 相对路径导入，ComfyUI 部署在子路径下时同样有效
+import { api } from "../../../../scripts/api.js";
+
+const BUNDLE_MAGIC = "XL2B";
+
+const MIME_TYPES = {
+  png: "image/png",
+  jpg: "image/jpeg",
+  jpeg: "image/jpeg",
+  webp: "image/webp",
+  json: "application/json",
+};
+
+// 规范化相对路径，处理 "." 和 ".."
+function normalizePath(path) {
+  const parts = [];
+  for (const part of path.replace(/\\/g, "/").split("/")) {
+    if (!part || part === ".") continue;
+    if (part === "..") parts.pop();
+    else parts.push(part);
+  }
+  return parts.join("/");
+}
+
+/**
+ * 加载模型包
+ * @param {string} modelPath 形如 /extensions/<ext>/live2d/<ver>/<name>/<entry>
+ * @returns {Promise<{settings: object, urls: string[]} | null>}
+ *   settings 可直接传给 Live2DModel.from；urls 在模型销毁后需 revoke。
+ *   路径不符合或请求失败时返回 null，由调用方回退到逐文件加载。
+ */
+export async function loadModelBundle(modelPath) {
+  const match = decodeURI(modelPath.split("?")[0]).match(
+    /\/live2d\/(v[245])\/([^/]+)\/([^/]+)$/,
+  );
+  if (!match) return null;
+  const [, version, name, entry] = match;
+
+  const resp = await api.fetchApi(
+    `/xbhh/live2d_bundle/${version}/${encodeURIComponent(name)}?entry=${encodeURIComponent(entry)}`,
+  );
+  if (!resp.ok) return null;
+
+  const buffer = await resp.arrayBuffer();
+  const decoder = new TextDecoder();
+  if (decoder.decode(new Uint8Array(buffer, 0, 4)) !== BUNDLE_MAGIC) return null;
+
+  const manifestLength = new DataView(buffer).getUint32(4, true);
+  const manifest = JSON.parse(
+    decoder.decode(new Uint8Array(buffer, 8, manifestLength)),
+  );
+  const dataStart = 8 + manifestLength;
+
+  let settings = null;
+  const blobUrls = {};
+  for (const file of manifest.files) {
+    const bytes = new Uint8Array(buffer, dataStart + file.offset, file.size);
+    if (file.path === manifest.entry) {
+      settings = JSON.parse(decoder.decode(bytes));
+      continue;
+    }
+    const ext = file.path.split(".").pop().toLowerCase();
+    blobUrls[file.path] = URL.createObjectURL(
+      new Blob([bytes], { type: MIME_TYPES[ext] || "application/octet-stream" }),
+    );
+  }
+  if (!settings) return null;
+
+  // 把配置中引用到的相对路径替换成 blob URL
+  const rewrite = (node) => {
+    if (Array.isArray(node)) {
+      return node.map(rewrite);
+    }
+    if (node && typeof node === "object") {
+      for (const key of Object.keys(node)) node[key] = rewrite(node[key]);
+      return node;
+    }
+    if (typeof node === "string") {
+      return blobUrls[normalizePath(node)] || node;
+    }
+    return node;
+  };
+  rewrite(settings);
+
+  // 未被打包的引用仍按原地址解析
+  settings.url = modelPath;
+  return { settings, urls: Object.values(blobUrls) };
+}
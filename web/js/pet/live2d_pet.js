@@ -1,4 +1,5 @@
 import { app } from "/scripts/app.js";
+import { loadModelBundle } from "./live2d_bundle.js";
 
 /**
  * XBHH Live2D Pet Extension
@@ -9,6 +10,7 @@ export class Live2DPet {
   constructor() {
     this.pixiApp = null;
     this.model = null;
+    this.bundleUrls = [];
     this.container = null;
     this.canvas = null;
     this.isDragging = false;
@@ -336,11 +338,26 @@ export class Live2DPet {
         });
         this.model = null;
       }
+      this.bundleUrls.forEach((u) => URL.revokeObjectURL(u));
+      this.bundleUrls = [];
 
-      const modelUrl = `${this.config.modelPath}?v=${Date.now()}`;
-      console.log("[XBHH] Loading Live2D model from:", modelUrl);
+      // 优先使用打包接口一次性加载，失败时回退到逐文件请求
+      let bundle = null;
+      try {
+        bundle = await loadModelBundle(this.config.modelPath);
+      } catch (e) {
+        console.warn("[XBHH] Live2D bundle unavailable, falling back:", e);
+      }
 
-      this.model = await PIXI.live2d.Live2DModel.from(modelUrl);
+      if (bundle) {
+        console.log("[XBHH] Loading Live2D model from bundle:", this.config.modelPath);
+        this.bundleUrls = bundle.urls;
+        this.model = await PIXI.live2d.Live2DModel.from(bundle.settings);
+      } else {
+        const modelUrl = `${this.config.modelPath}?v=${Date.now()}`;
+        console.log("[XBHH] Loading Live2D model from:", modelUrl);
+        this.model = await PIXI.live2d.Live2DModel.from(modelUrl);
+      }
       this.pixiApp.stage.addChild(this.model);
 
       // 调整模型到中心
@@ -193,7 +193,7 @@ export class Live2DV2Pet {
             await checkAndFixConfig();
 
             window.initWidget({
-                waifuPath: '/xbhh/waifu-tips.json?v=' + Date.now(),
+                waifuPath: '/xbhh/waifu-tips.json',
                 cubism2Path: this.libPath + 'live2d.min.js',
                 tools: ['hitokoto', 'switch-model', 'switch-texture', 'photo', 'quit'],
                 logLevel: 'warn',
@@ -1,6 +1,8 @@
 import os
 import random
 
+from .txt_bank import get_txt_bank
+
 # 获取当前文件所在目录
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 XBHH_FOLDER = os.path.join(CURRENT_DIR, "xbhh")
@@ -50,8 +52,7 @@ class XBHHTxtSelector:
             return ("",)
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                lines = [line.strip() for line in file if line.strip()]
+            lines = get_txt_bank().get_lines(file_path)
             
             if not lines:
                 return ("",)
@@ -1,10 +1,15 @@
 import os
 
-try:
-    from openpyxl import load_workbook
-    OPENPYXL_AVAILABLE = True
-except ImportError:
-    OPENPYXL_AVAILABLE = False
+from .metrics import timed
+
+
+def _load_openpyxl():
+    """按需导入 openpyxl，未安装时返回 None"""
+    try:
+        from openpyxl import load_workbook
+        return load_workbook
+    except ImportError:
+        return None
 
 
 class XBHHXlsxViewer:
@@ -46,9 +51,11 @@ class XBHHXlsxViewer:
             }
         }
     
+    @timed("xlsx_viewer")
     def view_xlsx(self, file_path, sheet_name="", max_rows=100):
         # 检查依赖
-        if not OPENPYXL_AVAILABLE:
+        load_workbook = _load_openpyxl()
+        if load_workbook is None:
             return ("❌ 错误: 需要安装 openpyxl 库\n请运行: pip install openpyxl", 0, 0)
         
         # 检查文件